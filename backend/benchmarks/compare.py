@@ -0,0 +1,57 @@
+"""
+Compare two `benchmarks.hotpaths` result files and flag regressions.
+
+    python -m benchmarks.compare base.json head.json --threshold 0.15
+
+Cases are compared on their fastest repetition (`min_us`) by default, which
+is the least noisy statistic on shared machines; pass `--stat median_us` to
+use the median instead. Exits with status 1 when any case slowed down by more
+than the threshold (a fraction, default 10%), so it can gate CI.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base", type=Path)
+    parser.add_argument("head", type=Path)
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--stat", choices=["min_us", "median_us"], default="min_us")
+    args = parser.parse_args()
+
+    base = json.loads(args.base.read_text(encoding="utf-8"))
+    head = json.loads(args.head.read_text(encoding="utf-8"))
+    print(f"base {base.get('commit')}  ->  head {head.get('commit')}\n")
+    print(f"{'case':<45}{'base us':>12}{'head us':>12}{'change':>9}")
+
+    regressions = []
+    for name in sorted(set(base["results"]) | set(head["results"])):
+        before = base["results"].get(name)
+        after = head["results"].get(name)
+        if before is None or after is None:
+            shown_before = "-" if before is None else f"{before[args.stat]:.1f}"
+            shown_after = "-" if after is None else f"{after[args.stat]:.1f}"
+            print(f"{name:<45}{shown_before:>12}{shown_after:>12}{'n/a':>9}")
+            continue
+
+        old, new = before[args.stat], after[args.stat]
+        change = (new - old) / old if old else 0.0
+        flag = ""
+        if change > args.threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<45}{old:>12.1f}{new:>12.1f}{change:>+9.1%}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} case(s) slower than {args.threshold:.0%}.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
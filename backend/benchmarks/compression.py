@@ -0,0 +1,139 @@
+"""
+Compare extractive compression with plain truncation for prompt content.
+
+Run from the `backend/` directory:
+
+    python -m benchmarks.compression
+    python -m benchmarks.compression --budget 750 --budget 1500 --output results.json
+    python -m benchmarks.compression --live --runs 3   # also calls the configured LLM
+
+Offline, "grounded reference rate" is the share of fixture reference answers
+(spread across the whole document) that would pass the `_validate_questions`
+grounding check against the text the model actually sees. `--live` adds the
+real validation pass rate and end-to-end latency for the configured provider.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import services.llm_service as llm_module
+from config import PROMPT_TOKEN_BUDGET
+from services.compression import compress_content, estimate_tokens
+from services.llm_service import LLMService
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+MODES = ("truncate", "extractive")
+
+
+def fit(content: str, mode: str, budget: int) -> str:
+    if mode == "extractive":
+        return compress_content(content, budget)
+    return content[: budget * 4]
+
+
+def grounded_reference_rate(service: LLMService, prompt_text: str, references: List[Dict[str, str]]) -> float:
+    passed = 0
+    for ref in references:
+        candidate = {
+            "question": ref["question"],
+            "options": [ref["answer"], "placeholder one", "placeholder two", "placeholder three"],
+            "correct_answer": "A",
+        }
+        if service._validate_questions([candidate], prompt_text, expected=1, difficulty="easy"):
+            passed += 1
+    return passed / len(references) if references else 0.0
+
+
+def time_fit(content: str, mode: str, budget: int, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fit(content, mode, budget)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def run_live(content: str, mode: str, budget: int, runs: int, num_questions: int, difficulty: str) -> Dict[str, Any]:
+    llm_module.PROMPT_CONTENT_MODE = mode
+    llm_module.PROMPT_TOKEN_BUDGET = budget
+    service = LLMService()
+
+    pass_rates: List[float] = []
+    latencies: List[float] = []
+    errors = 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        try:
+            raw = service._call_provider(content, num_questions, difficulty)
+            parsed = service._parse_questions(raw, expected=num_questions)
+            validated = service._validate_questions(parsed, content, expected=num_questions, difficulty=difficulty)
+            pass_rates.append(len(validated) / num_questions)
+        except RuntimeError:
+            errors += 1
+            pass_rates.append(0.0)
+        latencies.append(time.perf_counter() - started)
+
+    return {
+        "validation_pass_rate": statistics.mean(pass_rates),
+        "latency_s_median": statistics.median(latencies),
+        "errors": errors,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", type=Path, default=FIXTURES / "source_document.txt")
+    parser.add_argument("--references", type=Path, default=FIXTURES / "reference_questions.json")
+    parser.add_argument("--budget", type=int, action="append", help="Token budget(s) to compare")
+    parser.add_argument("--repeat", type=int, default=20, help="Timing repetitions per mode")
+    parser.add_argument("--live", action="store_true", help="Also call the configured LLM provider")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--num-questions", type=int, default=10)
+    parser.add_argument("--difficulty", default="medium")
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    content = args.input.read_text(encoding="utf-8")
+    references = json.loads(args.references.read_text(encoding="utf-8"))
+    service = LLMService()
+    budgets = args.budget or [PROMPT_TOKEN_BUDGET]
+
+    rows: List[Dict[str, Any]] = []
+    for budget in budgets:
+        for mode in MODES:
+            prompt_text = fit(content, mode, budget)
+            prompt = service._build_prompt(prompt_text, args.num_questions, args.difficulty)
+            row: Dict[str, Any] = {
+                "mode": mode,
+                "budget_tokens": budget,
+                "source_chars": len(content),
+                "content_chars": len(prompt_text),
+                "prompt_tokens_est": estimate_tokens(prompt),
+                "fit_ms_median": round(time_fit(content, mode, budget, args.repeat) * 1000, 3),
+                "grounded_reference_rate": round(grounded_reference_rate(service, prompt_text, references), 3),
+            }
+            if args.live:
+                row.update(run_live(content, mode, budget, args.runs, args.num_questions, args.difficulty))
+            rows.append(row)
+
+    header = f"{'mode':<11}{'budget':>7}{'chars':>8}{'prompt_tok':>11}{'fit_ms':>9}{'grounded':>10}"
+    print(header)
+    for row in rows:
+        print(
+            f"{row['mode']:<11}{row['budget_tokens']:>7}{row['content_chars']:>8}"
+            f"{row['prompt_tokens_est']:>11}{row['fit_ms_median']:>9}{row['grounded_reference_rate']:>10}"
+            + (f"  pass={row['validation_pass_rate']:.2f} latency={row['latency_s_median']:.1f}s" if args.live else "")
+        )
+
+    if args.output:
+        args.output.write_text(json.dumps(rows, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
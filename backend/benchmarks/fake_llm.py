@@ -0,0 +1,434 @@
+"""
+Local stand-in for the LLM providers, for load tests and offline development.
+
+Serves the three APIs `LLMService` talks to:
+
+- Ollama:        POST /api/generate, GET /api/tags
+- Groq/OpenAI:   POST .../chat/completions
+- Hugging Face:  POST /<model>/v1/chat/completions (router) and POST /<model> (legacy)
+
+Questions are built from sentences of the prompt's source text, so they pass
+`_validate_questions`. Latency, failures, 429s and output quality are
+configurable. Prompt evaluation can be given a cost per token; like the real
+servers, a prompt prefix seen recently is served from cache (reported as
+Ollama's `prompt_eval_count` and the OpenAI-style `cached_tokens`), and Ollama
+calls may continue from a previous call's `context`. It also serves
+`GET /document.html` for URL-upload workloads.
+
+    python -m benchmarks.fake_llm --port 11500 --latency 1.5 --rate-limit-rate 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.server
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Tuple
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+QUALITIES = ("clean", "fenced", "plaintext", "garbage")
+
+
+@dataclass
+class FakeLLMConfig:
+    latency: float = 0.5  # mean seconds per completion
+    jitter: float = 0.25  # +/- fraction of latency
+    tail_rate: float = 0.0  # share of calls that take tail_factor times longer
+    tail_factor: float = 10.0
+    failure_rate: float = 0.0  # share of calls answered with HTTP 500
+    rate_limit_rate: float = 0.0  # share of calls answered with HTTP 429
+    retry_after: float = 1.0
+    quality: str = "clean"  # one of QUALITIES, or "mixed"
+    terse_rate: float = 0.0  # share of questions with short stems that miss the medium/hard heuristics
+    model_loaded: bool = True  # Ollama cold start simulation
+    cold_start: float = 0.0
+    hf_legacy_only: bool = False  # Hugging Face model without the chat route
+    json_schema: bool = True  # accept JSON Schema constraints (format / response_format / grammar)
+    max_context: int = 8192
+    prompt_tokens_per_s: float = 0.0  # prompt evaluation speed for uncached tokens; 0 = free
+
+
+class FakeLLM:
+    def __init__(self, config: FakeLLMConfig, seed: int | None = None) -> None:
+        self.config = config
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+        self.prompt_tokens: Dict[str, int] = {"evaluated": 0, "cached": 0}
+        # Recently processed texts (prompt + answer), standing in for the server's prefix/KV cache.
+        self._recent: Deque[str] = deque(maxlen=16)
+        # Ollama context handle -> (text so far, last answer), for the most recent calls.
+        self._contexts: Dict[int, Tuple[str, str]] = {}
+        self._next_handle = 1
+
+    # -- completion --------------------------------------------------------
+
+    def complete(
+        self, prompt: str, constrained: bool = False, history: str = "", previous: str | None = None
+    ) -> Tuple[str, int]:
+        """Answer ``prompt``; ``history`` and ``previous`` come from a continued Ollama context."""
+        if "Convert the following quiz text into strict JSON" in prompt or (
+            previous is not None and "could not be parsed" in prompt
+        ):
+            source = previous if previous is not None else _between(prompt, 'Input:\n"""', '"""') or ""
+            text = source if source.strip().startswith("{") else json.dumps({"questions": []})
+            return text, _tokens(text)
+
+        full = history + prompt
+        source = _between(full, 'Source text:\n"""', '"""') or full
+        sets = re.findall(r"^- (EASY|MEDIUM|HARD): exactly (\d+) questions", prompt, re.MULTILINE)
+        if sets:
+            # Multi-difficulty request: one list per difficulty, drawn from one pool so stems differ.
+            pool = self._questions(source, sum(int(n) for _, n in sets))
+            answer: Dict[str, Any] = {}
+            for difficulty, n in sets:
+                answer[difficulty.lower()], pool = pool[: int(n)], pool[int(n) :]
+            text = json.dumps(answer)
+            if not constrained and self.config.quality == "fenced":
+                text = "```json\n" + text + "\n```"
+            return text, _tokens(text)
+        count_match = re.search(r"generate exactly (\d+)", prompt) or re.search(r"generate exactly (\d+)", full)
+        count = int(count_match.group(1)) if count_match else 5
+        questions = self._questions(source, count)
+
+        # Constrained decoding always yields well-formed JSON.
+        quality = "clean" if constrained else self.config.quality
+        if quality == "mixed":
+            quality = self.random.choice(QUALITIES[:-1])
+        if quality == "fenced":
+            text = "Here is the quiz:\n```json\n" + json.dumps({"questions": questions}, indent=2) + "\n```"
+        elif quality == "plaintext":
+            lines: List[str] = []
+            for i, q in enumerate(questions, 1):
+                lines.append(f"{i}. {q['question']}")
+                lines.extend(f"{letter}) {opt}" for letter, opt in zip("ABCD", q["options"]))
+                lines.append(f"Answer: {q['correct_answer']}")
+            text = "\n".join(lines)
+        elif quality == "garbage":
+            text = "I'm sorry, I cannot produce that quiz right now."
+        else:
+            text = json.dumps({"questions": questions})
+        return text, _tokens(text)
+
+    def _questions(self, source: str, count: int) -> List[Dict[str, Any]]:
+        sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", source) if len(s.split()) >= 8]
+        if not sentences:
+            sentences = [source.strip()[:200] or "The source text is empty."]
+        fillers = [
+            "It was first recorded in a distant colonial archive",
+            "Nothing of this kind is mentioned anywhere at all",
+            "Only later historians invented this particular claim",
+            "The reverse is described as a common misconception",
+        ]
+        picked = self.random.sample(sentences, min(count, len(sentences)))
+        while len(picked) < count:
+            picked.append(self.random.choice(sentences))
+
+        questions: List[Dict[str, Any]] = []
+        for idx, sentence in enumerate(picked):
+            words = sentence.rstrip(".!?").split()
+            answer = " ".join(words[-8:])
+            topic = " ".join(words[:6])
+            options = [answer] + self.random.sample(fillers, 3)
+            self.random.shuffle(options)
+            if self.random.random() < self.config.terse_rate:
+                stem = f"What about {' '.join(words[:3])}?"
+            else:
+                stem = (
+                    f"According to the passage, which statement about {topic} "
+                    f"is directly supported by the text (item {idx + 1})?"
+                )
+            questions.append(
+                {
+                    "question": stem,
+                    "options": options,
+                    "correct_answer": "ABCD"[options.index(answer)],
+                }
+            )
+        return questions
+
+    # -- prompt processing --------------------------------------------------
+
+    def evaluate_prompt(self, text: str) -> Tuple[int, int, float]:
+        """(evaluated, cached) tokens of ``text`` and the evaluation time slept for the uncached part."""
+        with self.lock:
+            shared = max((_common_prefix(text, seen) for seen in self._recent), default=0)
+        cached = _tokens(text[:shared]) if shared else 0
+        evaluated = max(0, _tokens(text) - cached)
+        seconds = evaluated / self.config.prompt_tokens_per_s if self.config.prompt_tokens_per_s > 0 else 0.0
+        time.sleep(seconds)
+        with self.lock:
+            self.prompt_tokens["evaluated"] += evaluated
+            self.prompt_tokens["cached"] += cached
+        return evaluated, cached, seconds
+
+    def remember(self, text: str, answer: str) -> List[int]:
+        """Cache ``text + answer`` and return an Ollama-style context for it (one int per token)."""
+        with self.lock:
+            self._recent.append(text + answer)
+            handle, self._next_handle = self._next_handle, self._next_handle + 1
+            self._contexts[handle] = (text + answer, answer)
+            self._contexts.pop(handle - 256, None)
+        return [handle] + [0] * (_tokens(text + answer) - 1)
+
+    def context(self, context: Any) -> Tuple[str, str | None]:
+        """(text so far, last answer) for an Ollama ``context``, or ("", None)."""
+        if not isinstance(context, list) or not context:
+            return "", None
+        with self.lock:
+            text, answer = self._contexts.get(context[0], ("", None))
+        return text, answer
+
+    # -- fault injection ---------------------------------------------------
+
+    def count(self, route: str) -> None:
+        with self.lock:
+            self.calls[route] = self.calls.get(route, 0) + 1
+
+    def fault(self) -> Tuple[int, Dict[str, str], str] | None:
+        roll = self.random.random()
+        if roll < self.config.rate_limit_rate:
+            return 429, {"retry-after": str(self.config.retry_after)}, "Rate limit reached. Please try again in 1s."
+        if roll < self.config.rate_limit_rate + self.config.failure_rate:
+            return 500, {}, "Injected failure"
+        return None
+
+    def sleep(self, base: float | None = None) -> float:
+        """Simulate latency; returns the model load time included (cold start), if any."""
+        base = self.config.latency if base is None else base
+        cold = 0.0
+        with self.lock:
+            if not self.config.model_loaded:
+                cold, self.config.model_loaded = self.config.cold_start, True
+        if self.random.random() < self.config.tail_rate:
+            base *= self.config.tail_factor
+        jitter = base * self.config.jitter
+        time.sleep(cold + max(0.0, self.random.uniform(base - jitter, base + jitter)))
+        return cold
+
+
+def make_handler(fake: FakeLLM) -> type:
+    document_html = "<html><body><article>" + "".join(
+        f"<p>{p}</p>" for p in (FIXTURES / "source_document.txt").read_text(encoding="utf-8").split("\n\n")
+    ) + "</article></body></html>"
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+            pass
+
+        def _send(
+            self,
+            status: int,
+            body: Any,
+            headers: Dict[str, str] | None = None,
+            ctype: str = "application/json",
+        ) -> None:
+            payload = (body if isinstance(body, str) else json.dumps(body)).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(payload)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self) -> None:  # noqa: N802
+            if self.path.startswith("/api/tags"):
+                self._send(200, {"models": [{"name": "fake"}]})
+            elif self.path.startswith("/document.html"):
+                self._send(200, document_html, ctype="text/html")
+            elif self.path.rstrip("/").endswith("/models"):
+                self._send(200, {"data": [{"id": "fake", "max_model_len": fake.config.max_context}]})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self) -> None:  # noqa: N802
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            path = self.path.rstrip("/")
+            if path.endswith("/api/generate"):
+                route = "ollama"
+            elif path.endswith("/chat/completions"):
+                route = "chat"
+            else:
+                route = "hf_legacy"
+            if route == "chat" and fake.config.hf_legacy_only and "/openai/" not in path:
+                fake.count("chat_404")
+                self._send(404, {"error": "Model does not support chat completions"})
+                return
+            fake.count(route)
+
+            if route == "ollama" and not body.get("prompt"):
+                # Load-only request (warm-up): no generation latency.
+                load = fake.sleep(base=0.0)
+                self._send(
+                    200, {"response": "", "done": True, "done_reason": "load", "load_duration": int(load * 1e9)}
+                )
+                return
+
+            constraint = _output_constraint(body)
+            if constraint == "schema" and not fake.config.json_schema:
+                self._send(400, {"error": {"message": "json_schema response format is not supported by this model"}})
+                return
+
+            fault = fake.fault()
+            load = fake.sleep()
+            if fault:
+                status, headers, message = fault
+                self._send(status, {"error": {"message": message}}, headers)
+                return
+
+            if route == "ollama":
+                history, previous = fake.context(body.get("context"))
+                evaluated, _, eval_s = fake.evaluate_prompt(history + body["prompt"])
+                text, tokens = fake.complete(
+                    body["prompt"], constrained=constraint is not None, history=history, previous=previous
+                )
+                self._send(
+                    200,
+                    {
+                        "response": text,
+                        "done": True,
+                        "done_reason": "stop",
+                        "eval_count": tokens,
+                        "prompt_eval_count": evaluated,
+                        "prompt_eval_duration": int(eval_s * 1e9),
+                        "load_duration": int(load * 1e9),
+                        "context": fake.remember(history + body["prompt"], text),
+                    },
+                )
+            elif route == "chat":
+                prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+                _, cached, _ = fake.evaluate_prompt(prompt)
+                text, tokens = fake.complete(prompt, constrained=constraint is not None)
+                fake.remember(prompt, text)
+                self._send(
+                    200,
+                    {
+                        "choices": [{"message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                        "usage": {
+                            "prompt_tokens": _tokens(prompt),
+                            "completion_tokens": tokens,
+                            "prompt_tokens_details": {"cached_tokens": cached},
+                        },
+                    },
+                )
+            else:
+                text, tokens = fake.complete(str(body.get("inputs", "")), constrained=constraint is not None)
+                self._send(
+                    200,
+                    [{"generated_text": text, "details": {"finish_reason": "eos_token", "generated_tokens": tokens}}],
+                )
+
+    return Handler
+
+
+def start_server(
+    config: FakeLLMConfig, host: str = "127.0.0.1", port: int = 0, seed: int | None = None
+) -> Tuple[http.server.ThreadingHTTPServer, FakeLLM]:
+    fake = FakeLLM(config, seed=seed)
+    server = http.server.ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, fake
+
+
+def _output_constraint(body: Dict[str, Any]) -> str | None:
+    """"schema", "json" or None depending on how the request constrains its output."""
+    fmt = body.get("format")
+    response_format = body.get("response_format") or {}
+    grammar = (body.get("parameters") or {}).get("grammar")
+    if isinstance(fmt, dict) or response_format.get("type") == "json_schema" or grammar:
+        return "schema"
+    if fmt == "json" or response_format.get("type") == "json_object":
+        return "json"
+    return None
+
+
+def _between(text: str, start: str, end: str) -> str | None:
+    begin = text.find(start)
+    if begin == -1:
+        return None
+    begin += len(start)
+    finish = text.find(end, begin)
+    return text[begin:finish] if finish != -1 else text[begin:]
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _common_prefix(a: str, b: str) -> int:
+    limit = min(len(a), len(b))
+    lo, hi = 0, limit
+    # Binary search on prefix equality; slicing compares in C.
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean completion latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.25)
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="Share of calls that are much slower")
+    parser.add_argument("--tail-factor", type=float, default=10.0, help="Latency multiplier for tail calls")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--quality", choices=QUALITIES + ("mixed",), default="clean")
+    parser.add_argument("--cold-start", type=float, default=0.0, help="Extra latency on the first call (s)")
+    parser.add_argument("--hf-legacy-only", action="store_true", help="404 on the Hugging Face chat route")
+    parser.add_argument("--no-json-schema", action="store_true", help="Reject JSON Schema output constraints")
+    parser.add_argument("--terse-rate", type=float, default=0.0, help="Share of questions with too-short stems")
+    parser.add_argument(
+        "--prompt-tokens-per-s", type=float, default=0.0, help="Prompt evaluation speed for uncached tokens"
+    )
+
+
+def config_from_args(args: argparse.Namespace) -> FakeLLMConfig:
+    return FakeLLMConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        tail_rate=args.tail_rate,
+        tail_factor=args.tail_factor,
+        failure_rate=args.failure_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        quality=args.quality,
+        model_loaded=args.cold_start <= 0,
+        cold_start=args.cold_start,
+        hf_legacy_only=args.hf_legacy_only,
+        json_schema=not args.no_json_schema,
+        terse_rate=args.terse_rate,
+        prompt_tokens_per_s=args.prompt_tokens_per_s,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server, _ = start_server(config_from_args(args), args.host, args.port)
+    print(f"Fake LLM listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Offline microbenchmarks for the parsing, validation, ranking, template generation, extraction and grading hot paths.
+
+Run from the `backend/` directory:
+
+    python -m benchmarks.hotpaths                       # writes benchmarks/results/<commit>.json
+    python -m benchmarks.hotpaths --filter parse --output /tmp/head.json
+    python -m benchmarks.compare benchmarks/results/<base>.json benchmarks/results/<head>.json
+
+Model-output fixtures live in `benchmarks/fixtures/model_outputs/`; the PDF
+and HTML inputs for `LangExtract` are generated from the fixture document and
+served from a temporary directory, so nothing touches the network.
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import http.server
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import Quiz
+from services.langextract import LangExtract
+from services.llm_service import LLMService
+from services.quiz_service import QuizService
+from services.ranking import rank_questions
+from services.template_generator import template_questions
+
+BENCH_DIR = Path(__file__).resolve().parent
+FIXTURES = BENCH_DIR / "fixtures"
+OUTPUTS = FIXTURES / "model_outputs"
+RESULTS_DIR = BENCH_DIR / "results"
+
+Case = Tuple[str, Callable[[], Any]]
+
+
+def build_pdf(text: str, lines_per_page: int = 45, width: int = 90) -> bytes:
+    """Minimal multi-page PDF with Helvetica text, enough for PyPDF2 to extract."""
+    import textwrap
+
+    lines: List[str] = []
+    for paragraph in text.splitlines():
+        lines.extend(textwrap.wrap(paragraph, width) or [""])
+    pages = [lines[i : i + lines_per_page] for i in range(0, len(lines), lines_per_page)]
+
+    def escape(line: str) -> str:
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects: List[bytes] = []
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for pid, page_lines in zip(page_ids, pages):
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 780 Td"]
+        ops += [f"({escape(line)}) '" for line in page_lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {pid + 1} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def build_html(text: str) -> str:
+    paragraphs = "\n".join(f"<p>{p}</p>" for p in text.split("\n\n") if p.strip())
+    return (
+        "<html><head><title>Fixture</title><style>p{margin:0}</style>"
+        "<script>var tracking = true;</script></head>"
+        f"<body><nav>Home | About</nav><article>{paragraphs}</article></body></html>"
+    )
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+
+def serve_directory(directory: Path) -> Tuple[http.server.ThreadingHTTPServer, str]:
+    handler = functools.partial(_QuietHandler, directory=str(directory))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def build_cases(workdir: Path, base_url: str) -> List[Case]:
+    service = LLMService()
+    content = (FIXTURES / "source_document.txt").read_text(encoding="utf-8")
+    raw_outputs = {path.stem: path.read_text(encoding="utf-8") for path in sorted(OUTPUTS.iterdir())}
+    parsed = service._parse_questions(raw_outputs["clean"], expected=10)
+
+    cases: List[Case] = []
+    for name, raw in raw_outputs.items():
+        cases.append((f"extract_json_blob[{name}]", functools.partial(service._extract_json_blob, raw)))
+        cases.append((f"parse_questions[{name}]", functools.partial(_parse_or_none, service, raw)))
+    cases.append(
+        (
+            "parse_plaintext_questions[plaintext]",
+            functools.partial(service._parse_plaintext_questions, raw_outputs["plaintext"], 10),
+        )
+    )
+    for difficulty in ("easy", "medium", "hard"):
+        cases.append(
+            (
+                f"validate_questions[{difficulty}]",
+                functools.partial(service._validate_questions, parsed, content, 10, difficulty),
+            )
+        )
+        cases.append(
+            (
+                f"rank_questions[{difficulty}]",
+                functools.partial(rank_questions, parsed, content, difficulty, 5),
+            )
+        )
+        cases.append(
+            (
+                f"template_questions[{difficulty}]",
+                functools.partial(template_questions, content, 10, difficulty),
+            )
+        )
+
+    pdf_path = workdir / "document.pdf"
+    pdf_path.write_bytes(build_pdf(content))
+    (workdir / "document.html").write_text(build_html(content), encoding="utf-8")
+    cases.append(("langextract.from_pdf", functools.partial(LangExtract.from_pdf, str(pdf_path))))
+    cases.append(("langextract.from_url", functools.partial(LangExtract.from_url, f"{base_url}/document.html")))
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    quiz = Quiz(
+        source_type="text",
+        difficulty="medium",
+        num_questions=len(parsed),
+        content=content[:10000],
+        questions_json=json.dumps(parsed),
+    )
+    db.add(quiz)
+    db.commit()
+    answers = {idx: "ABCD"[idx % 4] for idx in range(len(parsed))}
+    cases.append(("quiz_service.submit_quiz", functools.partial(QuizService(db).submit_quiz, quiz.id, answers)))
+    return cases
+
+
+def _parse_or_none(service: LLMService, raw: str) -> Any:
+    try:
+        return service._parse_questions(raw, expected=10)
+    except RuntimeError:
+        return None
+
+
+def measure(func: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, Any]:
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    per_call = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "median_us": round(statistics.median(per_call) * 1e6, 3),
+        "min_us": round(min(per_call) * 1e6, 3),
+        "stdev_us": round(statistics.pstdev(per_call) * 1e6, 3),
+        "loops": number,
+        "repeat": repeat,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=BENCH_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this text")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Target seconds per repetition")
+    parser.add_argument("--output", type=Path, help="Result file (default: benchmarks/results/<commit>.json)")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        server, base_url = serve_directory(workdir)
+        try:
+            results: Dict[str, Any] = {}
+            for name, func in build_cases(workdir, base_url):
+                if args.filter and args.filter not in name:
+                    continue
+                results[name] = measure(func, args.repeat, args.min_time)
+                print(f"{name:<45}{results[name]['median_us']:>14.1f} us")
+        finally:
+            server.shutdown()
+
+    report = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    output = args.output or RESULTS_DIR / f"{commit}-{int(time.time())}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"\nWrote {output}")
+
+
+if __name__ == "__main__":
+    main()
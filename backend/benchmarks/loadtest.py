@@ -0,0 +1,259 @@
+"""
+End-to-end load test of the FastAPI app against the fake LLM provider.
+
+Starts `benchmarks.fake_llm`, launches the real app under uvicorn with the
+provider pointed at it (and a throwaway SQLite database), then drives a mixed
+workload of URL uploads, quiz generation, quiz fetches and submissions from
+concurrent virtual users. Reports throughput and p50/p95/p99 latency per
+endpoint.
+
+Run from the `backend/` directory:
+
+    python -m benchmarks.loadtest --provider groq --users 20 --duration 60 --workers 2 \\
+        --latency 2 --rate-limit-rate 0.05 --mix upload=1,generate=2,get=10,submit=5
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import requests
+
+from benchmarks.fake_llm import add_arguments, config_from_args, start_server
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+DEFAULT_MIX = "upload=1,generate=2,get=10,submit=5"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def provider_env(provider: str, fake_url: str, db_path: Path) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update(
+        {
+            "LLM_PROVIDER": provider,
+            "DATABASE_URL": f"sqlite:///{db_path}",
+            "OLLAMA_BASE_URL": fake_url,
+            "GROQ_API_URL": f"{fake_url}/openai/v1",
+            "GROQ_API_KEY": env.get("GROQ_API_KEY") or "fake-key",
+            "HUGGINGFACE_API_URL": fake_url,
+        }
+    )
+    return env
+
+
+def wait_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("App did not become healthy in time.")
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, status: int, seconds: float) -> None:
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        rows: Dict[str, Any] = {}
+        with self.lock:
+            for endpoint, samples in sorted(self.latencies.items()):
+                ordered = sorted(samples)
+                statuses = dict(self.statuses[endpoint])
+                ok = sum(count for status, count in statuses.items() if 200 <= status < 300)
+                rows[endpoint] = {
+                    "requests": len(ordered),
+                    "ok": ok,
+                    "throughput_rps": round(ok / elapsed, 3),
+                    "p50_ms": round(_pct(ordered, 0.50) * 1000, 1),
+                    "p95_ms": round(_pct(ordered, 0.95) * 1000, 1),
+                    "p99_ms": round(_pct(ordered, 0.99) * 1000, 1),
+                    "statuses": statuses,
+                }
+        return rows
+
+
+class Workload:
+    def __init__(self, base_url: str, fake_url: str, recorder: Recorder, content: str, num_questions: int) -> None:
+        self.base_url = base_url
+        self.fake_url = fake_url
+        self.recorder = recorder
+        self.content = content
+        self.num_questions = num_questions
+        self.quiz_ids: List[str] = []
+        self.lock = threading.Lock()
+
+    def _timed(self, endpoint: str, call: Callable[[], requests.Response]) -> requests.Response | None:
+        started = time.perf_counter()
+        try:
+            resp = call()
+        except requests.RequestException:
+            self.recorder.record(endpoint, 0, time.perf_counter() - started)
+            return None
+        self.recorder.record(endpoint, resp.status_code, time.perf_counter() - started)
+        return resp
+
+    def upload(self, session: requests.Session) -> None:
+        self._timed(
+            "POST /upload/url",
+            lambda: session.post(f"{self.base_url}/upload/url", json={"url": f"{self.fake_url}/document.html"}),
+        )
+
+    def generate(self, session: requests.Session) -> None:
+        resp = self._timed(
+            "POST /generate-quiz",
+            lambda: session.post(
+                f"{self.base_url}/generate-quiz",
+                json={
+                    "content": self.content,
+                    "difficulty": random.choice(["easy", "medium", "hard"]),
+                    "num_questions": self.num_questions,
+                },
+            ),
+        )
+        if resp is not None and resp.status_code == 200:
+            with self.lock:
+                self.quiz_ids.append(resp.json()["quiz_id"])
+
+    def get(self, session: requests.Session) -> None:
+        quiz_id = self._pick_quiz()
+        if quiz_id is None:
+            return self.generate(session)
+        self._timed("GET /quiz/{id}", lambda: session.get(f"{self.base_url}/quiz/{quiz_id}"))
+
+    def submit(self, session: requests.Session) -> None:
+        quiz_id = self._pick_quiz()
+        if quiz_id is None:
+            return self.generate(session)
+        answers = {str(i): random.choice("ABCD") for i in range(self.num_questions)}
+        self._timed(
+            "POST /submit-quiz",
+            lambda: session.post(f"{self.base_url}/submit-quiz", json={"quiz_id": quiz_id, "answers": answers}),
+        )
+
+    def _pick_quiz(self) -> str | None:
+        with self.lock:
+            return random.choice(self.quiz_ids) if self.quiz_ids else None
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - {"upload", "generate", "get", "submit"}
+    if unknown:
+        raise SystemExit(f"Unknown workload operations: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def run_users(workload: Workload, mix: Dict[str, float], users: int, duration: float) -> float:
+    operations = list(mix)
+    weights = [mix[op] for op in operations]
+    stop_at = time.monotonic() + duration
+
+    def user() -> None:
+        session = requests.Session()
+        while time.monotonic() < stop_at:
+            getattr(workload, random.choices(operations, weights)[0])(session)
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=user, daemon=True) for _ in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.monotonic() - started
+
+
+def _pct(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--provider", choices=["ollama", "groq", "huggingface"], default="groq")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted operations, e.g. " + DEFAULT_MIX)
+    parser.add_argument("--num-questions", type=int, default=5)
+    parser.add_argument("--output", type=Path, help="Write the report as JSON")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    fake_server, fake = start_server(config_from_args(args))
+    fake_url = f"http://127.0.0.1:{fake_server.server_address[1]}"
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = provider_env(args.provider, fake_url, Path(tmp) / "loadtest.db")
+        app = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            env=env,
+        )
+        try:
+            wait_ready(base_url)
+            recorder = Recorder()
+            content = (FIXTURES / "source_document.txt").read_text(encoding="utf-8")
+            workload = Workload(base_url, fake_url, recorder, content, args.num_questions)
+            elapsed = run_users(workload, parse_mix(args.mix), args.users, args.duration)
+        finally:
+            app.terminate()
+            app.wait(timeout=10)
+            fake_server.shutdown()
+
+    report = {
+        "provider": args.provider,
+        "users": args.users,
+        "workers": args.workers,
+        "duration_s": round(elapsed, 2),
+        "fake_llm": {**vars(fake.config), "calls": fake.calls},
+        "endpoints": recorder.report(elapsed),
+    }
+    print(f"{'endpoint':<22}{'reqs':>7}{'ok':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, row in report["endpoints"].items():
+        print(
+            f"{endpoint:<22}{row['requests']:>7}{row['ok']:>7}{row['throughput_rps']:>9}"
+            f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+        )
+    print(f"\nfake LLM calls: {fake.calls}")
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,26 +11,176 @@ DB_PATH = DATA_DIR / "quiz.db"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
-DATABASE_URL = f"sqlite:///{DB_PATH}"
+DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DB_PATH}")
 
 # LLM configuration
-LLM_PROVIDER = os.getenv("LLM_PROVIDER", "huggingface")  # "ollama", "huggingface", or "groq"
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "huggingface")  # "ollama", "huggingface", "groq" or "template"
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral")  # e.g. "mistral", "llama3"
+# Preload the model at startup and keep it resident between requests
+# (Ollama duration string, or "-1" for forever).
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "1") == "1"
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# num_ctx is sized from the prompt plus num_predict within these bounds.
+OLLAMA_NUM_CTX_MIN = int(os.getenv("OLLAMA_NUM_CTX_MIN", "2048"))
+OLLAMA_NUM_CTX_MAX = int(os.getenv("OLLAMA_NUM_CTX_MAX", "16384"))
+# Calls whose reported model load time exceeds this count as cold starts.
+OLLAMA_COLD_LOAD_S = float(os.getenv("OLLAMA_COLD_LOAD_S", "1.0"))
+# Retries and repairs for the same document continue from the `context` Ollama
+# returned for the previous call instead of resending (and re-evaluating) it.
+# Only within one request: separate requests send the full prompt and rely on
+# Ollama's own prompt-prefix cache.
+OLLAMA_CONTEXT_REUSE = os.getenv("OLLAMA_CONTEXT_REUSE", "1") == "1"
 HUGGINGFACE_API_URL = os.getenv(
     "HUGGINGFACE_API_URL",
     "https://router.huggingface.co/hf-inference/models",
 )
 HUGGINGFACE_MODEL = os.getenv("HUGGINGFACE_MODEL", "HuggingFaceTB/SmolLM3-3B")
 HUGGINGFACE_API_TOKEN = os.getenv("HUGGINGFACE_API_TOKEN", "")
+# Probed chat/legacy API, JSON mode and context size per endpoint.
+HF_CAPABILITY_CACHE_PATH = Path(os.getenv("HF_CAPABILITY_CACHE_PATH", str(DATA_DIR / "hf_capabilities.json")))
+HF_CAPABILITY_TTL_S = float(os.getenv("HF_CAPABILITY_TTL_S", str(24 * 3600)))
 GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+# Providers to route generations between, in order of preference
+# ("groq,ollama") or weighted ("groq:3,ollama:1"); defaults to LLM_PROVIDER.
+# With several, a generation still running after the primary's observed p95
+# (known once HEDGE_MIN_SAMPLES calls have finished) is hedged to the next
+# provider; at most HEDGE_MAX_RATIO of generations are hedged.
+LLM_PROVIDERS = os.getenv("LLM_PROVIDERS", LLM_PROVIDER)
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "1") == "1"
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MAX_RATIO = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
+# Per-provider circuit breakers: when BREAKER_ERROR_RATE of the last
+# BREAKER_WINDOW calls (at least BREAKER_MIN_CALLS) failed, or BREAKER_SLOW_RATE
+# took longer than BREAKER_SLOW_CALL_S, calls to the provider fail fast for
+# BREAKER_OPEN_S; then one trial call decides whether it closes again.
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_CALL_S = float(os.getenv("BREAKER_SLOW_CALL_S", "90"))
+BREAKER_SLOW_RATE = float(os.getenv("BREAKER_SLOW_RATE", "0.8"))
+BREAKER_OPEN_S = float(os.getenv("BREAKER_OPEN_S", "30"))
+# Background reachability checks feeding /health and the breakers (0 disables).
+PROVIDER_PROBE_INTERVAL_S = float(os.getenv("PROVIDER_PROBE_INTERVAL_S", "15"))
+PROVIDER_PROBE_TIMEOUT_S = float(os.getenv("PROVIDER_PROBE_TIMEOUT_S", "5"))
+
+# How source text is fitted into the generation prompt: "extractive" keeps the
+# most informative sentences from the whole document, "truncate" keeps the
+# first PROMPT_TOKEN_BUDGET * 4 characters. Extractive ranking only reads the
+# first PROMPT_COMPRESSION_WINDOW budgets' worth of text, bounding its cost.
+PROMPT_CONTENT_MODE = os.getenv("PROMPT_CONTENT_MODE", "extractive")
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+PROMPT_COMPRESSION_WINDOW = int(os.getenv("PROMPT_COMPRESSION_WINDOW", "16"))
+
+# Output-token budgets: once a (provider, model, task, difficulty, count) key
+# has TOKEN_BUDGET_MIN_SAMPLES completions, max_tokens becomes the p99 of the
+# last TOKEN_BUDGET_WINDOW completions times TOKEN_BUDGET_MARGIN.
+TOKEN_BUDGET_ADAPTIVE = os.getenv("TOKEN_BUDGET_ADAPTIVE", "1") == "1"
+TOKEN_BUDGET_MIN_SAMPLES = int(os.getenv("TOKEN_BUDGET_MIN_SAMPLES", "20"))
+TOKEN_BUDGET_WINDOW = int(os.getenv("TOKEN_BUDGET_WINDOW", "500"))
+TOKEN_BUDGET_MARGIN = float(os.getenv("TOKEN_BUDGET_MARGIN", "1.2"))
+TOKEN_BUDGET_FLOOR = int(os.getenv("TOKEN_BUDGET_FLOOR", "256"))
+TOKEN_BUDGET_CEILING = int(os.getenv("TOKEN_BUDGET_CEILING", "4096"))
+
+# Maximum LLM generations run at once by batch jobs. Defaults are sized to
+# each provider's typical limits: a local Ollama serves one model at a time,
+# hosted APIs tolerate a few parallel requests before rate limiting kicks in.
+DEFAULT_LLM_CONCURRENCY = {"ollama": 1, "huggingface": 2, "groq": 4, "template": 8}
+LLM_MAX_CONCURRENCY = int(
+    os.getenv("LLM_MAX_CONCURRENCY", DEFAULT_LLM_CONCURRENCY.get(LLM_PROVIDER, 2))
+)
+
+# Admission control for /generate-quiz, per provider: at most
+# ADMISSION_MAX_IN_FLIGHT generations run at once and ADMISSION_MAX_QUEUE more
+# wait, each for no longer than ADMISSION_QUEUE_TIMEOUT_S. Requests beyond
+# that are shed at once: a degraded quiz (DEGRADED_FALLBACK) or 429.
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", str(max(2, 2 * LLM_MAX_CONCURRENCY))))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", str(4 * ADMISSION_MAX_IN_FLIGHT)))
+ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "30"))
+
+# End-to-end deadline for one quiz generation (retries, repairs and backoff
+# included). Clients may ask for less, or up to MAX_REQUEST_DEADLINE_S.
+REQUEST_DEADLINE_S = float(os.getenv("REQUEST_DEADLINE_S", "120"))
+MAX_REQUEST_DEADLINE_S = float(os.getenv("MAX_REQUEST_DEADLINE_S", "600"))
+# Provider calls are not started with less time than this left.
+DEADLINE_MIN_CALL_S = float(os.getenv("DEADLINE_MIN_CALL_S", "2"))
+LLM_HTTP_WORKERS = int(os.getenv("LLM_HTTP_WORKERS", "64"))
+
+# Identical concurrent generations (same content hash and settings) share one
+# LLM call. "share" hands every caller the same questions; "distinct" waits
+# COALESCE_WINDOW_MS for callers to gather, generates a larger pool (up to
+# COALESCE_POOL_MAX_QUESTIONS) and gives each caller its own draw from it.
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "1") == "1"
+COALESCE_MODE = os.getenv("COALESCE_MODE", "share")  # "share" or "distinct"
+COALESCE_WINDOW_MS = int(os.getenv("COALESCE_WINDOW_MS", "250" if COALESCE_MODE == "distinct" else "0"))
+COALESCE_WAIT_TIMEOUT_S = float(os.getenv("COALESCE_WAIT_TIMEOUT_S", "180"))
+COALESCE_POOL_MAX_QUESTIONS = int(os.getenv("COALESCE_POOL_MAX_QUESTIONS", "30"))
+
+# Constrain model output with the provider's native JSON Schema / JSON mode.
+# "auto" tries schema, then JSON mode, then a plain prompt; "json" skips the
+# schema; "off" always sends a plain prompt.
+STRUCTURED_OUTPUT = os.getenv("STRUCTURED_OUTPUT", "auto")
+
+# When the provider has an outage (unreachable, 5xx or rate limited, circuit
+# open, deadline, retries exhausted) quizzes are built by the local template
+# generator instead of returning an error; the response is flagged with
+# "degraded": true. Configuration errors (unknown provider, missing or rejected
+# API key, other 4xx) are always returned as errors.
+DEGRADED_FALLBACK = os.getenv("DEGRADED_FALLBACK", "1") == "1"
+
+# "retry" drops questions that miss the difficulty heuristics and regenerates
+# when too few remain; "rank" asks for RANK_SURPLUS_RATIO extra questions in one
+# call, scores every candidate and keeps the best.
+GENERATION_STRATEGY = os.getenv("GENERATION_STRATEGY", "retry")
+RANK_SURPLUS_RATIO = float(os.getenv("RANK_SURPLUS_RATIO", "0.5"))
+
+# /generate-quiz-set asks for all difficulties in one call; larger sets are
+# split into calls of at most this many questions.
+QUIZ_SET_MAX_QUESTIONS_PER_CALL = int(os.getenv("QUIZ_SET_MAX_QUESTIONS_PER_CALL", "30"))
 
 # Quiz settings
 MIN_QUESTIONS = 5
 MAX_QUESTIONS = 10
 DIFFICULTIES = ["easy", "medium", "hard"]
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "50"))
+# Answer sheets accepted by one /quiz/{id}/submit-batch request.
+MAX_BULK_SHEETS = int(os.getenv("MAX_BULK_SHEETS", "5000"))
+
+# Admin endpoints (e.g. /export) are disabled unless a token is configured.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Signed quiz tokens: with a secret set, generated quizzes come with a token
+# holding the answer key, and /submit-quiz can grade from it without reading
+# the quiz. Comma-separate several secrets to rotate (the first one signs).
+# TTL 0 means tokens do not expire.
+QUIZ_TOKEN_SECRET = os.getenv("QUIZ_TOKEN_SECRET", "")
+QUIZ_TOKEN_TTL_S = int(os.getenv("QUIZ_TOKEN_TTL_S", str(30 * 24 * 3600)))
+
+# Token-graded submissions are written in the background, batched into one
+# transaction per interval; past MAX_QUEUE waiting, submitters write inline.
+RESPONSE_WRITE_INTERVAL_MS = int(os.getenv("RESPONSE_WRITE_INTERVAL_MS", "200"))
+RESPONSE_WRITE_MAX_BATCH = int(os.getenv("RESPONSE_WRITE_MAX_BATCH", "500"))
+RESPONSE_WRITE_MAX_QUEUE = int(os.getenv("RESPONSE_WRITE_MAX_QUEUE", "10000"))
+
+# Slow-request sampler: requests slower than the threshold have their stage
+# timeline written to a bounded ring buffer under PROFILE_DIR. Stages listed
+# in PROFILE_CPU_STAGES are cProfiled for PROFILE_CPU_SAMPLE_RATE of calls.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "1") == "1"
+SLOW_REQUEST_THRESHOLD_S = float(os.getenv("SLOW_REQUEST_THRESHOLD_S", "10"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(DATA_DIR / "profiles")))
+PROFILE_MAX_CAPTURES = int(os.getenv("PROFILE_MAX_CAPTURES", "50"))
+PROFILE_MAX_CAPTURES_PER_MINUTE = int(os.getenv("PROFILE_MAX_CAPTURES_PER_MINUTE", "6"))
+PROFILE_CPU_STAGES = frozenset(
+    s.strip() for s in os.getenv("PROFILE_CPU_STAGES", "extract_pdf,extract_url").split(",") if s.strip()
+)
+PROFILE_CPU_SAMPLE_RATE = float(os.getenv("PROFILE_CPU_SAMPLE_RATE", "0"))
 
 # Upload constraints
 MAX_FILE_SIZE_BYTES = 50 * 1024 * 1024  # 50 MB
+
+# Text extracted from uploaded PDFs, cached by content hash
+EXTRACTION_CACHE_DIR = Path(os.getenv("EXTRACTION_CACHE_DIR", str(DATA_DIR / "extractions")))
+EXTRACTION_CACHE_MEMORY_ITEMS = int(os.getenv("EXTRACTION_CACHE_MEMORY_ITEMS", "64"))
+EXTRACTION_CACHE_DISK_ITEMS = int(os.getenv("EXTRACTION_CACHE_DISK_ITEMS", "1000"))
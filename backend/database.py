@@ -1,10 +1,12 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from typing import Any, Iterable, Iterator, List
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 from config import DATABASE_URL
 
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False},
+    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {},
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -13,9 +15,63 @@ Base = declarative_base()
 
 
 def init_db():
-    from models import Quiz, QuizResponse  # noqa: F401
+    from models import (  # noqa: F401
+        Quiz,
+        QuizQuestionStats,
+        QuizResponse,
+        QuizScoreCount,
+        QuizStats,
+    )
 
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
+
+
+def _add_missing_columns() -> None:
+    # create_all never alters an existing table; columns added to a model since are
+    # nullable or have a server default, so a plain ADD COLUMN brings old databases up to date.
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+                conn.execute(text(ddl))
+
+
+# Keeps `IN (...)` lists well under SQLite's bound-parameter limit (999 before 3.32).
+IN_CLAUSE_CHUNK = 500
+
+
+def upsert_insert(db: Session, model: Any) -> Any:
+    """`INSERT` with `ON CONFLICT` support for the session's database, or None if it has none."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert(model)
+
+
+def chunked(values: Iterable[Any], size: int = IN_CLAUSE_CHUNK) -> Iterator[List[Any]]:
+    chunk: List[Any] = []
+    for value in values:
+        chunk.append(value)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
 def get_db():
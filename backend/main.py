@@ -1,25 +1,70 @@
 from __future__ import annotations
 
-from fastapi import Depends, FastAPI, File, HTTPException, UploadFile
+import asyncio
+import codecs
+import csv
+import math
+import secrets
+import threading
+import time
+from datetime import datetime
+from typing import List
+
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Request, UploadFile
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.params import Body
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
-from config import MAX_FILE_SIZE_BYTES, UPLOAD_DIR
+import metrics
+import profiling
+from config import (
+    ADMIN_TOKEN,
+    ADMISSION_QUEUE_TIMEOUT_S,
+    MAX_BULK_SHEETS,
+    MAX_FILE_SIZE_BYTES,
+    OLLAMA_WARMUP,
+    REQUEST_DEADLINE_S,
+    UPLOAD_DIR,
+)
 from database import get_db, init_db
 from schemas import (
+    GenerateQuizBatchRequest,
     GenerateQuizRequest,
     GenerateQuizResponse,
+    GenerateQuizSetRequest,
+    GenerateQuizSetResponse,
     GetQuizResponse,
+    QuizStatsResponse,
+    RegenerateQuestionRequest,
+    RegenerateQuestionResponse,
+    SubmitBatchRequest,
+    SubmitBatchResponse,
     SubmitQuizRequest,
     SubmitQuizResponse,
     UploadPdfResponse,
     UploadUrlRequest,
     UploadUrlResponse,
 )
+from services.admission import Overloaded, admission_for
+from services.batch_service import BatchGenerator
+from services.bulk_grading import BulkGrader, read_csv_sheets
+from services.circuit_breaker import CircuitOpen
+from services.deadline import Deadline, DeadlineExceeded, RequestCancelled
+from services.extraction_cache import extract_pdf_cached
 from services.langextract import LangExtract
-from services.quiz_service import QuizService
+from services.llm_service import LLMService
+from services.provider_health import health_prober, health_report
+from services.provider_router import provider_router
+from services.quiz_service import QuizConflict, QuizNotFound, QuizService
+from services.quiz_tokens import InvalidQuizToken
+from services.response_writer import response_writer
+from services.token_budget import token_budget
+from services.transfer_service import stream_export
 
 app = FastAPI(title="Free MCQ Quiz Generator", version="1.0.0")
 
@@ -32,9 +77,61 @@ app.add_middleware(
 )
 
 
+class RequestLatencyMiddleware:
+    # Plain ASGI rather than @app.middleware("http"): BaseHTTPMiddleware wraps
+    # `receive` in a way that hides client disconnects from the endpoints.
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timeline_token = profiling.start_timeline(scope["method"], scope["path"])
+        status = 500
+
+        async def send_with_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            metrics.HTTP_REQUEST_SECONDS.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status),
+            ).observe(time.perf_counter() - started)
+            capture = profiling.finish_timeline(timeline_token, status)
+            if capture is not None:
+                # Written off the event loop; the response is not held up.
+                asyncio.get_running_loop().run_in_executor(None, profiling.capture_store.save, capture)
+
+
+app.add_middleware(RequestLatencyMiddleware)
+
+
+def require_admin(authorization: str | None = Header(default=None)) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN.")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
+
+
 @app.on_event("startup")
 def startup_event() -> None:
     init_db()
+    if "ollama" in provider_router.names and OLLAMA_WARMUP:
+        # Load the model in the background so startup is not held up.
+        threading.Thread(target=LLMService("ollama").warm_up, name="ollama-warmup", daemon=True).start()
+    health_prober.start()
+    response_writer.start()
     # Mount frontend only when static directories exist.
     # In API-only deployments (e.g., Railway backend service), these paths
     # are often absent and should not crash the server startup.
@@ -52,32 +149,23 @@ async def upload_pdf(file: UploadFile = File(...)) -> UploadPdfResponse:
     if file.content_type not in ("application/pdf", "application/x-pdf"):
         raise HTTPException(status_code=400, detail="File must be a PDF.")
 
-    data = await file.read()
-    if len(data) > MAX_FILE_SIZE_BYTES:
+    if file.size is not None and file.size > MAX_FILE_SIZE_BYTES:
         raise HTTPException(status_code=400, detail="PDF too large (limit 50 MB).")
 
-    tmp_path = UPLOAD_DIR / file.filename
     try:
-        with open(tmp_path, "wb") as f:
-            f.write(data)
-
-        extracted = LangExtract.from_pdf(str(tmp_path), label=file.filename)
+        text = await run_in_threadpool(extract_pdf_cached, file.file, file.filename, MAX_FILE_SIZE_BYTES)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
-    finally:
-        try:
-            tmp_path.unlink(missing_ok=True)  # type: ignore[call-arg]
-        except Exception:
-            pass
 
     # Return full content (client will use it for quiz generation)
-    return UploadPdfResponse(content=extracted.text)
+    return UploadPdfResponse(content=text)
 
 
 @app.post("/upload/url", response_model=UploadUrlResponse)
 async def upload_url(payload: UploadUrlRequest) -> UploadUrlResponse:
     try:
-        extracted = LangExtract.from_url(str(payload.url))
+        with metrics.stage("extract_url"):
+            extracted = LangExtract.from_url(str(payload.url))
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc)) from exc
 
@@ -85,34 +173,129 @@ async def upload_url(payload: UploadUrlRequest) -> UploadUrlResponse:
     return UploadUrlResponse(content=extracted.text)
 
 
+async def _cancel_on_disconnect(request: Request, deadline: Deadline, poll_s: float = 0.5) -> None:
+    while not deadline.cancelled:
+        if await request.is_disconnected():
+            deadline.cancel()
+            return
+        await asyncio.sleep(poll_s)
+
+
 @app.post("/generate-quiz", response_model=GenerateQuizResponse)
 async def generate_quiz(
+    http_request: Request,
     request: GenerateQuizRequest = Body(...),
-    db: Session = Depends(get_db),
 ) -> GenerateQuizResponse:
     if len(request.content.strip()) < 50:
         raise HTTPException(
             status_code=400, detail="Content too short; please provide more text."
         )
 
-    service = QuizService(db)
+    deadline = Deadline(request.deadline_s or REQUEST_DEADLINE_S)
+    watcher = asyncio.create_task(_cancel_on_disconnect(http_request, deadline))
+    # No database session is held while the LLM works; the service opens one to commit.
+    service = QuizService()
+    quiz_args = dict(
+        content=request.content,
+        source_type=request.source_type,
+        source_label=request.source_label,
+        difficulty=request.normalised_difficulty(),
+        num_questions=request.num_questions,
+    )
     try:
-        result = service.generate_quiz(
-            content=request.content,
-            source_type=request.source_type,
-            source_label=request.source_label,
-            difficulty=request.normalised_difficulty(),
-            num_questions=request.num_questions,
-        )
+        # Admission is decided on the event loop, before a worker thread is taken.
+        async with admission_for(service.llm.provider).slot(
+            timeout=min(deadline.remaining(), ADMISSION_QUEUE_TIMEOUT_S)
+        ):
+            # Blocking work runs in the threadpool so the loop can notice a disconnect.
+            result = await run_in_threadpool(service.generate_quiz, **quiz_args, deadline=deadline)
+    except Overloaded as exc:
+        result = await run_in_threadpool(service.generate_degraded_quiz, **quiz_args, reason="overloaded")
+        if result is None:
+            raise HTTPException(
+                status_code=429, detail=str(exc), headers={"Retry-After": str(exc.retry_after)}
+            ) from exc
+    except RequestCancelled as exc:
+        raise HTTPException(status_code=499, detail="Client closed request.") from exc
+    except DeadlineExceeded as exc:
+        metrics.DEADLINE_EVENTS.labels("exceeded").inc()
+        raise HTTPException(status_code=504, detail=str(exc)) from exc
+    except CircuitOpen as exc:
+        raise HTTPException(
+            status_code=503, detail=str(exc), headers={"Retry-After": str(max(1, math.ceil(exc.retry_in)))}
+        ) from exc
     except RuntimeError as exc:
         # Typically raised when the LLM backend (e.g., Ollama) is unavailable.
         raise HTTPException(status_code=503, detail=str(exc)) from exc
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Quiz generation failed: {exc}") from exc
+    finally:
+        watcher.cancel()
 
     return GenerateQuizResponse(
         quiz_id=result["quiz_id"],
         questions=result["questions"],
+        degraded=result["degraded"],
+        quiz_token=result.get("quiz_token"),
+    )
+
+
+@app.post("/generate-quiz-set", response_model=GenerateQuizSetResponse)
+async def generate_quiz_set(
+    http_request: Request,
+    request: GenerateQuizSetRequest = Body(...),
+) -> GenerateQuizSetResponse:
+    """One quiz per requested difficulty, from a single generation over the source text."""
+    if len(request.content.strip()) < 50:
+        raise HTTPException(
+            status_code=400, detail="Content too short; please provide more text."
+        )
+
+    deadline = Deadline(request.deadline_s or REQUEST_DEADLINE_S)
+    watcher = asyncio.create_task(_cancel_on_disconnect(http_request, deadline))
+    service = QuizService()
+    set_args = dict(
+        content=request.content,
+        source_type=request.source_type,
+        source_label=request.source_label,
+        counts=request.difficulties,
+    )
+    try:
+        async with admission_for(service.llm.provider).slot(
+            timeout=min(deadline.remaining(), ADMISSION_QUEUE_TIMEOUT_S)
+        ):
+            quizzes = await run_in_threadpool(service.generate_quiz_set, **set_args, deadline=deadline)
+    except Overloaded as exc:
+        quizzes = await run_in_threadpool(service.generate_degraded_quiz_set, **set_args, reason="overloaded")
+        if quizzes is None:
+            raise HTTPException(
+                status_code=429, detail=str(exc), headers={"Retry-After": str(exc.retry_after)}
+            ) from exc
+    except RequestCancelled as exc:
+        raise HTTPException(status_code=499, detail="Client closed request.") from exc
+    except DeadlineExceeded as exc:
+        metrics.DEADLINE_EVENTS.labels("exceeded").inc()
+        raise HTTPException(status_code=504, detail=str(exc)) from exc
+    except CircuitOpen as exc:
+        raise HTTPException(
+            status_code=503, detail=str(exc), headers={"Retry-After": str(max(1, math.ceil(exc.retry_in)))}
+        ) from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Quiz generation failed: {exc}") from exc
+    finally:
+        watcher.cancel()
+
+    return GenerateQuizSetResponse(quizzes=quizzes)
+
+
+@app.post("/generate-quiz/batch")
+async def generate_quiz_batch(payload: GenerateQuizBatchRequest = Body(...)) -> StreamingResponse:
+    """Generate many quizzes; streams one NDJSON result line per item as each finishes."""
+    return StreamingResponse(
+        BatchGenerator().stream_ndjson(payload.items),
+        media_type="application/x-ndjson",
     )
 
 
@@ -127,6 +310,60 @@ def get_quiz(quiz_id: str, db: Session = Depends(get_db)) -> GetQuizResponse:
     return GetQuizResponse(**data)
 
 
+@app.post("/quiz/{quiz_id}/questions/{index}/regenerate", response_model=RegenerateQuestionResponse)
+async def regenerate_question(
+    http_request: Request,
+    quiz_id: str,
+    index: int,
+    request: RegenerateQuestionRequest | None = Body(None),
+) -> RegenerateQuestionResponse:
+    """Replace one question of a stored quiz, generated from the quiz's stored content."""
+    deadline = Deadline((request.deadline_s if request else None) or REQUEST_DEADLINE_S)
+    watcher = asyncio.create_task(_cancel_on_disconnect(http_request, deadline))
+    service = QuizService()
+    try:
+        async with admission_for(service.llm.provider).slot(
+            timeout=min(deadline.remaining(), ADMISSION_QUEUE_TIMEOUT_S)
+        ):
+            result = await run_in_threadpool(service.regenerate_question, quiz_id, index, deadline=deadline)
+    except QuizNotFound as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except QuizConflict as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    except Overloaded as exc:
+        raise HTTPException(
+            status_code=429, detail=str(exc), headers={"Retry-After": str(exc.retry_after)}
+        ) from exc
+    except RequestCancelled as exc:
+        raise HTTPException(status_code=499, detail="Client closed request.") from exc
+    except DeadlineExceeded as exc:
+        metrics.DEADLINE_EVENTS.labels("exceeded").inc()
+        raise HTTPException(status_code=504, detail=str(exc)) from exc
+    except CircuitOpen as exc:
+        raise HTTPException(
+            status_code=503, detail=str(exc), headers={"Retry-After": str(max(1, math.ceil(exc.retry_in)))}
+        ) from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail=f"Question regeneration failed: {exc}") from exc
+    finally:
+        watcher.cancel()
+
+    return RegenerateQuestionResponse(**result)
+
+
+@app.get("/quiz/{quiz_id}/stats", response_model=QuizStatsResponse)
+def get_quiz_stats(quiz_id: str, db: Session = Depends(get_db)) -> QuizStatsResponse:
+    service = QuizService(db)
+    try:
+        data = service.get_quiz_stats(quiz_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+    return QuizStatsResponse(**data)
+
+
 @app.post("/submit-quiz", response_model=SubmitQuizResponse)
 def submit_quiz(
     payload: SubmitQuizRequest,
@@ -134,7 +371,13 @@ def submit_quiz(
 ) -> SubmitQuizResponse:
     service = QuizService(db)
     try:
-        result = service.submit_quiz(payload.quiz_id, payload.answers)
+        if payload.quiz_token is not None:
+            # Graded from the token; this request never reads the database.
+            result = service.submit_quiz_token(payload.quiz_token, payload.answers, quiz_id=payload.quiz_id)
+        else:
+            result = service.submit_quiz(payload.quiz_id, payload.answers)
+    except InvalidQuizToken as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     except ValueError as exc:
         raise HTTPException(status_code=404, detail=str(exc)) from exc
 
@@ -146,9 +389,115 @@ def submit_quiz(
     )
 
 
+@app.post("/quiz/{quiz_id}/submit-batch", response_model=SubmitBatchResponse)
+async def submit_batch(quiz_id: str, request: Request, db: Session = Depends(get_db)) -> SubmitBatchResponse:
+    """Grade many answer sheets in one pass; JSON body or `text/csv` (see services/bulk_grading.py)."""
+    if request.headers.get("content-type", "").startswith("text/csv"):
+        # Header plus MAX_BULK_SHEETS rows; stop reading as soon as the body has more.
+        lines = await _read_lines(request, max_lines=MAX_BULK_SHEETS + 1)
+        if lines is None:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_SHEETS} answer sheets per request.")
+        try:
+            sheets = list(read_csv_sheets(lines))
+        except (ValueError, csv.Error) as exc:
+            raise HTTPException(status_code=400, detail=f"Invalid CSV: {exc}") from exc
+        if not sheets:
+            raise HTTPException(status_code=400, detail="CSV has no answer sheets.")
+        if len(sheets) > MAX_BULK_SHEETS:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_SHEETS} answer sheets per request.")
+    else:
+        try:
+            payload = SubmitBatchRequest.model_validate_json(await request.body())
+        except ValidationError as exc:
+            raise RequestValidationError(exc.errors(include_url=False)) from exc
+        sheets = [(sheet.sheet_id, sheet.answers) for sheet in payload.sheets]
+
+    try:
+        result = await run_in_threadpool(BulkGrader(db).grade, quiz_id, sheets)
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    return SubmitBatchResponse(**result)
+
+
+async def _read_lines(request: Request, max_lines: int) -> List[str] | None:
+    """Request body as text lines, decoded as it streams in; None once it has more than `max_lines` non-blank lines."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    lines: List[str] = []
+    filled = 0
+    pending = ""
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        *complete, pending = pending.split("\n")
+        lines.extend(complete)
+        filled += sum(1 for line in complete if line.strip())
+        if filled > max_lines:
+            return None
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        lines.append(pending)
+        filled += 1 if pending.strip() else 0
+    return lines if filled <= max_lines else None
+
+
+@app.get("/export", dependencies=[Depends(require_admin)])
+def export_data(
+    since: datetime | None = None,
+    until: datetime | None = None,
+    source_type: str | None = None,
+    include_responses: bool = True,
+) -> StreamingResponse:
+    """Stream quizzes (then responses) as NDJSON; import with `manage.py import-ndjson`."""
+    return StreamingResponse(
+        stream_export(
+            since=since,
+            until=until,
+            source_type=source_type,
+            include_responses=include_responses,
+        ),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.get("/metrics")
+def prometheus_metrics() -> Response:
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/metrics/token-budget")
+def token_budget_metrics() -> dict:
+    """Learned max_tokens table and stop-reason counts per provider/model/task."""
+    return {"adaptive": token_budget.adaptive, "keys": token_budget.snapshot()}
+
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+def list_profiles() -> dict:
+    """Slow-request captures in the ring buffer, newest first."""
+    return {
+        "threshold_s": profiling.SLOW_REQUEST_THRESHOLD_S,
+        "captures": profiling.capture_store.list(),
+    }
+
+
+@app.get("/admin/profiles/{capture_id}", dependencies=[Depends(require_admin)])
+def download_profile(capture_id: str) -> FileResponse:
+    try:
+        path = profiling.capture_store.path_for(capture_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    return FileResponse(path, media_type="application/json", filename=path.name)
+
+
+@app.on_event("shutdown")
+def shutdown_event() -> None:
+    health_prober.stop()
+    response_writer.stop()
+
+
 @app.get("/health")
 def health() -> dict:
-    return {"status": "ok"}
+    # Served from the background prober's cache; never waits on a provider.
+    return health_report()
 
 
 if __name__ == "__main__":
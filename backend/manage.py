@@ -0,0 +1,109 @@
+"""
+Maintenance commands for the backend.
+
+Run from the `backend/` directory, e.g.:
+
+    python manage.py backfill-stats
+    python manage.py backfill-stats --quiz-id <uuid>
+    python manage.py export-ndjson --since 2024-01-01 > quizzes.ndjson
+    python manage.py import-ndjson quizzes.ndjson --on-conflict replace
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from datetime import datetime
+
+from database import SessionLocal, init_db
+from services.stats_service import StatsService
+from services.transfer_service import CONFLICT_MODES, TransferService
+
+
+def backfill_stats(args: argparse.Namespace) -> None:
+    db = SessionLocal()
+    try:
+        replayed = StatsService(db).rebuild(args.quiz_id or None, chunk_size=args.chunk_size)
+    finally:
+        db.close()
+    print(f"Rebuilt quiz stats from {replayed} stored responses.")
+
+
+def export_ndjson(args: argparse.Namespace) -> None:
+    db = SessionLocal()
+    try:
+        out = open(args.output, "w", encoding="utf-8") if args.output != "-" else sys.stdout
+        try:
+            for line in TransferService(db).export_ndjson(
+                since=args.since,
+                until=args.until,
+                source_type=args.source_type,
+                include_responses=not args.quizzes_only,
+            ):
+                out.write(line)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+    finally:
+        db.close()
+
+
+def import_ndjson(args: argparse.Namespace) -> None:
+    db = SessionLocal()
+    try:
+        src = open(args.input, "r", encoding="utf-8") if args.input != "-" else sys.stdin
+        try:
+            counts = TransferService(db).import_ndjson(
+                src,
+                on_conflict=args.on_conflict,
+                batch_size=args.batch_size,
+            )
+        finally:
+            if src is not sys.stdin:
+                src.close()
+    finally:
+        db.close()
+    print(
+        f"Imported {counts['quizzes']} quizzes and {counts['quiz_responses']} responses "
+        f"({counts['skipped']} skipped).",
+        file=sys.stderr,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Quiz generator maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser(
+        "backfill-stats",
+        help="Rebuild per-quiz analytics counters from historical responses",
+    )
+    backfill.add_argument(
+        "--quiz-id",
+        action="append",
+        help="Only rebuild this quiz (repeatable); default is every quiz",
+    )
+    backfill.add_argument("--chunk-size", type=int, default=500)
+    backfill.set_defaults(func=backfill_stats)
+
+    export = commands.add_parser("export-ndjson", help="Write quizzes and responses as NDJSON")
+    export.add_argument("--output", "-o", default="-", help="File path, or - for stdout")
+    export.add_argument("--since", type=datetime.fromisoformat)
+    export.add_argument("--until", type=datetime.fromisoformat)
+    export.add_argument("--source-type", choices=["pdf", "url", "text"])
+    export.add_argument("--quizzes-only", action="store_true")
+    export.set_defaults(func=export_ndjson)
+
+    importer = commands.add_parser("import-ndjson", help="Load an NDJSON export")
+    importer.add_argument("input", help="File path, or - for stdin")
+    importer.add_argument("--on-conflict", choices=CONFLICT_MODES, default="skip")
+    importer.add_argument("--batch-size", type=int, default=500)
+    importer.set_defaults(func=import_ndjson)
+
+    args = parser.parse_args()
+    init_db()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
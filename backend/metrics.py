@@ -0,0 +1,207 @@
+"""
+Prometheus metrics for the quiz pipeline.
+
+With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR to an empty
+directory shared by the workers (start.sh clears it on boot); `/metrics` then
+aggregates every worker's samples. Without it, the default in-process
+registry is served.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+import profiling
+
+_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "quiz_stage_seconds",
+    "Time spent in each pipeline stage.",
+    ["stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_CALL_SECONDS = Histogram(
+    "quiz_llm_call_seconds",
+    "Latency of individual provider calls.",
+    ["provider", "task", "outcome"],
+    buckets=_LATENCY_BUCKETS,
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "quiz_http_request_seconds",
+    "HTTP request latency by route.",
+    ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_RETRIES = Counter(
+    "quiz_llm_retries_total",
+    "Generation attempts beyond the first (retry hints).",
+    ["provider"],
+)
+LLM_REPAIRS = Counter(
+    "quiz_llm_repairs_total",
+    "JSON repair calls made after unusable model output.",
+    ["provider", "outcome"],
+)
+QUESTION_REJECTIONS = Counter(
+    "quiz_question_rejections_total",
+    "Generated questions dropped by validation, by reason.",
+    ["reason"],
+)
+PROVIDER_ERRORS = Counter(
+    "quiz_llm_provider_errors_total",
+    "Provider call failures by kind.",
+    ["provider", "kind"],
+)
+STRUCTURED_OUTPUT = Counter(
+    "quiz_structured_output_total",
+    "Generation attempts by output mode; outcome parsed = usable without repair.",
+    ["provider", "mode", "outcome"],
+)
+DEADLINE_EVENTS = Counter(
+    "quiz_deadline_events_total",
+    "Generations stopped by their deadline (exceeded, retry_skipped) or by client disconnect (cancelled).",
+    ["event"],
+)
+ADMISSION = Counter(
+    "quiz_admission_total",
+    "Admission decisions for LLM-bound requests (admitted, queued, rejected, timed_out).",
+    ["provider", "outcome"],
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "quiz_admission_in_flight",
+    "Generations currently holding an admission slot.",
+    ["provider"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUED = Gauge(
+    "quiz_admission_queued",
+    "Generations waiting for an admission slot.",
+    ["provider"],
+    multiprocess_mode="livesum",
+)
+PROVIDER_ROUTING = Counter(
+    "quiz_provider_routing_total",
+    "Routed generation legs by provider: started as primary/hedge/failover, ended won/failed/cancelled.",
+    ["provider", "event"],
+)
+BREAKER_STATE = Gauge(
+    "quiz_breaker_state",
+    "Provider circuit breaker state (0 closed, 1 half-open, 2 open).",
+    ["provider"],
+    multiprocess_mode="max",
+)
+BREAKER_TRANSITIONS = Counter(
+    "quiz_breaker_transitions_total",
+    "Provider circuit breaker state changes, by the state entered.",
+    ["provider", "state"],
+)
+BREAKER_REJECTED = Counter(
+    "quiz_breaker_rejected_total",
+    "Provider calls refused at once because the circuit was open.",
+    ["provider"],
+)
+DEGRADED_GENERATIONS = Counter(
+    "quiz_degraded_generations_total",
+    "Quizzes built by the local template generator instead of the LLM, by reason.",
+    ["reason"],
+)
+RANK_SURPLUS_TOKENS = Counter(
+    "quiz_rank_surplus_tokens_total",
+    "Estimated output tokens spent on surplus candidates in rank mode.",
+    ["provider"],
+)
+RANK_RETRIES_AVOIDED = Counter(
+    "quiz_rank_retries_avoided_total",
+    "Rank-mode attempts that succeeded where the strict difficulty filter would have forced a retry.",
+    ["provider"],
+)
+LLM_STOP_REASONS = Counter(
+    "quiz_llm_stop_reasons_total",
+    "Why completions ended (stop vs length truncation).",
+    ["provider", "model", "task", "reason"],
+)
+GENERATION_COALESCING = Counter(
+    "quiz_generation_coalescing_total",
+    "Quiz generations by single-flight role (leader ran the LLM call, follower shared it).",
+    ["role"],
+)
+EXTRACTION_CACHE = Counter(
+    "quiz_extraction_cache_total",
+    "Uploaded-document extraction cache lookups by result.",
+    ["result"],
+)
+OLLAMA_CALL_SECONDS = Histogram(
+    "quiz_ollama_call_seconds",
+    "Ollama generate latency, split by whether the model had to be loaded first.",
+    ["start"],
+    buckets=_LATENCY_BUCKETS,
+)
+OLLAMA_PROMPT_EVAL_SECONDS = Histogram(
+    "quiz_ollama_prompt_eval_seconds",
+    "Ollama prompt evaluation time per call, by whether the same request's previous context was reused.",
+    ["reuse"],
+    buckets=_LATENCY_BUCKETS,
+)
+PROMPT_TOKENS = Counter(
+    "quiz_prompt_tokens_total",
+    "Prompt tokens per provider: evaluated by the model, or served from its prompt/KV cache (cached).",
+    ["provider", "kind"],
+)
+RESPONSE_WRITES = Counter(
+    "quiz_response_writes_total",
+    "Token-graded submissions by write path: queued for a batch, written inline (direct), or failed.",
+    ["path"],
+)
+RESPONSE_WRITE_BATCH = Histogram(
+    "quiz_response_write_batch_size",
+    "Submissions written per background transaction.",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000),
+)
+OLLAMA_WARMUP_SECONDS = Gauge(
+    "quiz_ollama_warmup_seconds",
+    "Duration of the startup model warm-up request.",
+    multiprocess_mode="max",
+)
+LLM_LEARNED_MAX_TOKENS = Gauge(
+    "quiz_llm_learned_max_tokens",
+    "Adaptive max_tokens currently derived for a budget key.",
+    ["provider", "model", "task", "difficulty", "num_questions"],
+    multiprocess_mode="max",
+)
+
+
+@contextmanager
+def stage(name: str, **attrs: Any) -> Iterator[None]:
+    """Time a pipeline stage; also adds a span to the request timeline, if any."""
+    started = time.perf_counter()
+    try:
+        with profiling.cpu_profile(name):
+            yield
+    finally:
+        duration = time.perf_counter() - started
+        STAGE_SECONDS.labels(name).observe(duration)
+        profiling.record_span(name, started, duration, attrs)
+
+
+def render() -> Tuple[bytes, str]:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -18,6 +18,8 @@ class Quiz(Base):
 
     content = Column(Text, nullable=False)  # extracted text (possibly truncated)
     questions_json = Column(Text, nullable=False)  # JSON list of questions
+    # JSON list: the quiz revision at which each question was last replaced (NULL: none replaced).
+    question_revisions_json = Column(Text, nullable=True)
 
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
@@ -31,6 +33,41 @@ class QuizResponse(Base):
     answers_json = Column(Text, nullable=False)  # JSON: {index: "A"/"B"/"C"/"D"}
     score = Column(Integer, nullable=False)
     total = Column(Integer, nullable=False)
+    quiz_revision = Column(Integer, nullable=False, default=0, server_default="0")  # revision graded against
 
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
+
+class QuizStats(Base):
+    """Running per-quiz aggregates, updated by every submission."""
+
+    __tablename__ = "quiz_stats"
+
+    quiz_id = Column(String(36), primary_key=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Integer, nullable=False, default=0)
+
+
+class QuizScoreCount(Base):
+    """Score histogram bucket: how many attempts scored exactly `score`."""
+
+    __tablename__ = "quiz_score_counts"
+
+    quiz_id = Column(String(36), primary_key=True)
+    score = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class QuizQuestionStats(Base):
+    """Per-question counters: correct answers and how often each option was picked."""
+
+    __tablename__ = "quiz_question_stats"
+
+    quiz_id = Column(String(36), primary_key=True)
+    question_index = Column(Integer, primary_key=True)
+    correct_count = Column(Integer, nullable=False, default=0)
+    count_a = Column(Integer, nullable=False, default=0)
+    count_b = Column(Integer, nullable=False, default=0)
+    count_c = Column(Integer, nullable=False, default=0)
+    count_d = Column(Integer, nullable=False, default=0)
+    count_unanswered = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,214 @@
+"""
+Slow-request sampler.
+
+Every request carries a lightweight stage timeline (filled in by
+`metrics.stage`). When a request takes longer than SLOW_REQUEST_THRESHOLD_S,
+its timeline is written to a bounded on-disk ring buffer under
+PROFILE_DIR. CPU-bound stages listed in PROFILE_CPU_STAGES can additionally
+be wrapped in cProfile for a sampled fraction of calls; the profile is kept
+only if the request turns out slow.
+
+Safe to leave on: the timeline is a short list per request, captures are
+rate limited and the buffer never holds more than PROFILE_MAX_CAPTURES files.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, ContextManager, Dict, Iterator, List
+
+from config import (
+    PROFILE_CPU_SAMPLE_RATE,
+    PROFILE_CPU_STAGES,
+    PROFILE_DIR,
+    PROFILE_MAX_CAPTURES,
+    PROFILE_MAX_CAPTURES_PER_MINUTE,
+    PROFILING_ENABLED,
+    SLOW_REQUEST_THRESHOLD_S,
+)
+
+_CAPTURE_ID_RE = re.compile(r"^[0-9]{14}-[0-9a-f]{12}$")
+_MAX_SPANS = 200
+_PROFILE_TOP_N = 40
+
+
+class Timeline:
+    def __init__(self, method: str, path: str) -> None:
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.cpu_profiles: List[Dict[str, str]] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, started: float, duration: float, attrs: Dict[str, Any]) -> None:
+        with self._lock:
+            if len(self.spans) < _MAX_SPANS:
+                self.spans.append(
+                    {
+                        "stage": name,
+                        "offset_ms": round((started - self.started) * 1000, 2),
+                        "duration_ms": round(duration * 1000, 2),
+                        **attrs,
+                    }
+                )
+
+    def add_cpu_profile(self, name: str, report: str) -> None:
+        with self._lock:
+            self.cpu_profiles.append({"stage": name, "report": report})
+
+
+_current: ContextVar[Timeline | None] = ContextVar("request_timeline", default=None)
+
+
+def start_timeline(method: str, path: str) -> Any:
+    """Begin a timeline for the current request; returns a token for `finish_timeline`."""
+    if not PROFILING_ENABLED:
+        return None
+    return _current.set(Timeline(method, path))
+
+
+def finish_timeline(token: Any, status: int) -> Dict[str, Any] | None:
+    """Close the request timeline; returns a capture if the request was slow."""
+    if token is None:
+        return None
+    timeline = _current.get()
+    _current.reset(token)
+    if timeline is None:
+        return None
+
+    duration = time.perf_counter() - timeline.started
+    if duration < SLOW_REQUEST_THRESHOLD_S or not _capture_limiter.allow():
+        return None
+
+    with timeline._lock:
+        return {
+            "method": timeline.method,
+            "path": timeline.path,
+            "status": status,
+            "duration_ms": round(duration * 1000, 2),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "timeline": list(timeline.spans),
+            "cpu_profiles": list(timeline.cpu_profiles),
+        }
+
+
+def record_span(name: str, started: float, duration: float, attrs: Dict[str, Any]) -> None:
+    timeline = _current.get()
+    if timeline is not None:
+        timeline.add_span(name, started, duration, attrs)
+
+
+def cpu_profile(name: str) -> ContextManager[None]:
+    """cProfile the enclosed stage for a sampled share of calls in configured stages."""
+    timeline = _current.get()
+    if (
+        timeline is None
+        or name not in PROFILE_CPU_STAGES
+        or random.random() >= PROFILE_CPU_SAMPLE_RATE
+    ):
+        return nullcontext()
+    return _profiled(timeline, name)
+
+
+@contextmanager
+def _profiled(timeline: Timeline, name: str) -> Iterator[None]:
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active on this thread.
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(_PROFILE_TOP_N)
+        timeline.add_cpu_profile(name, out.getvalue())
+
+
+class _RateLimiter:
+    def __init__(self, per_minute: int) -> None:
+        self.per_minute = per_minute
+        self.window_start = time.monotonic()
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= 60:
+                self.window_start, self.count = now, 0
+            if self.count >= self.per_minute:
+                return False
+            self.count += 1
+            return True
+
+
+_capture_limiter = _RateLimiter(PROFILE_MAX_CAPTURES_PER_MINUTE)
+
+
+class CaptureStore:
+    """Bounded ring buffer of slow-request captures, one JSON file each."""
+
+    def __init__(self, directory: Path = PROFILE_DIR, max_captures: int = PROFILE_MAX_CAPTURES) -> None:
+        self.directory = directory
+        self.max_captures = max_captures
+        self._lock = threading.Lock()
+
+    def save(self, capture: Dict[str, Any]) -> str:
+        capture_id = f"{datetime.now(timezone.utc):%Y%m%d%H%M%S}-{uuid.uuid4().hex[:12]}"
+        capture["id"] = capture_id
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / f"{capture_id}.json").write_text(json.dumps(capture), encoding="utf-8")
+            files = sorted(self.directory.glob("*.json"))
+            for stale in files[: max(0, len(files) - self.max_captures)]:
+                stale.unlink(missing_ok=True)
+        return capture_id
+
+    def list(self) -> List[Dict[str, Any]]:
+        summaries: List[Dict[str, Any]] = []
+        for path in sorted(self.directory.glob("*.json"), reverse=True):
+            try:
+                capture = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError):
+                continue
+            summaries.append(
+                {
+                    "id": capture.get("id", path.stem),
+                    "method": capture.get("method"),
+                    "path": capture.get("path"),
+                    "status": capture.get("status"),
+                    "duration_ms": capture.get("duration_ms"),
+                    "created_at": capture.get("created_at"),
+                    "stages": len(capture.get("timeline", [])),
+                    "cpu_profiles": [p["stage"] for p in capture.get("cpu_profiles", [])],
+                }
+            )
+        return summaries
+
+    def path_for(self, capture_id: str) -> Path:
+        if not _CAPTURE_ID_RE.match(capture_id):
+            raise ValueError("Capture not found")
+        path = self.directory / f"{capture_id}.json"
+        if not path.exists():
+            raise ValueError("Capture not found")
+        return path
+
+
+capture_store = CaptureStore()
@@ -1,8 +1,15 @@
-from typing import Dict, List
+from typing import Any, Dict, List
 
-from pydantic import BaseModel, Field, HttpUrl, constr
+from pydantic import BaseModel, Field, HttpUrl, constr, field_validator, model_validator
 
-from config import DIFFICULTIES, MIN_QUESTIONS, MAX_QUESTIONS
+from config import (
+    DIFFICULTIES,
+    MAX_BATCH_ITEMS,
+    MAX_BULK_SHEETS,
+    MAX_REQUEST_DEADLINE_S,
+    MIN_QUESTIONS,
+    MAX_QUESTIONS,
+)
 
 
 class UploadUrlRequest(BaseModel):
@@ -23,6 +30,9 @@ class GenerateQuizRequest(BaseModel):
     source_label: str | None = None
     difficulty: constr(strip_whitespace=True) = "medium"
     num_questions: int = Field(10, ge=MIN_QUESTIONS, le=MAX_QUESTIONS)
+    deadline_s: float | None = Field(
+        None, gt=0, le=MAX_REQUEST_DEADLINE_S, description="End-to-end time limit for generation (seconds)"
+    )
 
     def normalised_difficulty(self) -> str:
         d = self.difficulty.strip().lower()
@@ -31,6 +41,39 @@ class GenerateQuizRequest(BaseModel):
         return d
 
 
+class GenerateQuizSetRequest(BaseModel):
+    content: constr(min_length=50)
+    source_type: constr(strip_whitespace=True) = "text"
+    source_label: str | None = None
+    # Questions per difficulty, e.g. {"easy": 10, "hard": 5}; one quiz is created for each.
+    difficulties: Dict[str, int] = Field(..., min_length=1)
+    deadline_s: float | None = Field(
+        None, gt=0, le=MAX_REQUEST_DEADLINE_S, description="End-to-end time limit for generation (seconds)"
+    )
+
+    @field_validator("difficulties")
+    @classmethod
+    def _check_difficulties(cls, value: Dict[str, int]) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for difficulty, count in value.items():
+            d = difficulty.strip().lower()
+            if d not in DIFFICULTIES:
+                raise ValueError(f"unknown difficulty {difficulty!r}; use {', '.join(DIFFICULTIES)}")
+            if d in counts:
+                raise ValueError(f"difficulty {d!r} given twice")
+            if not MIN_QUESTIONS <= count <= MAX_QUESTIONS:
+                raise ValueError(f"{d}: num_questions must be between {MIN_QUESTIONS} and {MAX_QUESTIONS}")
+            counts[d] = count
+        # Easy to hard, whatever order the client used.
+        return {d: counts[d] for d in DIFFICULTIES if d in counts}
+
+
+class GenerateQuizBatchRequest(BaseModel):
+    # Loose on purpose: each item is validated as a GenerateQuizRequest on its
+    # own, so one bad item becomes an error line instead of failing the batch.
+    items: List[Dict[str, Any]] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS)
+
+
 class Question(BaseModel):
     question: str
     options: List[str]
@@ -40,6 +83,50 @@ class Question(BaseModel):
 class GenerateQuizResponse(BaseModel):
     quiz_id: str
     questions: List[Question]
+    # True when the LLM was unavailable and the questions were built from templates.
+    degraded: bool = False
+    # Signed answer key for /submit-quiz; only when QUIZ_TOKEN_SECRET is set.
+    quiz_token: str | None = None
+
+
+class GenerateQuizSetItem(BaseModel):
+    difficulty: str
+    quiz_id: str
+    questions: List[Question]
+    degraded: bool = False
+    quiz_token: str | None = None
+
+
+class GenerateQuizSetResponse(BaseModel):
+    quizzes: List[GenerateQuizSetItem]
+
+
+class GenerateQuizBatchItemResult(BaseModel):
+    """One NDJSON line of a `/generate-quiz/batch` stream."""
+
+    index: int
+    status: str  # "ok" | "error"
+    quiz_id: str | None = None
+    questions: List[Question] | None = None
+    degraded: bool | None = None
+    quiz_token: str | None = None
+    status_code: int | None = None
+    detail: str | None = None
+
+
+class RegenerateQuestionRequest(BaseModel):
+    deadline_s: float | None = Field(
+        None, gt=0, le=MAX_REQUEST_DEADLINE_S, description="End-to-end time limit for generation (seconds)"
+    )
+
+
+class RegenerateQuestionResponse(BaseModel):
+    quiz_id: str
+    index: int
+    question: Question
+    degraded: bool = False
+    # The old token still holds the old answer key.
+    quiz_token: str | None = None
 
 
 class QuizPublicQuestion(BaseModel):
@@ -56,9 +143,17 @@ class GetQuizResponse(BaseModel):
 
 
 class SubmitQuizRequest(BaseModel):
-    quiz_id: str
+    quiz_id: str | None = None
+    # With a quiz token the submission is graded from it, without reading the quiz.
+    quiz_token: str | None = None
     answers: Dict[int, str]
 
+    @model_validator(mode="after")
+    def _check_quiz(self) -> "SubmitQuizRequest":
+        if self.quiz_id is None and self.quiz_token is None:
+            raise ValueError("quiz_id or quiz_token is required")
+        return self
+
 
 class SubmitQuizResult(BaseModel):
     index: int
@@ -75,3 +170,62 @@ class SubmitQuizResponse(BaseModel):
     total: int
     percentage: float
     results: List[SubmitQuizResult]
+
+
+class AnswerSheet(BaseModel):
+    sheet_id: str | None = None
+    answers: Dict[int, str]
+
+
+class SubmitBatchRequest(BaseModel):
+    sheets: List[AnswerSheet] = Field(..., min_length=1, max_length=MAX_BULK_SHEETS)
+
+
+class SheetScore(BaseModel):
+    index: int
+    sheet_id: str | None
+    score: int
+    total: int
+    percentage: float
+
+
+class BatchQuestionSummary(BaseModel):
+    index: int
+    correct_rate: float
+    option_counts: Dict[str, int]
+    unanswered: int
+
+
+class BatchSummary(BaseModel):
+    sheets: int
+    average_score: float
+    median_score: float
+    min_score: int
+    max_score: int
+    score_histogram: Dict[int, int]
+    questions: List[BatchQuestionSummary]
+
+
+class SubmitBatchResponse(BaseModel):
+    quiz_id: str
+    sheets: List[SheetScore]
+    summary: BatchSummary
+
+
+class QuestionStats(BaseModel):
+    index: int
+    question: str
+    correct_answer: str
+    attempts: int
+    correct_count: int
+    correct_rate: float
+    option_counts: Dict[str, int]
+    unanswered: int
+
+
+class QuizStatsResponse(BaseModel):
+    quiz_id: str
+    attempts: int
+    average_score: float
+    score_histogram: Dict[int, int]
+    questions: List[QuestionStats]
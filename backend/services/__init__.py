@@ -2,7 +2,26 @@
 Service layer package.
 
 - `langextract` provides the LangExtract-style text extraction interface.
+- `extraction_cache` caches extracted upload text by content hash.
 - `llm_service` wraps calls to a local LLM (Ollama / HuggingFace).
+- `provider_router` routes, hedges and fails over generations across providers.
+- `hf_capabilities` probes and caches what a Hugging Face endpoint supports.
+- `structured_output` holds the question schema and output-mode fallback.
 - `quiz_service` orchestrates quiz generation and grading.
+- `stats_service` maintains per-quiz analytics counters.
+- `bulk_grading` grades many answer sheets for a quiz in one vectorized pass.
+- `batch_service` runs many generations concurrently for batch requests.
+- `transfer_service` streams quizzes and responses to/from NDJSON.
+- `compression` fits long source text into the prompt token budget.
+- `template_generator` builds quizzes from the text without an LLM (degraded mode).
+- `ranking` scores over-generated questions and keeps the best.
+- `token_budget` learns output-token limits from observed completions.
+- `single_flight` coalesces identical concurrent generations into one call.
+- `admission` bounds in-flight and queued generations per provider.
+- `circuit_breaker` fails calls to a failing provider fast until it recovers.
+- `provider_health` probes providers in the background for `/health`.
+- `quiz_tokens` issues and reads signed answer-key tokens for DB-free grading.
+- `response_writer` batches token-graded submissions into background transactions.
+- `deadline` carries request deadlines and cancellation into provider calls.
 """
 
@@ -0,0 +1,140 @@
+"""
+Admission control for LLM-bound requests.
+
+Each provider gets a bounded number of in-flight generations and a bounded
+wait queue (FIFO). A request that finds both full is refused at once with
+`Overloaded`, carrying a Retry-After estimate from how fast the queue has
+recently been draining, instead of piling up on worker threads and
+database connections. Admission happens on the event loop, before a worker
+thread is taken, so cheap endpoints keep their threads under overload.
+
+State is per process; with several uvicorn workers each enforces its own
+limits.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, suppress
+from typing import AsyncIterator, Deque, Dict
+
+import metrics
+from config import ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUE
+from services.deadline import call_latency
+
+MAX_RETRY_AFTER_S = 300
+
+
+class Overloaded(RuntimeError):
+    def __init__(self, provider: str, retry_after: int) -> None:
+        super().__init__(f"Quiz generation is at capacity for {provider}; retry in {retry_after}s.")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        provider: str,
+        max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+    ) -> None:
+        self.provider = provider
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Recent completion times, for the drain-rate estimate.
+        self._completions: Deque[float] = deque(maxlen=64)
+
+    @asynccontextmanager
+    async def slot(self, timeout: float | None = None) -> AsyncIterator[None]:
+        """Hold one in-flight slot; waits in the queue for at most ``timeout`` seconds."""
+        await self._acquire(timeout)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until a new request would likely be admitted, from the recent drain rate."""
+        ahead = len(self._waiters) + 1
+        now = time.monotonic()
+        recent = [t for t in self._completions if now - t < 120]
+        if len(recent) >= 2 and recent[-1] > recent[0]:
+            rate = (len(recent) - 1) / (recent[-1] - recent[0])
+            estimate = ahead / rate
+        else:
+            # Nothing has finished lately; assume every slot is one typical call from freeing up.
+            estimate = call_latency.expected(self.provider) * math.ceil(ahead / self.max_in_flight)
+        return int(min(MAX_RETRY_AFTER_S, max(1, math.ceil(estimate))))
+
+    async def _acquire(self, timeout: float | None) -> None:
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            self._report("admitted")
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._report("rejected")
+            raise Overloaded(self.provider, self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._report("queued")
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except BaseException as exc:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on.
+                self._release(completed=False)
+            else:
+                waiter.cancel()
+                with suppress(ValueError):
+                    self._waiters.remove(waiter)
+            self._report()
+            if isinstance(exc, asyncio.TimeoutError):
+                self._report("timed_out")
+                raise Overloaded(self.provider, self.retry_after()) from exc
+            raise
+
+    def _release(self, completed: bool = True) -> None:
+        if completed:
+            self._completions.append(time.monotonic())
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # Hand the slot straight to the next waiter; in-flight count is unchanged.
+                waiter.set_result(None)
+                self._report()
+                return
+        self._in_flight -= 1
+        self._report()
+
+    def _report(self, outcome: str | None = None) -> None:
+        if outcome is not None:
+            metrics.ADMISSION.labels(self.provider, outcome).inc()
+        metrics.ADMISSION_IN_FLIGHT.labels(self.provider).set(self._in_flight)
+        metrics.ADMISSION_QUEUED.labels(self.provider).set(len(self._waiters))
+
+
+_controllers: Dict[str, AdmissionController] = {}
+_controllers_lock = threading.Lock()
+
+
+def admission_for(provider: str) -> AdmissionController:
+    with _controllers_lock:
+        controller = _controllers.get(provider)
+        if controller is None:
+            controller = _controllers[provider] = AdmissionController(provider)
+        return controller
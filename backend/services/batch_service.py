@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List
+
+from pydantic import ValidationError
+
+import metrics
+from config import LLM_MAX_CONCURRENCY, REQUEST_DEADLINE_S
+from schemas import GenerateQuizBatchItemResult, GenerateQuizRequest
+from services.deadline import Deadline, DeadlineExceeded, RequestCancelled
+from services.quiz_service import QuizService
+
+# Shared by every batch request so concurrent batches together never exceed
+# the provider concurrency budget.
+_executor = ThreadPoolExecutor(
+    max_workers=max(1, LLM_MAX_CONCURRENCY),
+    thread_name_prefix="quiz-batch",
+)
+
+
+class BatchGenerator:
+    """Runs many quiz generations on the shared pool and yields them as they finish."""
+
+    def __init__(self, executor: ThreadPoolExecutor | None = None) -> None:
+        self.executor = executor or _executor
+
+    async def stream_ndjson(self, items: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        # Parent of every item's deadline; cancelling it stops running items too.
+        batch_deadline = Deadline(math.inf)
+        futures = [
+            loop.run_in_executor(self.executor, self._generate_one, index, item, batch_deadline)
+            for index, item in enumerate(items)
+        ]
+        completed = 0
+        try:
+            for next_done in asyncio.as_completed(futures):
+                result = await next_done
+                completed += 1
+                yield result.model_dump_json(exclude_none=True) + "\n"
+        finally:
+            # Client went away (or we are done): drop items that have not started.
+            for future in futures:
+                future.cancel()
+            if completed < len(futures):
+                batch_deadline.cancel()
+
+    def _generate_one(
+        self, index: int, raw_item: Dict[str, Any], batch_deadline: Deadline
+    ) -> GenerateQuizBatchItemResult:
+        try:
+            item = GenerateQuizRequest.model_validate(raw_item)
+        except ValidationError as exc:
+            detail = "; ".join(
+                f"{'.'.join(str(part) for part in error['loc']) or 'item'}: {error['msg']}" for error in exc.errors()
+            )
+            return self._error(index, 422, detail)
+        if len(item.content.strip()) < 50:
+            return self._error(index, 400, "Content too short; please provide more text.")
+        # The item's clock starts when it leaves the queue.
+        deadline = batch_deadline.child(item.deadline_s or REQUEST_DEADLINE_S)
+
+        try:
+            result: Dict[str, Any] = QuizService().generate_quiz(
+                content=item.content,
+                source_type=item.source_type,
+                source_label=item.source_label,
+                difficulty=item.normalised_difficulty(),
+                num_questions=item.num_questions,
+                deadline=deadline,
+            )
+        except RequestCancelled as exc:
+            return self._error(index, 499, str(exc))
+        except DeadlineExceeded as exc:
+            metrics.DEADLINE_EVENTS.labels("exceeded").inc()
+            return self._error(index, 504, str(exc))
+        except RuntimeError as exc:
+            return self._error(index, 503, str(exc))
+        except Exception as exc:
+            return self._error(index, 500, f"Quiz generation failed: {exc}")
+
+        return GenerateQuizBatchItemResult(
+            index=index,
+            status="ok",
+            quiz_id=result["quiz_id"],
+            questions=result["questions"],
+            degraded=result["degraded"] or None,
+            quiz_token=result.get("quiz_token"),
+        )
+
+    @staticmethod
+    def _error(index: int, status_code: int, detail: str) -> GenerateQuizBatchItemResult:
+        return GenerateQuizBatchItemResult(
+            index=index,
+            status="error",
+            status_code=status_code,
+            detail=detail,
+        )
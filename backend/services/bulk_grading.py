@@ -0,0 +1,170 @@
+"""
+Grading many answer sheets for one quiz at once.
+
+The answer key is read once. The sheets become one (sheets x questions)
+matrix of option codes (0-3 for A-D, -1 for unanswered or invalid), and
+NumPy grades them and computes the per-question option counts in a single
+pass. All `QuizResponse` rows go in with one executemany. The stats
+counters get one increment per quiz, score and question rather than one
+per sheet, and everything is committed in one transaction.
+
+Sheets come as JSON (`{"sheets": [{"sheet_id": ..., "answers": {...}}]}`)
+or as CSV with a header row: an optional `sheet_id` column, then one column
+per question, named by its 0-based index (`0`, `1`, …) or as `Q1`, `Q2`, ….
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+import metrics
+from models import Quiz, QuizResponse
+from services.quiz_service import ANSWER_LETTERS, answer_letter
+from services.stats_service import OPTION_COLUMNS, StatsService, question_revisions
+
+LETTERS = "".join(ANSWER_LETTERS)
+_CODES = {letter: code for code, letter in enumerate(LETTERS)}
+# Key code for an unreadable correct answer; no sheet code equals it.
+_NO_KEY = -2
+_QUESTION_COLUMN_RE = re.compile(r"^(?:(\d+)|[Qq](\d+))$")
+
+# (sheet_id, {question index: letter})
+Sheet = Tuple[str | None, Dict[Any, str]]
+
+
+def answer_matrix(answer_maps: Sequence[Dict[Any, str]], num_questions: int) -> np.ndarray:
+    matrix = np.full((len(answer_maps), num_questions), -1, dtype=np.int8)
+    for row, answers in enumerate(answer_maps):
+        for key, letter in answers.items():
+            try:
+                idx = int(key)
+            except (TypeError, ValueError):
+                continue
+            if 0 <= idx < num_questions:
+                matrix[row, idx] = _CODES.get(answer_letter(letter), -1)
+    return matrix
+
+
+def answer_key(questions: List[Dict[str, Any]]) -> np.ndarray:
+    # As in grade_answers, an unreadable key matches no answer.
+    return np.array(
+        [_CODES.get(answer_letter(q.get("correct_answer", "A")), _NO_KEY) for q in questions], dtype=np.int8
+    )
+
+
+def read_csv_sheets(lines: Iterable[str]) -> Iterator[Sheet]:
+    """Sheets from CSV text lines; raises ValueError on a header it cannot map."""
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    id_column: int | None = None
+    columns: List[Tuple[int, int]] = []  # (csv column, question index)
+    for col, name in enumerate(h.strip() for h in header):
+        if name.lower() == "sheet_id":
+            id_column = col
+            continue
+        match = _QUESTION_COLUMN_RE.match(name)
+        if not match:
+            raise ValueError(f"Unknown CSV column {name!r}; use sheet_id, 0, 1, … or Q1, Q2, ….")
+        columns.append((col, int(match.group(1)) if match.group(1) is not None else int(match.group(2)) - 1))
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        sheet_id = row[id_column].strip() if id_column is not None and id_column < len(row) else None
+        answers = {idx: row[col].strip() for col, idx in columns if col < len(row) and row[col].strip()}
+        yield sheet_id or None, answers
+
+
+class BulkGrader:
+    def __init__(self, db: Session) -> None:
+        self.db = db
+
+    def grade(self, quiz_id: str, sheets: Sequence[Sheet]) -> Dict[str, Any]:
+        quiz = self.db.get(Quiz, quiz_id)
+        if not quiz:
+            raise ValueError("Quiz not found")
+        questions: List[Dict[str, Any]] = json.loads(quiz.questions_json)
+        total = len(questions)
+        revision = max(question_revisions(quiz, total), default=0)
+
+        with metrics.stage("bulk_grade", sheets=len(sheets)):
+            answers = answer_matrix([a for _, a in sheets], total)
+            correct = answers == answer_key(questions)
+            scores = correct.sum(axis=1)
+            correct_counts = correct.sum(axis=0)
+            option_counts = np.stack([(answers == code).sum(axis=0) for code in range(len(LETTERS))])
+            unanswered = (answers < 0).sum(axis=0)
+            histogram = np.bincount(scores, minlength=total + 1)
+
+        with metrics.stage("db_commit_submission", submissions=len(sheets)):
+            self.db.execute(
+                insert(QuizResponse),
+                [
+                    {
+                        "quiz_id": quiz_id,
+                        "answers_json": json.dumps(a),
+                        "score": int(score),
+                        "total": total,
+                        "quiz_revision": revision,
+                    }
+                    for (_, a), score in zip(sheets, scores)
+                ],
+            )
+            StatsService(self.db).record_submissions(
+                quiz_id,
+                attempts=len(sheets),
+                score_sum=int(scores.sum()),
+                score_counts={score: int(n) for score, n in enumerate(histogram) if n},
+                question_increments=[
+                    {
+                        "correct_count": int(correct_counts[idx]),
+                        **{OPTION_COLUMNS[letter]: int(option_counts[code, idx]) for code, letter in enumerate(LETTERS)},
+                        "count_unanswered": int(unanswered[idx]),
+                    }
+                    for idx in range(total)
+                ],
+            )
+            self.db.commit()
+
+        count = len(sheets)
+        return {
+            "quiz_id": quiz_id,
+            "sheets": [
+                {
+                    "index": i,
+                    "sheet_id": sheet_id,
+                    "score": int(score),
+                    "total": total,
+                    "percentage": (score / total * 100.0) if total else 0.0,
+                }
+                for i, ((sheet_id, _), score) in enumerate(zip(sheets, scores))
+            ],
+            "summary": {
+                "sheets": count,
+                "average_score": float(scores.mean()) if count else 0.0,
+                "median_score": float(np.median(scores)) if count else 0.0,
+                "min_score": int(scores.min()) if count else 0,
+                "max_score": int(scores.max()) if count else 0,
+                "score_histogram": {score: int(n) for score, n in enumerate(histogram)},
+                "questions": [
+                    {
+                        "index": idx,
+                        "correct_rate": float(correct_counts[idx] / count) if count else 0.0,
+                        "option_counts": {
+                            letter: int(option_counts[code, idx]) for code, letter in enumerate(LETTERS)
+                        },
+                        "unanswered": int(unanswered[idx]),
+                    }
+                    for idx in range(total)
+                ],
+            },
+        }
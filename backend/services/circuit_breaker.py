@@ -0,0 +1,181 @@
+"""
+Per-provider circuit breakers.
+
+Every provider call reports its outcome and duration. Once the last
+BREAKER_WINDOW calls hold at least BREAKER_MIN_CALLS and either
+BREAKER_ERROR_RATE of them failed or BREAKER_SLOW_RATE of them took longer
+than BREAKER_SLOW_CALL_S, the breaker opens: calls fail at once with
+`CircuitOpen` instead of waiting on a dead endpoint (and the router or the
+degraded mode takes over). After BREAKER_OPEN_S it is half-open and lets one
+trial call through; success closes it, failure opens it for another period.
+A failed health probe opens it as well, so an outage is noticed without
+sacrificing user requests to find out.
+
+Cancelled calls and calls cut short by the request deadline say nothing
+about the provider and are not counted. State is per process.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+import metrics
+from config import (
+    BREAKER_ERROR_RATE,
+    BREAKER_MIN_CALLS,
+    BREAKER_OPEN_S,
+    BREAKER_SLOW_CALL_S,
+    BREAKER_SLOW_RATE,
+    BREAKER_WINDOW,
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(RuntimeError):
+    def __init__(self, provider: str, retry_in: float) -> None:
+        super().__init__(f"{provider} is unavailable (circuit open); retry in {retry_in:.0f}s.")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        provider: str,
+        window: int = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        error_rate: float = BREAKER_ERROR_RATE,
+        slow_call_s: float = BREAKER_SLOW_CALL_S,
+        slow_rate: float = BREAKER_SLOW_RATE,
+        open_s: float = BREAKER_OPEN_S,
+    ) -> None:
+        self.provider = provider
+        self.min_calls = max(1, min_calls)
+        self.error_rate = error_rate
+        self.slow_call_s = slow_call_s
+        self.slow_rate = slow_rate
+        self.open_s = open_s
+        # (failed, slow) per recent call.
+        self._calls: Deque[Tuple[bool, bool]] = deque(maxlen=max(1, window))
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._reason = ""
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self._report()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def available(self) -> bool:
+        """Whether a call would be let through right now (without claiming the half-open trial)."""
+        with self._lock:
+            state = self._current_state()
+            return state == CLOSED or (state == HALF_OPEN and not self._trial_in_flight)
+
+    def acquire(self) -> bool:
+        """Permission for one call; raises CircuitOpen. Returns True if the call is the half-open trial."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return False
+            if state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._transition(HALF_OPEN)
+                return True
+            retry_in = max(0.0, self._opened_at + self.open_s - time.monotonic())
+        metrics.BREAKER_REJECTED.labels(self.provider).inc()
+        raise CircuitOpen(self.provider, retry_in)
+
+    def record(self, ok: bool, seconds: float, trial: bool = False) -> None:
+        slow = self.slow_call_s > 0 and seconds > self.slow_call_s
+        with self._lock:
+            if trial:
+                self._trial_in_flight = False
+                if ok and not slow:
+                    self._calls.clear()
+                    self._transition(CLOSED)
+                else:
+                    self._open("trial call failed" if not ok else "trial call slow")
+                return
+            if self._state != CLOSED:
+                # A call admitted before the breaker opened; the trial decides from here.
+                return
+            self._calls.append((not ok, slow))
+            if len(self._calls) < self.min_calls:
+                return
+            failed = sum(f for f, _ in self._calls) / len(self._calls)
+            slowed = sum(s for _, s in self._calls) / len(self._calls)
+            if failed >= self.error_rate:
+                self._open(f"error rate {failed:.0%}")
+            elif slowed >= self.slow_rate:
+                self._open(f"slow call rate {slowed:.0%}")
+
+    def release(self, trial: bool) -> None:
+        """An admitted call ended without a verdict (cancelled, deadline); free the trial slot."""
+        if trial:
+            with self._lock:
+                self._trial_in_flight = False
+
+    def trip(self, reason: str) -> None:
+        """Open from outside the call path (a failed health probe)."""
+        with self._lock:
+            if self._current_state() != OPEN:
+                self._open(reason)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            calls = list(self._calls)
+            retry_in = max(0.0, self._opened_at + self.open_s - time.monotonic()) if state == OPEN else 0.0
+            reason = self._reason if state != CLOSED else ""
+        return {
+            "state": state,
+            "reason": reason,
+            "retry_in_s": round(retry_in, 1),
+            "recent_calls": len(calls),
+            "error_rate": round(sum(f for f, _ in calls) / len(calls), 3) if calls else None,
+            "slow_rate": round(sum(s for _, s in calls) / len(calls), 3) if calls else None,
+        }
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_s:
+            return HALF_OPEN
+        return self._state
+
+    def _open(self, reason: str) -> None:
+        self._opened_at = time.monotonic()
+        self._reason = reason
+        self._calls.clear()
+        self._transition(OPEN)
+
+    def _transition(self, state: str) -> None:
+        if state != self._state:
+            metrics.BREAKER_TRANSITIONS.labels(self.provider, state).inc()
+        self._state = state
+        self._report()
+
+    def _report(self) -> None:
+        metrics.BREAKER_STATE.labels(self.provider).set(_STATE_VALUES[self._state])
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(provider: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = _breakers[provider] = CircuitBreaker(provider)
+        return breaker
@@ -0,0 +1,215 @@
+"""
+End-to-end request deadlines for LLM work.
+
+A `Deadline` is installed for the duration of a generation with
+`deadline_scope`; provider calls read it through `current_deadline()` to
+shorten their timeouts, and `bounded_post` aborts the wait as soon as the
+deadline passes or the request is cancelled (client disconnect). Code
+running without a deadline behaves exactly as before.
+
+An abandoned HTTP call keeps running in the background only until its own
+(deadline-shortened) timeout; the request thread is released immediately.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Any, Dict, Iterator, Set
+
+import requests
+
+import metrics
+from config import DEADLINE_MIN_CALL_S, LLM_HTTP_WORKERS
+
+
+class DeadlineExceeded(RuntimeError):
+    pass
+
+
+class RequestCancelled(RuntimeError):
+    pass
+
+
+class Deadline:
+    def __init__(self, seconds: float, *, parent: Deadline | None = None) -> None:
+        end = time.monotonic() + seconds
+        self.end = min(end, parent.end) if parent is not None else end
+        # Children share the root's cancellation state.
+        self._root: Deadline = parent._root if parent is not None else self
+        # Root that tracks this deadline as a branch, until `release()`.
+        self._owner: Deadline | None = None
+        if parent is None:
+            self._cancelled = False
+            self._waiters: Set[threading.Event] = set()
+            self._branches: Set[Deadline] = set()
+            self._lock = threading.Lock()
+
+    def child(self, seconds: float) -> Deadline:
+        """A tighter deadline (e.g. for one attempt) that is cancelled with this one."""
+        return Deadline(seconds, parent=self)
+
+    def branch(self) -> Deadline:
+        """Same end, but cancellable on its own (e.g. one leg of a hedged call); cancelled along with this one."""
+        branch = Deadline(0.0)
+        branch.end = self.end
+        root = self._root
+        with root._lock:
+            if root._cancelled:
+                branch._cancelled = True
+            else:
+                root._branches.add(branch)
+                branch._owner = root
+        return branch
+
+    def release(self) -> None:
+        """Detach a finished branch from the deadline it came from."""
+        owner, self._owner = self._owner, None
+        if owner is not None:
+            with owner._lock:
+                owner._branches.discard(self)
+
+    def remaining(self) -> float:
+        return max(0.0, self.end - time.monotonic())
+
+    @property
+    def cancelled(self) -> bool:
+        return self._root._cancelled
+
+    def cancel(self, event: str | None = "cancelled") -> None:
+        """Cancel this deadline's root (and its branches); ``event`` is the metric label, None to skip it."""
+        root = self._root
+        with root._lock:
+            if root._cancelled:
+                return
+            root._cancelled = True
+            waiters = list(root._waiters)
+            branches = list(root._branches)
+        if event is not None:
+            metrics.DEADLINE_EVENTS.labels(event).inc()
+        for waiter in waiters:
+            waiter.set()
+        for branch in branches:
+            branch.cancel(event=None)
+
+    def check(self, needed: float = 0.0) -> None:
+        """Raise if cancelled or if less than ``needed`` seconds are left."""
+        if self.cancelled:
+            raise RequestCancelled("Request was cancelled.")
+        if self.remaining() <= needed:
+            raise DeadlineExceeded("Request deadline exceeded.")
+
+    def timeout(self, cap: float) -> float:
+        """Per-call timeout: ``cap``, shortened to what is left of the deadline."""
+        self.check(DEADLINE_MIN_CALL_S)
+        return min(cap, self.remaining())
+
+    def sleep(self, seconds: float) -> None:
+        """Sleep that wakes up on cancellation and refuses to outlive the deadline."""
+        if seconds >= self.remaining():
+            raise DeadlineExceeded("Request deadline exceeded while backing off.")
+        with self.cancel_event() as event:
+            event.wait(seconds)
+        self.check()
+
+    @contextmanager
+    def cancel_event(self) -> Iterator[threading.Event]:
+        """An event set on cancellation, for waiting on other work too (set it from that work's callback)."""
+        event = threading.Event()
+        root = self._root
+        with root._lock:
+            root._waiters.add(event)
+            if root._cancelled:
+                event.set()
+        try:
+            yield event
+        finally:
+            with root._lock:
+                root._waiters.discard(event)
+
+
+_current: ContextVar[Deadline | None] = ContextVar("request_deadline", default=None)
+
+
+def current_deadline() -> Deadline | None:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Deadline | None) -> Iterator[Deadline | None]:
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def call_timeout(cap: float) -> float:
+    deadline = _current.get()
+    return cap if deadline is None else deadline.timeout(cap)
+
+
+def backoff(seconds: float) -> None:
+    deadline = _current.get()
+    if deadline is None:
+        time.sleep(seconds)
+    else:
+        deadline.sleep(seconds)
+
+
+_http_executor = ThreadPoolExecutor(max_workers=LLM_HTTP_WORKERS, thread_name_prefix="llm-http")
+
+
+def bounded_post(url: str, *, timeout: float, **kwargs: Any) -> requests.Response:
+    """
+    `requests.post` bounded by the current deadline.
+
+    The timeout is shortened to the time left; while the call is in flight the
+    caller waits on it together with the deadline's cancellation, so a client
+    disconnect releases the caller without waiting for the provider.
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return requests.post(url, timeout=timeout, **kwargs)
+
+    timeout = deadline.timeout(timeout)
+    ctx = copy_context()
+    with deadline.cancel_event() as event:
+        future = _http_executor.submit(ctx.run, requests.post, url, timeout=timeout, **kwargs)
+        future.add_done_callback(lambda _f: event.set())
+        event.wait(timeout + 1.0)
+
+    if not future.done():
+        future.cancel()
+        deadline.check()
+        raise DeadlineExceeded("Provider call did not finish in time.")
+    try:
+        return future.result()
+    except requests.Timeout as exc:
+        if deadline.remaining() <= DEADLINE_MIN_CALL_S:
+            raise DeadlineExceeded("Provider call timed out at the request deadline.") from exc
+        raise
+
+
+class CallLatency:
+    """Moving average of successful provider call durations, to judge whether a retry can still finish."""
+
+    def __init__(self, alpha: float = 0.2) -> None:
+        self.alpha = alpha
+        self._ewma: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, provider: str, seconds: float) -> None:
+        with self._lock:
+            previous = self._ewma.get(provider)
+            self._ewma[provider] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+
+    def expected(self, provider: str) -> float:
+        with self._lock:
+            return max(DEADLINE_MIN_CALL_S, self._ewma.get(provider, DEADLINE_MIN_CALL_S))
+
+
+call_latency = CallLatency()
@@ -0,0 +1,156 @@
+"""
+Extracted-text cache for uploaded documents, keyed by content hash.
+
+Entries live in a small in-memory LRU and are persisted as UTF-8 text files
+under EXTRACTION_CACHE_DIR, so repeat uploads of the same file skip parsing
+across restarts and workers. The disk copy is bounded too; the least
+recently used files are removed first.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import suppress
+from pathlib import Path
+from typing import BinaryIO, Tuple
+
+import metrics
+from config import (
+    EXTRACTION_CACHE_DIR,
+    EXTRACTION_CACHE_DISK_ITEMS,
+    EXTRACTION_CACHE_MEMORY_ITEMS,
+)
+from services.langextract import LangExtract
+
+logger = logging.getLogger(__name__)
+
+# Bump when extraction output changes so stale cached text is not served.
+EXTRACTOR_VERSION = "1"
+HASH_CHUNK_BYTES = 1024 * 1024
+
+_KEY_RE = re.compile(r"^[a-z]+-[0-9]+-[0-9a-f]{64}$")
+
+
+def hash_stream(stream: BinaryIO, limit: int) -> Tuple[str, int]:
+    """SHA-256 of a binary stream read in chunks; raises ValueError past ``limit`` bytes."""
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = stream.read(HASH_CHUNK_BYTES)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > limit:
+            raise ValueError(f"File too large (limit {limit // (1024 * 1024)} MB).")
+        digest.update(chunk)
+    return digest.hexdigest(), size
+
+
+class ExtractionCache:
+    def __init__(
+        self,
+        directory: Path = EXTRACTION_CACHE_DIR,
+        memory_items: int = EXTRACTION_CACHE_MEMORY_ITEMS,
+        disk_items: int = EXTRACTION_CACHE_DISK_ITEMS,
+    ) -> None:
+        self.directory = directory
+        self.memory_items = memory_items
+        self.disk_items = disk_items
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(kind: str, content_hash: str) -> str:
+        return f"{kind}-{EXTRACTOR_VERSION}-{content_hash}"
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            text = self._memory.get(key)
+            if text is not None:
+                self._memory.move_to_end(key)
+                metrics.EXTRACTION_CACHE.labels("memory_hit").inc()
+                return text
+
+        path = self._path(key)
+        try:
+            text = path.read_text(encoding="utf-8")
+            os.utime(path)  # disk LRU order
+        except (OSError, UnicodeDecodeError):
+            metrics.EXTRACTION_CACHE.labels("miss").inc()
+            return None
+
+        metrics.EXTRACTION_CACHE.labels("disk_hit").inc()
+        self._remember(key, text)
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        """Best effort: a full or read-only disk leaves the entry in memory only."""
+        self._remember(key, text)
+        if self.disk_items <= 0:
+            return
+        path = self._path(key)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(text, encoding="utf-8")
+            tmp.replace(path)
+            self._trim_disk()
+        except OSError as exc:
+            logger.warning("Could not persist extracted text %s: %s", key, exc)
+            metrics.EXTRACTION_CACHE.labels("write_error").inc()
+            with suppress(OSError):
+                tmp.unlink(missing_ok=True)
+
+    def _remember(self, key: str, text: str) -> None:
+        with self._lock:
+            self._memory[key] = text
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _path(self, key: str) -> Path:
+        if not _KEY_RE.match(key):
+            raise ValueError("Invalid extraction cache key.")
+        return self.directory / f"{key}.txt"
+
+    def _trim_disk(self) -> None:
+        files = []
+        for path in self.directory.glob("*.txt"):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except OSError:
+                continue
+        if len(files) <= self.disk_items:
+            return
+        files.sort()
+        for _, path in files[: len(files) - self.disk_items]:
+            path.unlink(missing_ok=True)
+
+
+extraction_cache = ExtractionCache()
+
+
+def extract_pdf_cached(stream: BinaryIO, label: str | None, max_bytes: int) -> str:
+    """
+    Text of an uploaded PDF, parsing it only if its hash is not cached.
+
+    The stream is hashed in chunks and, on a miss, rewound and parsed in
+    place, so the upload is never copied to UPLOAD_DIR.
+    """
+    with metrics.stage("hash_upload"):
+        content_hash, _ = hash_stream(stream, max_bytes)
+    key = ExtractionCache.key("pdf", content_hash)
+    text = extraction_cache.get(key)
+    if text is not None:
+        return text
+
+    stream.seek(0)
+    with metrics.stage("extract_pdf"):
+        text = LangExtract.from_pdf_stream(stream, label=label).text
+    extraction_cache.put(key, text)
+    return text
@@ -0,0 +1,226 @@
+"""
+Capability discovery for the Hugging Face provider.
+
+A model is served either through the OpenAI-compatible chat route
+(`/<model>/v1/chat/completions`) or only through the legacy text-generation
+route (`/<model>`), may or may not accept `response_format`, and has some
+maximum context. Instead of finding this out with a failed request on every
+call, each endpoint is probed once and the answer cached in memory and in
+HF_CAPABILITY_CACHE_PATH.
+
+Entries are keyed by a fingerprint of the base URL, model and token, so
+changing any of those settings invalidates them; they also expire after
+HF_CAPABILITY_TTL_S and are dropped when a call gets a 404.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List
+
+import requests
+
+from config import (
+    HF_CAPABILITY_CACHE_PATH,
+    HF_CAPABILITY_TTL_S,
+    HUGGINGFACE_API_TOKEN,
+    HUGGINGFACE_API_URL,
+    HUGGINGFACE_MODEL,
+)
+from services.deadline import call_timeout
+
+# After a failed probe (timeout, 5xx, auth), calls fall back to
+# chat-then-legacy and the probe is not retried for this long.
+PROBE_RETRY_S = 60.0
+PROBE_TIMEOUT_S = 30
+
+
+@dataclass(frozen=True)
+class HFEndpoint:
+    base_url: str
+    model: str
+    token: str = ""
+
+    @property
+    def chat_url(self) -> str:
+        return f"{self.base_url}/{self.model}/v1/chat/completions"
+
+    @property
+    def legacy_url(self) -> str:
+        return f"{self.base_url}/{self.model}"
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        return headers
+
+    @property
+    def fingerprint(self) -> str:
+        raw = "\n".join((self.base_url, self.model, self.token))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def hf_endpoint(
+    base_url: str = HUGGINGFACE_API_URL,
+    model: str = HUGGINGFACE_MODEL,
+    token: str = HUGGINGFACE_API_TOKEN,
+) -> HFEndpoint:
+    base_url = base_url.rstrip("/")
+    # Hugging Face migrated from api-inference.huggingface.co to router.huggingface.co.
+    if "api-inference.huggingface.co" in base_url:
+        base_url = base_url.replace(
+            "https://api-inference.huggingface.co",
+            "https://router.huggingface.co/hf-inference",
+        )
+    return HFEndpoint(base_url=base_url, model=model.strip().strip("/"), token=token)
+
+
+@dataclass
+class HFCapabilities:
+    api: str  # "chat" | "legacy"
+    json_mode: bool
+    max_context: int | None
+    probed_at: float
+
+
+class CapabilityCache:
+    def __init__(self, path: Any = HF_CAPABILITY_CACHE_PATH, ttl_s: float = HF_CAPABILITY_TTL_S) -> None:
+        self.path = path
+        self.ttl_s = ttl_s
+        self._entries: Dict[str, HFCapabilities] = {}
+        self._failed_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._load()
+
+    def get(self, endpoint: HFEndpoint) -> HFCapabilities | None:
+        """Cached capabilities, probing on a miss; None if the endpoint could not be probed."""
+        key = endpoint.fingerprint
+        cached = self._fresh(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            if time.time() - self._failed_at.get(key, 0.0) < PROBE_RETRY_S:
+                return None
+
+        # One probe at a time; concurrent callers wait and reuse its result.
+        with self._probe_lock:
+            cached = self._fresh(key)
+            if cached is not None:
+                return cached
+            caps = probe(endpoint)
+            with self._lock:
+                if caps is None:
+                    self._failed_at[key] = time.time()
+                    return None
+                self._entries[key] = caps
+                self._failed_at.pop(key, None)
+            self._save()
+            return caps
+
+    def invalidate(self, endpoint: HFEndpoint) -> None:
+        with self._lock:
+            removed = self._entries.pop(endpoint.fingerprint, None)
+        if removed is not None:
+            self._save()
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{"fingerprint": key, **asdict(caps)} for key, caps in self._entries.items()]
+
+    def _fresh(self, key: str) -> HFCapabilities | None:
+        with self._lock:
+            caps = self._entries.get(key)
+            if caps is not None and time.time() - caps.probed_at < self.ttl_s:
+                return caps
+            return None
+
+    def _load(self) -> None:
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+            self._entries = {key: HFCapabilities(**value) for key, value in raw.items()}
+        except (OSError, ValueError, TypeError):
+            self._entries = {}
+
+    def _save(self) -> None:
+        with self._lock:
+            raw = {key: asdict(caps) for key, caps in self._entries.items()}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(raw, indent=2), encoding="utf-8")
+            tmp.replace(self.path)
+        except OSError:
+            pass  # the in-memory cache still works
+
+
+def probe(endpoint: HFEndpoint) -> HFCapabilities | None:
+    """Ask the endpoint which API it speaks with a one-token request."""
+    chat_payload: Dict[str, Any] = {
+        "model": endpoint.model,
+        "messages": [{"role": "user", "content": "Reply with {}"}],
+        "max_tokens": 1,
+        "response_format": {"type": "json_object"},
+    }
+    try:
+        resp = requests.post(
+            endpoint.chat_url, headers=endpoint.headers, json=chat_payload, timeout=call_timeout(PROBE_TIMEOUT_S)
+        )
+        json_mode = True
+        if resp.status_code in (400, 422):
+            # Chat route exists but rejects response_format.
+            json_mode = False
+            chat_payload.pop("response_format")
+            resp = requests.post(
+                endpoint.chat_url, headers=endpoint.headers, json=chat_payload, timeout=call_timeout(PROBE_TIMEOUT_S)
+            )
+    except requests.RequestException:
+        return None
+
+    if resp.status_code == 404:
+        api, json_mode = "legacy", False
+    elif resp.status_code < 400:
+        api = "chat"
+    else:
+        return None
+
+    return HFCapabilities(
+        api=api,
+        json_mode=json_mode,
+        max_context=_probe_max_context(endpoint),
+        probed_at=time.time(),
+    )
+
+
+def _probe_max_context(endpoint: HFEndpoint) -> int | None:
+    # TGI serves /info; vLLM-style servers list max_model_len under /v1/models.
+    candidates = (
+        (f"{endpoint.legacy_url}/info", ("max_total_tokens", "max_input_length")),
+        (f"{endpoint.legacy_url}/v1/models", ("max_model_len", "context_length")),
+    )
+    for url, fields in candidates:
+        try:
+            resp = requests.get(url, headers=endpoint.headers, timeout=call_timeout(PROBE_TIMEOUT_S))
+            if resp.status_code >= 400:
+                continue
+            data = resp.json()
+        except (requests.RequestException, ValueError):
+            continue
+        if isinstance(data, dict) and isinstance(data.get("data"), list) and data["data"]:
+            data = data["data"][0]
+        if not isinstance(data, dict):
+            continue
+        for field in fields:
+            value = data.get(field)
+            if isinstance(value, int) and value > 0:
+                return value
+    return None
+
+
+hf_capabilities = CapabilityCache()
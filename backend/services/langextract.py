@@ -8,7 +8,7 @@ rest of the codebase can treat it as the text-extraction component.
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Literal
+from typing import BinaryIO, Literal
 
 import PyPDF2
 import requests
@@ -30,13 +30,18 @@ class LangExtract:
 
     @staticmethod
     def from_pdf(path: str, label: str | None = None) -> ExtractResult:
+        with open(path, "rb") as f:
+            return LangExtract.from_pdf_stream(f, label=label)
+
+    @staticmethod
+    def from_pdf_stream(stream: BinaryIO, label: str | None = None) -> ExtractResult:
+        """Extract from an open, seekable binary stream (e.g. an in-memory upload)."""
         text_parts: list[str] = []
         try:
-            with open(path, "rb") as f:
-                reader = PyPDF2.PdfReader(f)
-                for page in reader.pages:
-                    page_text = page.extract_text() or ""
-                    text_parts.append(page_text)
+            reader = PyPDF2.PdfReader(stream)
+            for page in reader.pages:
+                page_text = page.extract_text() or ""
+                text_parts.append(page_text)
         except Exception as exc:  # pragma: no cover - simple pass-through
             raise ValueError(f"Failed to extract PDF text: {exc}") from exc
 
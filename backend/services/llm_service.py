@@ -2,98 +2,501 @@ from __future__ import annotations
 
 import json
 import ast
+import functools
+import hashlib
+import logging
 import re
 import secrets
 import time
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Tuple, TypeVar
 
 import requests
 
+import metrics
 from config import (
+    DEADLINE_MIN_CALL_S,
+    GENERATION_STRATEGY,
     GROQ_API_KEY,
     GROQ_API_URL,
     GROQ_MODEL,
-    HUGGINGFACE_API_TOKEN,
-    HUGGINGFACE_API_URL,
     HUGGINGFACE_MODEL,
     LLM_PROVIDER,
     OLLAMA_BASE_URL,
+    OLLAMA_COLD_LOAD_S,
+    OLLAMA_CONTEXT_REUSE,
+    OLLAMA_KEEP_ALIVE,
     OLLAMA_MODEL,
+    OLLAMA_NUM_CTX_MAX,
+    OLLAMA_NUM_CTX_MIN,
+    PROMPT_COMPRESSION_WINDOW,
+    PROMPT_CONTENT_MODE,
+    PROMPT_TOKEN_BUDGET,
+    QUIZ_SET_MAX_QUESTIONS_PER_CALL,
+    RANK_SURPLUS_RATIO,
 )
+from services.circuit_breaker import CircuitOpen, breaker_for
+from services.compression import compress_content, estimate_tokens
+from services.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    RequestCancelled,
+    backoff,
+    bounded_post,
+    call_latency,
+    current_deadline,
+    deadline_scope,
+)
+from services.hf_capabilities import HFEndpoint, hf_capabilities, hf_endpoint
+from services.ranking import (
+    EASY_DISALLOWED,
+    HARD_CUES,
+    MEDIUM_DISALLOWED,
+    rank_questions,
+    surplus_count,
+)
+from services.structured_output import (
+    OUTPUT_MODES,
+    UnsupportedOutputMode,
+    is_format_rejection,
+    question_schema,
+    question_set_schema,
+    structured_support,
+)
+from services.template_generator import template_questions
+from services.token_budget import BudgetKey, token_budget
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ProviderUnavailable(RuntimeError):
+    """The provider could not be reached, failed server-side or kept rate-limiting us."""
+
+
+class ProviderRequestError(RuntimeError):
+    """The request cannot succeed as configured or built (unknown provider, missing key, 4xx); retrying won't help."""
+
+
+class GenerationFailed(RuntimeError):
+    """Every attempt within the retry budget failed."""
+
+
+# Failures of the provider rather than of this service: these may be answered
+# with a degraded quiz, anything else is returned as an error.
+OUTAGE_ERRORS = (CircuitOpen, DeadlineExceeded, ProviderUnavailable, GenerationFailed)
+
+_DIFFICULTY_INSTRUCTIONS = {
+    "easy": "Create factual recall questions only. Answers should be directly stated in the text.",
+    "medium": "Create conceptual inference questions that require understanding and light reasoning.",
+    "hard": "Create analytical, multi-step questions requiring synthesis of multiple details.",
+}
+
+_RETRY_HINTS = [
+    "",
+    "Retry: Your previous response was invalid or low quality. Return strict JSON only.",
+    (
+        "Retry: Generate exactly the required count. Ensure every question is distinct, "
+        "non-repetitive, and strictly grounded in the provided text."
+    ),
+]
+
+
+def ollama_num_ctx(needed_tokens: int) -> int:
+    """Context window for a request, rounded up to a power of two so Ollama rarely reloads the model."""
+    num_ctx = OLLAMA_NUM_CTX_MIN
+    while num_ctx < needed_tokens and num_ctx < OLLAMA_NUM_CTX_MAX:
+        num_ctx *= 2
+    return min(num_ctx, OLLAMA_NUM_CTX_MAX)
+
+
+# Retries, repairs, hedge and failover legs all rebuild the prompt for the same
+# document; fitting it once per document keeps compression off those paths.
+@functools.lru_cache(maxsize=8)
+def fit_content(content: str, mode: str, budget: int, window: int) -> str:
+    if mode == "extractive":
+        return compress_content(content, budget, window=window)
+    return content[: budget * 4]
+
+
+def _question_key(question: str) -> str:
+    return re.sub(r"\s+", " ", question.lower())
+
+
+def _chunk_counts(counts: Dict[str, int], limit: int) -> List[Dict[str, int]]:
+    """Group difficulties into calls of at most ``limit`` questions; a larger set gets a call to itself."""
+    chunks: List[Dict[str, int]] = []
+    current: Dict[str, int] = {}
+    for difficulty, count in counts.items():
+        if current and sum(current.values()) + count > limit:
+            chunks.append(current)
+            current = {}
+        current[difficulty] = count
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _chat_response_format(output_mode: str, schema: Dict[str, Any] | None) -> Dict[str, Any]:
+    """OpenAI-style ``response_format`` payload field for an output mode."""
+    if output_mode == "schema":
+        return {"response_format": {"type": "json_schema", "json_schema": {"name": "quiz", "schema": schema}}}
+    if output_mode == "json":
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+
+def _http_error(prefix: str, status: int, detail: str) -> RuntimeError:
+    """Server errors and rate limits are outages; any other 4xx is a request or credential problem."""
+    message = f"{prefix}: {status} {detail}"
+    if status >= 500 or status in (408, 429):
+        return ProviderUnavailable(message)
+    return ProviderRequestError(message)
+
+
+# Repair request on top of an Ollama context that already holds the instructions and the bad answer.
+_REPAIR_FOLLOW_UP = """
+Your previous answer could not be parsed. Rewrite those questions as strict JSON in the shape given above,
+with at most {expected} questions. Return only JSON.
+"""
 
 
 class LLMService:
     """Wrapper around a local LLM (Ollama preferred)."""
 
-    def __init__(self) -> None:
-        self.provider = LLM_PROVIDER
+    def __init__(self, provider: str | None = None) -> None:
+        self.provider = provider or LLM_PROVIDER
+        # Output mode ("schema" | "json" | "free") used by the last provider call.
+        self._output_mode = "free"
+        # (document key, token context) returned by the last Ollama call, for follow-up calls.
+        # Deliberately per instance, i.e. per request: a context also holds that call's answer,
+        # and one from another request is a full re-evaluation once Ollama's slot has moved on.
+        self._ollama_context: Tuple[str, List[int]] | None = None
 
     def generate_questions(
         self,
         content: str,
         num_questions: int,
         difficulty: str,
+        minimum: int | None = None,
     ) -> List[Dict[str, Any]]:
+        """Up to ``num_questions`` validated questions; fails below ``minimum`` (default: all of them)."""
+        required = num_questions if minimum is None else min(minimum, num_questions)
+        if self.provider == "template":
+            return self.generate_template_questions(content, num_questions, difficulty, minimum=required)
+        self._check_provider()
+        return self._with_retries(lambda hint: self._attempt(content, num_questions, difficulty, hint, required))
+
+    def generate_question_sets(self, content: str, counts: Dict[str, int]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        ``counts[difficulty]`` validated questions per difficulty, asked for in
+        one call (or one per QUIZ_SET_MAX_QUESTIONS_PER_CALL chunk), so the
+        source text is sent once instead of once per difficulty. Each set is
+        checked against its own difficulty; a retry asks only for what is
+        still missing.
+        """
+        if self.provider == "template":
+            return {
+                difficulty: self.generate_template_questions(content, count, difficulty, minimum=count)
+                for difficulty, count in counts.items()
+            }
+        self._check_provider()
+        sets: Dict[str, List[Dict[str, Any]]] = {}
+        for chunk in _chunk_counts(counts, QUIZ_SET_MAX_QUESTIONS_PER_CALL):
+            collected: Dict[str, List[Dict[str, Any]]] = {difficulty: [] for difficulty in chunk}
+            sets.update(self._with_retries(lambda hint: self._set_attempt(content, chunk, collected, hint)))
+        return sets
+
+    def generate_replacement_question(self, content: str, difficulty: str, existing: List[str]) -> Dict[str, Any]:
+        """One new question for a quiz that already has the ``existing`` stems, which it must not repeat."""
+        if self.provider == "template":
+            return self.generate_template_replacement(content, difficulty, existing)
+        self._check_provider()
+        return self._with_retries(lambda hint: self._replacement_attempt(content, difficulty, existing, hint))
+
+    def generate_template_replacement(self, content: str, difficulty: str, existing: List[str]) -> Dict[str, Any]:
+        taken = {_question_key(stem) for stem in existing}
+        candidates = self.generate_template_questions(content, len(existing) + 1, difficulty)
+        for question in candidates:
+            if _question_key(question["question"]) not in taken:
+                return question
+        raise RuntimeError("Source text has no further distinct facts for a template question.")
+
+    def _check_provider(self) -> None:
         if self.provider not in ("ollama", "huggingface", "groq"):
-            raise RuntimeError("Unsupported LLM provider. Use 'ollama', 'huggingface', or 'groq'.")
-
-        retry_hints = [
-            "",
-            "Retry: Your previous response was invalid or low quality. Return strict JSON only.",
-            (
-                "Retry: Generate exactly the required count. Ensure every question is distinct, "
-                "non-repetitive, and strictly grounded in the provided text."
-            ),
-        ]
+            raise ProviderRequestError("Unsupported LLM provider. Use 'ollama', 'huggingface', 'groq' or 'template'.")
 
+    def _with_retries(self, attempt_fn: Callable[[str], Tuple[T | None, str]]) -> T:
+        """Run ``attempt_fn(retry_hint)`` until it returns a result, within the retry and deadline budget."""
+        deadline = current_deadline()
         last_error = "Unknown generation failure."
-        for hint in retry_hints:
+        out_of_time = False
+        for attempt, hint in enumerate(_RETRY_HINTS):
+            attempt_deadline = None
+            if deadline is not None:
+                if deadline.cancelled:
+                    break
+                if attempt and deadline.remaining() < call_latency.expected(self.provider):
+                    # Another attempt could not finish in time; fail now instead of holding the worker.
+                    metrics.DEADLINE_EVENTS.labels("retry_skipped").inc()
+                    out_of_time = True
+                    break
+                attempt_deadline = self._attempt_deadline(deadline, len(_RETRY_HINTS) - attempt)
+            if hint:
+                metrics.LLM_RETRIES.labels(self.provider).inc()
+            with deadline_scope(attempt_deadline or deadline):
+                result, last_error = attempt_fn(hint)
+            if result is not None:
+                return result
+
+        if deadline is not None:
+            if deadline.cancelled:
+                raise RequestCancelled("Request was cancelled.")
+            if out_of_time or deadline.remaining() <= DEADLINE_MIN_CALL_S:
+                raise DeadlineExceeded(f"Request deadline exceeded before a quiz could be generated. {last_error}")
+        raise GenerationFailed(
+            f"Failed to generate acceptable quiz questions from model output. {last_error}"
+        )
+
+    def generate_template_questions(
+        self, content: str, num_questions: int, difficulty: str, minimum: int = 1
+    ) -> List[Dict[str, Any]]:
+        """Cloze / fact-recall questions built locally from the text, without any LLM call."""
+        with metrics.stage("template_generate"):
+            candidates = template_questions(content, num_questions, difficulty)
+            questions = self._validate_questions(candidates, content, expected=num_questions, difficulty=difficulty)
+        if len(questions) < min(minimum, num_questions):
+            raise RuntimeError(
+                f"Source text has too few distinct facts for template questions ({len(questions)}/{num_questions})."
+            )
+        return questions
+
+    def _attempt_deadline(self, deadline: Deadline, attempts_left: int) -> Deadline:
+        """Fair share of the time left for one attempt, but enough for a typical call if possible."""
+        remaining = deadline.remaining()
+        typical = 1.5 * call_latency.expected(self.provider)
+        return deadline.child(max(remaining / attempts_left, min(remaining, typical)))
+
+    def _attempt(
+        self, content: str, num_questions: int, difficulty: str, hint: str, required: int
+    ) -> Tuple[List[Dict[str, Any]] | None, str]:
+        """One generation attempt; returns (questions, "") or (None, reason)."""
+        # In rank mode the model is asked for a surplus and the difficulty
+        # heuristics score candidates instead of rejecting them.
+        ranked = GENERATION_STRATEGY == "rank"
+        requested = num_questions + (surplus_count(num_questions, RANK_SURPLUS_RATIO) if ranked else 0)
+        try:
+            raw = self._call_provider(content, requested, difficulty, hint)
+        except (RequestCancelled, CircuitOpen, ProviderRequestError):
+            raise
+        except RuntimeError as exc:
+            return None, str(exc)
+
+        mode = self._output_mode
+        error = ""
+
+        # Parse the raw output; only unparseable output is sent back for a JSON repair.
+        validated: List[Dict[str, Any]] | None = None
+        try:
+            validated = self._parse_and_validate(raw, content, requested, difficulty, strict=not ranked)
+            outcome = "parsed"
+        except RuntimeError as exc:
+            error = str(exc)
+            outcome = "failed"
             try:
+                repaired = self._timed_repair(raw, requested)
+                validated = self._parse_and_validate(repaired, content, requested, difficulty, strict=not ranked)
+                outcome = "repaired"
+            except (RequestCancelled, ProviderRequestError):
+                raise
+            except RuntimeError as repair_exc:
+                error = str(repair_exc)
+        metrics.STRUCTURED_OUTPUT.labels(self.provider, mode, outcome).inc()
+
+        if validated is not None and ranked:
+            validated = self._rank(validated, raw, content, requested, num_questions, difficulty, required)
+        if validated is not None:
+            if len(validated) >= required:
+                return validated[:num_questions], ""
+            error = (
+                f"Model returned insufficient high-quality questions "
+                f"({len(validated)}/{num_questions})."
+            )
+        return None, error
+
+    def _set_attempt(
+        self,
+        content: str,
+        counts: Dict[str, int],
+        collected: Dict[str, List[Dict[str, Any]]],
+        hint: str,
+    ) -> Tuple[Dict[str, List[Dict[str, Any]]] | None, str]:
+        """One multi-difficulty call for the sets in ``collected`` that are still short; adds to them in place."""
+        missing = {d: counts[d] - len(collected[d]) for d in counts if len(collected[d]) < counts[d]}
+        ranked = GENERATION_STRATEGY == "rank"
+        requested = {d: n + (surplus_count(n, RANK_SURPLUS_RATIO) if ranked else 0) for d, n in missing.items()}
+        try:
+            raw = self._call_provider(content, sum(requested.values()), "mixed", hint, counts=requested)
+            with metrics.stage("parse"):
+                parsed = self._parse_question_sets(raw, requested)
+        except (RequestCancelled, CircuitOpen, ProviderRequestError):
+            raise
+        except RuntimeError as exc:
+            return None, str(exc)
+        metrics.STRUCTURED_OUTPUT.labels(self.provider, self._output_mode, "parsed").inc()
+
+        with metrics.stage("validate"):
+            for difficulty, candidates in parsed.items():
+                seen = {_question_key(q["question"]) for q in collected[difficulty]}
+                candidates = [q for q in candidates if _question_key(q["question"]) not in seen]
+                valid = self._validate_questions(
+                    candidates, content, expected=requested[difficulty], difficulty=difficulty, check_difficulty=not ranked
+                )
+                if ranked:
+                    valid = rank_questions(valid, content, difficulty, keep=missing[difficulty])
+                collected[difficulty].extend(valid[: missing[difficulty]])
+
+        short = [f"{d} {len(collected[d])}/{n}" for d, n in counts.items() if len(collected[d]) < n]
+        if short:
+            return None, f"Model returned insufficient high-quality questions ({', '.join(short)})."
+        return {d: list(collected[d]) for d in counts}, ""
+
+    def _replacement_attempt(
+        self, content: str, difficulty: str, existing: List[str], hint: str
+    ) -> Tuple[Dict[str, Any] | None, str]:
+        ranked = GENERATION_STRATEGY == "rank"
+        requested = 1 + (surplus_count(1, RANK_SURPLUS_RATIO) if ranked else 0)
+        # The existing stems go in the task suffix, so the cached document prefix still applies.
+        avoid = "\n".join(
+            ["The quiz already has these questions; do not repeat or paraphrase any of them:"]
+            + [f"- {stem}" for stem in existing]
+            + [hint]
+        )
+        try:
+            raw = self._call_provider(content, requested, difficulty, avoid)
+        except (RequestCancelled, CircuitOpen, ProviderRequestError):
+            raise
+        except RuntimeError as exc:
+            return None, str(exc)
+        try:
+            candidates = self._parse_and_validate(raw, content, requested, difficulty, strict=not ranked)
+        except RuntimeError as exc:
+            metrics.STRUCTURED_OUTPUT.labels(self.provider, self._output_mode, "failed").inc()
+            return None, str(exc)
+        metrics.STRUCTURED_OUTPUT.labels(self.provider, self._output_mode, "parsed").inc()
+
+        taken = {_question_key(stem) for stem in existing}
+        fresh = [q for q in candidates if _question_key(q["question"]) not in taken]
+        if ranked:
+            fresh = rank_questions(fresh, content, difficulty, keep=1)
+        if not fresh:
+            return None, "Model only returned questions the quiz already has."
+        return fresh[0], ""
+
+    def _parse_and_validate(
+        self, candidate: str, content: str, num_questions: int, difficulty: str, strict: bool = True
+    ) -> List[Dict[str, Any]]:
+        with metrics.stage("parse"):
+            parsed = self._parse_questions(candidate, expected=num_questions)
+        with metrics.stage("validate"):
+            return self._validate_questions(
+                parsed,
+                content,
+                expected=num_questions,
+                difficulty=difficulty,
+                check_difficulty=strict,
+            )
+
+    def _rank(
+        self,
+        candidates: List[Dict[str, Any]],
+        raw: str,
+        content: str,
+        requested: int,
+        num_questions: int,
+        difficulty: str,
+        required: int,
+    ) -> List[Dict[str, Any]]:
+        with metrics.stage("rank", candidates=len(candidates)):
+            ranked = rank_questions(candidates, content, difficulty, keep=num_questions)
+        # Output tokens spent on the surplus, estimated as its share of the raw response.
+        surplus = requested - num_questions
+        metrics.RANK_SURPLUS_TOKENS.labels(self.provider).inc(estimate_tokens(raw) * surplus / requested)
+        strict_passes = sum(self._matches_difficulty(q["question"], difficulty) for q in candidates)
+        if strict_passes < required <= len(ranked):
+            # The strict filter would have thrown this batch away and regenerated.
+            metrics.RANK_RETRIES_AVOIDED.labels(self.provider).inc()
+        return ranked
+
+    def _call_provider(
+        self,
+        content: str,
+        num_questions: int,
+        difficulty: str,
+        retry_hint: str = "",
+        counts: Dict[str, int] | None = None,
+    ) -> str:
+        """Raw model output; with ``counts``, one question set per difficulty (``difficulty`` is then "mixed")."""
+        breaker = breaker_for(self.provider)
+        trial = breaker.acquire()
+        started = time.perf_counter()
+        outcome = "ok"
+        # Cancelled calls, calls cut off by the deadline and requests that could
+        # never succeed tell the breaker nothing.
+        verdict: bool | None = None
+        try:
+            with metrics.stage("llm_call", provider=self.provider, retry=bool(retry_hint)):
                 if self.provider == "ollama":
-                    raw = self._call_ollama(content, num_questions, difficulty, hint)
+                    raw = self._call_ollama(content, num_questions, difficulty, retry_hint, counts)
                 elif self.provider == "huggingface":
-                    raw = self._call_huggingface(content, num_questions, difficulty, hint)
+                    raw = self._call_huggingface(content, num_questions, difficulty, retry_hint, counts)
                 else:
-                    raw = self._call_groq(content, num_questions, difficulty, hint)
-            except RuntimeError as exc:
-                last_error = str(exc)
-                continue
-
-            # First try direct parse, then force JSON repair if needed.
-            parse_errors: List[str] = []
-            candidates = [raw]
-            try:
-                repaired = self._repair_to_json(raw, num_questions)
-                if repaired and repaired.strip():
-                    candidates.append(repaired)
-            except RuntimeError as exc:
-                parse_errors.append(str(exc))
-
-            for candidate in candidates:
-                try:
-                    parsed = self._parse_questions(candidate, expected=num_questions)
-                    validated = self._validate_questions(
-                        parsed,
-                        content,
-                        expected=num_questions,
-                        difficulty=difficulty,
-                    )
-                    if len(validated) >= num_questions:
-                        return validated[:num_questions]
-                    last_error = (
-                        f"Model returned insufficient high-quality questions "
-                        f"({len(validated)}/{num_questions})."
-                    )
-                except RuntimeError as exc:
-                    parse_errors.append(str(exc))
-                    continue
+                    raw = self._call_groq(content, num_questions, difficulty, retry_hint, counts)
+            call_latency.observe(self.provider, time.perf_counter() - started)
+            verdict = True
+            return raw
+        except RuntimeError as exc:
+            outcome = "error"
+            metrics.PROVIDER_ERRORS.labels(self.provider, self._error_kind(exc)).inc()
+            if not isinstance(exc, (RequestCancelled, DeadlineExceeded, ProviderRequestError)):
+                verdict = False
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            if verdict is None:
+                breaker.release(trial)
+            else:
+                breaker.record(verdict, elapsed, trial=trial)
+            metrics.LLM_CALL_SECONDS.labels(self.provider, "generate", outcome).observe(elapsed)
 
-            if parse_errors:
-                last_error = parse_errors[-1]
+    def _timed_repair(self, raw: str, expected: int) -> str:
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            with metrics.stage("repair", provider=self.provider):
+                return self._repair_to_json(raw, expected)
+        except Exception as exc:
+            outcome = "error"
+            metrics.PROVIDER_ERRORS.labels(self.provider, self._error_kind(exc)).inc()
+            raise
+        finally:
+            metrics.LLM_REPAIRS.labels(self.provider, outcome).inc()
+            metrics.LLM_CALL_SECONDS.labels(self.provider, "repair", outcome).observe(
+                time.perf_counter() - started
+            )
 
-        raise RuntimeError(
-            f"Failed to generate acceptable quiz questions from model output. {last_error}"
-        )
+    @staticmethod
+    def _error_kind(exc: Exception) -> str:
+        if isinstance(exc, RequestCancelled):
+            return "cancelled"
+        if isinstance(exc, DeadlineExceeded):
+            return "deadline"
+        # Network failures are re-raised with the transport error as the cause.
+        if isinstance(exc.__cause__, requests.RequestException) or isinstance(exc, requests.RequestException):
+            return "unreachable"
+        if isinstance(exc, ProviderRequestError):
+            return "rejected"
+        return "api_error"
 
     def _build_prompt(
         self,
@@ -102,30 +505,33 @@ class LLMService:
         difficulty: str,
         retry_hint: str = "",
     ) -> str:
-        difficulty = difficulty.lower()
-        if difficulty == "easy":
-            difficulty_instructions = (
-                "Create factual recall questions only. Answers should be directly stated in the text."
-            )
-        elif difficulty == "hard":
-            difficulty_instructions = (
-                "Create analytical, multi-step questions requiring synthesis of multiple details."
-            )
-        else:
-            difficulty_instructions = (
-                "Create conceptual inference questions that require understanding and light reasoning."
-            )
-        variation_key = secrets.token_hex(4)
+        return "".join(self._build_prompt_parts(content, num_questions, difficulty, retry_hint))
 
-        truncated = content[:6000]
+    def _build_prompt_parts(
+        self,
+        content: str,
+        num_questions: int,
+        difficulty: str,
+        retry_hint: str = "",
+        counts: Dict[str, int] | None = None,
+    ) -> Tuple[str, str]:
+        """(prefix, suffix): the prefix is the same for every call on a document, the suffix is the task."""
+        with metrics.stage("prompt_build"):
+            if counts:
+                return self._prompt_prefix(content), self._prompt_set_suffix(counts, retry_hint)
+            return self._prompt_prefix(content), self._prompt_suffix(num_questions, difficulty, retry_hint)
+
+    def _prompt_prefix(self, content: str) -> str:
+        # Nothing call-specific may appear here, or provider-side prefix caching stops applying.
+        truncated = self._fit_content(content)
 
         return f"""
 You are an MCQ quiz generator.
 
-You will be given some source text. Based ONLY on that text, generate exactly {num_questions} multiple‑choice questions.
+You will be given some source text. Based ONLY on that text, generate the requested number of
+multiple‑choice questions at the requested difficulty (the task follows the source text).
 
 Rules:
-- Difficulty: {difficulty.upper()} — {difficulty_instructions}
 - Do NOT use any knowledge outside the provided text.
 - Each question must have exactly 4 options.
 - Options must be realistic and non‑trivial.
@@ -139,7 +545,6 @@ Rules:
 - Vary wording and structure so this quiz differs from previous runs.
 - Humor is allowed only if it naturally fits the source context and should stay light.
 - If context is serious/sensitive, avoid humor completely.
-- INTERNAL VARIATION KEY (do not output): {variation_key}
 
 Return ONLY valid JSON, nothing else. The JSON must have this exact shape:
 {{
@@ -154,100 +559,227 @@ Return ONLY valid JSON, nothing else. The JSON must have this exact shape:
 Do not wrap JSON in markdown fences.
 Do not add explanations before or after JSON.
 `correct_answer` must be one of: "A", "B", "C", "D".
-{retry_hint}
 
 Source text:
-\"\"\"{truncated}\"\"\""""
+\"\"\"{truncated}\"\"\"
+"""
+
+    def _prompt_suffix(self, num_questions: int, difficulty: str, retry_hint: str) -> str:
+        difficulty = difficulty.lower()
+        difficulty_instructions = _DIFFICULTY_INSTRUCTIONS.get(difficulty, _DIFFICULTY_INSTRUCTIONS["medium"])
+        variation_key = secrets.token_hex(4)
+
+        return f"""
+Task: generate exactly {num_questions} multiple‑choice questions from the source text above.
+Difficulty: {difficulty.upper()} — {difficulty_instructions}
+INTERNAL VARIATION KEY (do not output): {variation_key}
+{retry_hint}"""
+
+    def _prompt_set_suffix(self, counts: Dict[str, int], retry_hint: str) -> str:
+        sets = "\n".join(
+            f"- {difficulty.upper()}: exactly {count} questions. {_DIFFICULTY_INSTRUCTIONS[difficulty]}"
+            for difficulty, count in counts.items()
+        )
+        shape = ", ".join(f'"{difficulty}": [ ... ]' for difficulty in counts)
+        variation_key = secrets.token_hex(4)
+
+        return f"""
+Task: generate one separate set of multiple‑choice questions per difficulty from the source text above:
+{sets}
+Questions must not repeat across sets. Instead of the "questions" list, return one list per set,
+each question in the same shape as above: {{{shape}}}
+INTERNAL VARIATION KEY (do not output): {variation_key}
+{retry_hint}"""
+
+    def _fit_content(self, content: str) -> str:
+        return fit_content(content, PROMPT_CONTENT_MODE, PROMPT_TOKEN_BUDGET, PROMPT_COMPRESSION_WINDOW)
 
     def _call_ollama(
-        self, content: str, num_questions: int, difficulty: str, retry_hint: str = ""
+        self,
+        content: str,
+        num_questions: int,
+        difficulty: str,
+        retry_hint: str = "",
+        counts: Dict[str, int] | None = None,
     ) -> str:
-        prompt = self._build_prompt(content, num_questions, difficulty, retry_hint)
-        temperature = self._sampling_temperature(difficulty)
-        url = f"{OLLAMA_BASE_URL.rstrip('/')}/api/generate"
-        try:
-            resp = requests.post(
-                url,
-                json={
-                    "model": OLLAMA_MODEL,
-                    "prompt": prompt,
-                    "stream": False,
-                    "temperature": temperature,
-                },
+        prefix, suffix = self._build_prompt_parts(content, num_questions, difficulty, retry_hint, counts)
+        budget_key = self._budget_key("generate", difficulty, num_questions)
+        max_tokens = token_budget.max_tokens(budget_key, max(512, num_questions * 180))
+        return self._with_output_modes(
+            lambda mode: self._ollama_generate(
+                prefix + suffix,
+                max_tokens=max_tokens,
+                temperature=self._sampling_temperature(difficulty),
+                budget_key=budget_key,
                 timeout=300,
+                output_mode=mode,
+                expected=num_questions,
+                schema=question_set_schema(counts) if counts else None,
+                document_key=hashlib.sha256(prefix.encode("utf-8")).hexdigest(),
+                follow_up=suffix,
             )
-        except Exception as exc:  # pragma: no cover - network error
-            raise RuntimeError(
+        )
+
+    def _ollama_generate(
+        self,
+        prompt: str,
+        *,
+        max_tokens: int,
+        temperature: float,
+        budget_key: BudgetKey,
+        timeout: int,
+        output_mode: str = "free",
+        expected: int = 0,
+        schema: Dict[str, Any] | None = None,
+        document_key: str | None = None,
+        follow_up: str | None = None,
+    ) -> str:
+        """
+        One Ollama completion. With a ``document_key``, the returned context is
+        kept; a later call for the same document then sends only ``follow_up``
+        on top of it, so the document is not evaluated again.
+        """
+        url = f"{OLLAMA_BASE_URL.rstrip('/')}/api/generate"
+        context = self._reusable_context(document_key, follow_up, max_tokens)
+        if context is not None:
+            prompt = follow_up or ""
+        payload: Dict[str, Any] = {
+            "model": OLLAMA_MODEL,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            # Sampling and context settings are only honoured inside "options".
+            "options": {
+                "temperature": temperature,
+                "num_predict": max_tokens,
+                "num_ctx": ollama_num_ctx(len(context or ()) + estimate_tokens(prompt) + max_tokens),
+            },
+        }
+        if context is not None:
+            payload["context"] = context
+        if output_mode == "schema":
+            payload["format"] = schema or question_schema(expected)
+        elif output_mode == "json":
+            payload["format"] = "json"
+        started = time.perf_counter()
+        try:
+            resp = bounded_post(url, json=payload, timeout=timeout)
+        except requests.RequestException as exc:  # pragma: no cover - network error
+            raise ProviderUnavailable(
                 f"Failed to reach Ollama at {OLLAMA_BASE_URL}. Is it running?"
             ) from exc
 
+        if output_mode != "free" and is_format_rejection(resp.status_code, resp.text):
+            raise UnsupportedOutputMode(resp.text[:200])
         if resp.status_code != 200:
-            raise RuntimeError(f"Ollama error: {resp.status_code} {resp.text}")
+            raise _http_error("Ollama error", resp.status_code, resp.text)
 
         data = resp.json()
-        return data.get("response", "")
+        load_seconds = (data.get("load_duration") or 0) / 1e9
+        metrics.OLLAMA_CALL_SECONDS.labels(
+            "cold" if load_seconds >= OLLAMA_COLD_LOAD_S else "warm"
+        ).observe(time.perf_counter() - started)
+        token_budget.record(budget_key, data.get("eval_count"), data.get("done_reason"))
+        self._record_ollama_prompt(data, len(context or ()) + estimate_tokens(prompt), reused=context is not None)
+        if OLLAMA_CONTEXT_REUSE and document_key and isinstance(data.get("context"), list):
+            self._ollama_context = (document_key, data["context"])
+        return str(data.get("response", ""))
+
+    def _reusable_context(self, document_key: str | None, follow_up: str | None, max_tokens: int) -> List[int] | None:
+        """The previous call's context if it was for this document and still leaves room in num_ctx."""
+        if not OLLAMA_CONTEXT_REUSE or not document_key or follow_up is None or self._ollama_context is None:
+            return None
+        key, context = self._ollama_context
+        if key != document_key or len(context) + estimate_tokens(follow_up) + max_tokens > OLLAMA_NUM_CTX_MAX:
+            return None
+        return context
+
+    @staticmethod
+    def _record_ollama_prompt(data: Dict[str, Any], sent_tokens: int, reused: bool) -> None:
+        # prompt_eval_count only covers tokens Ollama actually evaluated (not its KV cache hits).
+        evaluated = int(data.get("prompt_eval_count") or 0)
+        metrics.PROMPT_TOKENS.labels("ollama", "evaluated").inc(evaluated)
+        metrics.PROMPT_TOKENS.labels("ollama", "cached").inc(max(0, sent_tokens - evaluated))
+        metrics.OLLAMA_PROMPT_EVAL_SECONDS.labels("context" if reused else "fresh").observe(
+            (data.get("prompt_eval_duration") or 0) / 1e9
+        )
+
+    def warm_up(self) -> float | None:
+        """Load OLLAMA_MODEL into memory ahead of the first request; returns the load time in seconds."""
+        if self.provider != "ollama":
+            return None
+        url = f"{OLLAMA_BASE_URL.rstrip('/')}/api/generate"
+        started = time.perf_counter()
+        try:
+            # A request without a prompt only loads the model.
+            resp = requests.post(
+                url,
+                json={"model": OLLAMA_MODEL, "keep_alive": OLLAMA_KEEP_ALIVE},
+                timeout=600,
+            )
+            resp.raise_for_status()
+        except requests.RequestException as exc:
+            logger.warning("Ollama warm-up failed: %s", exc)
+            return None
+        load_seconds = (resp.json().get("load_duration") or 0) / 1e9
+        metrics.OLLAMA_WARMUP_SECONDS.set(time.perf_counter() - started)
+        logger.info("Ollama model %s warmed up (load %.2fs)", OLLAMA_MODEL, load_seconds)
+        return load_seconds
 
     def _call_huggingface(
-        self, content: str, num_questions: int, difficulty: str, retry_hint: str = ""
+        self,
+        content: str,
+        num_questions: int,
+        difficulty: str,
+        retry_hint: str = "",
+        counts: Dict[str, int] | None = None,
     ) -> str:
-        prompt = self._build_prompt(content, num_questions, difficulty, retry_hint)
-        temperature = self._sampling_temperature(difficulty)
-        base_url = HUGGINGFACE_API_URL.rstrip("/")
-        # Hugging Face migrated from api-inference.huggingface.co to router.huggingface.co.
-        if "api-inference.huggingface.co" in base_url:
-            base_url = base_url.replace(
-                "https://api-inference.huggingface.co",
-                "https://router.huggingface.co/hf-inference",
+        prompt = "".join(self._build_prompt_parts(content, num_questions, difficulty, retry_hint, counts))
+        budget_key = self._budget_key("generate", difficulty, num_questions)
+        max_tokens = token_budget.max_tokens(budget_key, max(512, num_questions * 180))
+        return self._with_output_modes(
+            lambda mode: self._hf_complete(
+                prompt,
+                max_tokens=max_tokens,
+                temperature=self._sampling_temperature(difficulty),
+                budget_key=budget_key,
+                output_mode=mode,
+                expected=num_questions,
+                schema=question_set_schema(counts) if counts else None,
             )
+        )
 
-        model = HUGGINGFACE_MODEL.strip().strip("/")
-        chat_url = f"{base_url}/{model}/v1/chat/completions"
-        legacy_url = f"{base_url}/{model}"
-        headers = {"Content-Type": "application/json"}
-        if HUGGINGFACE_API_TOKEN:
-            headers["Authorization"] = f"Bearer {HUGGINGFACE_API_TOKEN}"
-
-        try:
-            # Preferred path: OpenAI-compatible chat endpoint on HF router.
-            chat_payload: Dict[str, Any] = {
-                "model": model,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt,
-                    }
-                ],
-                "temperature": temperature,
-                "max_tokens": max(512, num_questions * 180),
-                "response_format": {"type": "json_object"},
-            }
-            resp = requests.post(chat_url, headers=headers, json=chat_payload, timeout=300)
-        except Exception as exc:  # pragma: no cover - network error
-            raise RuntimeError("Failed to reach Hugging Face inference endpoint.") from exc
-
-        # Fallback for older text-generation style endpoints.
+    def _hf_complete(
+        self,
+        prompt: str,
+        *,
+        max_tokens: int,
+        temperature: float,
+        budget_key: BudgetKey,
+        output_mode: str = "free",
+        expected: int = 0,
+        schema: Dict[str, Any] | None = None,
+    ) -> str:
+        endpoint = hf_endpoint()
+        caps = hf_capabilities.get(endpoint)
+        # Without probed capabilities, prefer the chat route and fall back on 404.
+        api = caps.api if caps is not None else "chat"
+        if caps is not None and caps.max_context:
+            max_tokens = max(64, min(max_tokens, caps.max_context - estimate_tokens(prompt)))
+        schema = (schema or question_schema(expected)) if output_mode == "schema" else None
+
+        resp = self._hf_post(endpoint, api, prompt, max_tokens, temperature, output_mode, schema)
         if resp.status_code == 404:
-            try:
-                legacy_payload: Dict[str, Any] = {
-                    "inputs": prompt,
-                    "parameters": {
-                        "max_new_tokens": max(512, num_questions * 180),
-                        "temperature": temperature,
-                        "return_full_text": False,
-                    },
-                }
-                resp = requests.post(
-                    legacy_url,
-                    headers=headers,
-                    json=legacy_payload,
-                    timeout=300,
-                )
-            except Exception as exc:  # pragma: no cover - network error
-                raise RuntimeError("Failed to reach Hugging Face legacy inference endpoint.") from exc
-
+            # The route we expected is gone; use the other one now and re-probe next call.
+            hf_capabilities.invalidate(endpoint)
+            api = "legacy" if api == "chat" else "chat"
+            output_mode = self._output_mode = "free"
+            resp = self._hf_post(endpoint, api, prompt, max_tokens, temperature, output_mode, None)
+
+        if output_mode != "free" and is_format_rejection(resp.status_code, resp.text):
+            raise UnsupportedOutputMode(resp.text[:200])
         if resp.status_code >= 400:
-            detail = resp.text[:500]
-            raise RuntimeError(f"Hugging Face API error: {resp.status_code} {detail}")
+            raise _http_error("Hugging Face API error", resp.status_code, resp.text[:500])
 
         data = resp.json()
         if isinstance(data, dict):
@@ -257,34 +789,89 @@ Source text:
                 if isinstance(first, dict):
                     message = first.get("message")
                     if isinstance(message, dict) and "content" in message:
+                        self._record_chat_usage(budget_key, data)
                         return str(message["content"])
 
         if isinstance(data, list) and data:
             first = data[0]
             if isinstance(first, dict):
                 if "generated_text" in first:
+                    self._record_legacy_usage(budget_key, first)
                     return str(first["generated_text"])
         if isinstance(data, dict):
             if "generated_text" in data:
+                self._record_legacy_usage(budget_key, data)
                 return str(data["generated_text"])
             if "error" in data:
                 raise RuntimeError(f"Hugging Face inference error: {data['error']}")
 
         raise RuntimeError("Unexpected response format from Hugging Face inference API.")
 
+    @staticmethod
+    def _hf_post(
+        endpoint: HFEndpoint,
+        api: str,
+        prompt: str,
+        max_tokens: int,
+        temperature: float,
+        output_mode: str,
+        schema: Dict[str, Any] | None,
+    ) -> requests.Response:
+        if api == "chat":
+            # OpenAI-compatible chat endpoint on HF router.
+            url = endpoint.chat_url
+            payload: Dict[str, Any] = {
+                "model": endpoint.model,
+                "messages": [{"role": "user", "content": prompt}],
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+            }
+            payload.update(_chat_response_format(output_mode, schema))
+        else:
+            # Older text-generation style endpoints.
+            url = endpoint.legacy_url
+            payload = {
+                "inputs": prompt,
+                "parameters": {
+                    "max_new_tokens": max_tokens,
+                    "temperature": temperature,
+                    "return_full_text": False,
+                    "details": True,
+                },
+            }
+            if output_mode == "schema":
+                # TGI grammar-constrained generation.
+                payload["parameters"]["grammar"] = {"type": "json", "value": schema}
+        try:
+            return bounded_post(url, headers=endpoint.headers, json=payload, timeout=300)
+        except requests.RequestException as exc:  # pragma: no cover - network error
+            raise ProviderUnavailable("Failed to reach Hugging Face inference endpoint.") from exc
+
     def _call_groq(
-        self, content: str, num_questions: int, difficulty: str, retry_hint: str = ""
+        self,
+        content: str,
+        num_questions: int,
+        difficulty: str,
+        retry_hint: str = "",
+        counts: Dict[str, int] | None = None,
     ) -> str:
         if not GROQ_API_KEY:
-            raise RuntimeError("GROQ_API_KEY is not set.")
-
-        prompt = self._build_prompt(content, num_questions, difficulty, retry_hint)
-        # Keep requested output tokens modest to reduce Groq TPM limit hits.
-        max_tokens = min(1400, max(450, num_questions * 110))
-        return self._call_groq_chat(
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=max_tokens,
-            temperature=self._sampling_temperature(difficulty),
+            raise ProviderRequestError("GROQ_API_KEY is not set.")
+
+        prompt = "".join(self._build_prompt_parts(content, num_questions, difficulty, retry_hint, counts))
+        # Keep requested output tokens modest to reduce Groq TPM limit hits (the cap is per set).
+        budget_key = self._budget_key("generate", difficulty, num_questions)
+        cap = 1400 * len(counts or (difficulty,))
+        max_tokens = token_budget.max_tokens(budget_key, min(cap, max(450, num_questions * 110)))
+        schema = question_set_schema(counts) if counts else question_schema(num_questions)
+        return self._with_output_modes(
+            lambda mode: self._call_groq_chat(
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                temperature=self._sampling_temperature(difficulty),
+                budget_key=budget_key,
+                response_format=_chat_response_format(mode, schema),
+            )
         )
 
     def _parse_questions(self, raw: str, expected: int) -> List[Dict[str, Any]]:
@@ -300,6 +887,27 @@ Source text:
         if not isinstance(questions, list) or not questions:
             raise RuntimeError("LLM JSON missing 'questions' list.")
 
+        normalised = self._normalise_questions(questions)
+        if not normalised:
+            raise RuntimeError("No valid questions parsed from LLM output.")
+
+        return normalised[:expected]
+
+    def _parse_question_sets(self, raw: str, counts: Dict[str, int]) -> Dict[str, List[Dict[str, Any]]]:
+        blob = self._extract_json_blob(raw)
+        if blob is None:
+            raise RuntimeError("LLM response did not contain JSON.")
+        sets: Dict[str, List[Dict[str, Any]]] = {}
+        for difficulty, count in counts.items():
+            items = blob.get(difficulty, blob.get(difficulty.upper()))
+            if isinstance(items, dict):
+                items = items.get("questions")
+            sets[difficulty] = self._normalise_questions(items)[:count] if isinstance(items, list) else []
+        if not any(sets.values()):
+            raise RuntimeError("No valid question sets parsed from LLM output.")
+        return sets
+
+    def _normalise_questions(self, questions: List[Any]) -> List[Dict[str, Any]]:
         normalised: List[Dict[str, Any]] = []
         for q in questions:
             if not isinstance(q, dict):
@@ -343,11 +951,7 @@ Source text:
                     "correct_answer": ["A", "B", "C", "D"][idx],
                 }
             )
-
-        if not normalised:
-            raise RuntimeError("No valid questions parsed from LLM output.")
-
-        return normalised[:expected]
+        return normalised
 
     def _validate_questions(
         self,
@@ -355,6 +959,7 @@ Source text:
         content: str,
         expected: int,
         difficulty: str,
+        check_difficulty: bool = True,
     ) -> List[Dict[str, Any]]:
         content_lower = content.lower()
         seen_question_keys = set()
@@ -366,27 +971,33 @@ Source text:
             correct_letter = str(q.get("correct_answer", "A")).upper()
 
             if not question or not isinstance(options, list) or len(options) != 4:
+                metrics.QUESTION_REJECTIONS.labels("malformed").inc()
                 continue
             if correct_letter not in ("A", "B", "C", "D"):
+                metrics.QUESTION_REJECTIONS.labels("bad_answer_key").inc()
                 continue
 
-            q_key = re.sub(r"\s+", " ", question.lower())
+            q_key = _question_key(question)
             if q_key in seen_question_keys:
+                metrics.QUESTION_REJECTIONS.labels("duplicate").inc()
                 continue
             seen_question_keys.add(q_key)
 
             correct_idx = {"A": 0, "B": 1, "C": 2, "D": 3}[correct_letter]
             correct_text = str(options[correct_idx]).strip()
             if not correct_text:
+                metrics.QUESTION_REJECTIONS.labels("empty_answer").inc()
                 continue
 
             # Grounding check: correct option should substantially overlap with source text.
             tokens = re.findall(r"[a-z0-9]{4,}", correct_text.lower())
             overlap = [t for t in tokens if t in content_lower]
             if tokens and (len(overlap) / len(tokens)) < 0.35:
+                metrics.QUESTION_REJECTIONS.labels("ungrounded").inc()
                 continue
 
-            if not self._matches_difficulty(question, difficulty):
+            if check_difficulty and not self._matches_difficulty(question, difficulty):
+                metrics.QUESTION_REJECTIONS.labels("difficulty").inc()
                 continue
 
             validated.append(
@@ -413,13 +1024,11 @@ Source text:
         q = question.lower()
         target = (target or "medium").lower().strip()
         if target == "easy":
-            disallowed = ("most likely", "best explains", "implies", "inference", "synthesize")
-            return not any(term in q for term in disallowed)
+            return not any(term in q for term in EASY_DISALLOWED)
         if target == "hard":
-            required_any = ("most likely", "best explains", "implies", "inference", "synthesis", "combined")
-            return any(term in q for term in required_any) or len(q.split()) >= 12
+            return any(term in q for term in HARD_CUES) or len(q.split()) >= 12
         # medium
-        if any(term in q for term in ("synthesis", "combined", "multi-step")):
+        if any(term in q for term in MEDIUM_DISALLOWED):
             return False
         return len(q.split()) >= 8
 
@@ -575,66 +1184,54 @@ Input:
 """
 
         if self.provider == "ollama":
-            url = f"{OLLAMA_BASE_URL.rstrip('/')}/api/generate"
-            resp = requests.post(
-                url,
-                json={
-                    "model": OLLAMA_MODEL,
-                    "prompt": repair_prompt,
-                    "stream": False,
-                    "temperature": 0.1,
-                },
-                timeout=180,
+            budget_key = self._budget_key("repair", "any", expected)
+            max_tokens = token_budget.max_tokens(budget_key, max(512, expected * 160))
+            # The model's own answer is already in the previous call's context; only ask for the rewrite.
+            document_key = self._ollama_context[0] if self._ollama_context else None
+            return self._with_output_modes(
+                lambda mode: self._ollama_generate(
+                    repair_prompt,
+                    max_tokens=max_tokens,
+                    temperature=0.1,
+                    budget_key=budget_key,
+                    timeout=180,
+                    output_mode=mode,
+                    expected=expected,
+                    document_key=document_key,
+                    follow_up=_REPAIR_FOLLOW_UP.format(expected=expected),
+                )
             )
-            if resp.status_code >= 400:
-                raise RuntimeError(f"Ollama repair failed: {resp.status_code} {resp.text}")
-            data = resp.json()
-            return str(data.get("response", ""))
 
         if self.provider == "huggingface":
-            base_url = HUGGINGFACE_API_URL.rstrip("/")
-            if "api-inference.huggingface.co" in base_url:
-                base_url = base_url.replace(
-                    "https://api-inference.huggingface.co",
-                    "https://router.huggingface.co/hf-inference",
+            budget_key = self._budget_key("repair", "any", expected)
+            max_tokens = token_budget.max_tokens(budget_key, max(512, expected * 160))
+            return self._with_output_modes(
+                lambda mode: self._hf_complete(
+                    repair_prompt,
+                    max_tokens=max_tokens,
+                    temperature=0.1,
+                    budget_key=budget_key,
+                    output_mode=mode,
+                    expected=expected,
                 )
-            model = HUGGINGFACE_MODEL.strip().strip("/")
-            chat_url = f"{base_url}/{model}/v1/chat/completions"
-            headers = {"Content-Type": "application/json"}
-            if HUGGINGFACE_API_TOKEN:
-                headers["Authorization"] = f"Bearer {HUGGINGFACE_API_TOKEN}"
-            payload = {
-                "model": model,
-                "messages": [{"role": "user", "content": repair_prompt}],
-                "temperature": 0.1,
-                "max_tokens": max(512, expected * 160),
-                "response_format": {"type": "json_object"},
-            }
-            resp = requests.post(chat_url, headers=headers, json=payload, timeout=180)
-            if resp.status_code >= 400:
-                raise RuntimeError(f"Hugging Face repair failed: {resp.status_code} {resp.text[:500]}")
-            data = resp.json()
-            if isinstance(data, dict):
-                choices = data.get("choices")
-                if isinstance(choices, list) and choices:
-                    first = choices[0]
-                    if isinstance(first, dict):
-                        message = first.get("message")
-                        if isinstance(message, dict) and "content" in message:
-                            return str(message["content"])
-            raise RuntimeError("Hugging Face repair failed: unexpected response format.")
+            )
 
         if self.provider == "groq":
             if not GROQ_API_KEY:
-                raise RuntimeError("GROQ_API_KEY is not set.")
-            max_tokens = min(1300, max(400, expected * 100))
-            return self._call_groq_chat(
-                messages=[{"role": "user", "content": repair_prompt}],
-                max_tokens=max_tokens,
-                temperature=0.1,
+                raise ProviderRequestError("GROQ_API_KEY is not set.")
+            budget_key = self._budget_key("repair", "any", expected)
+            max_tokens = token_budget.max_tokens(budget_key, min(1300, max(400, expected * 100)))
+            return self._with_output_modes(
+                lambda mode: self._call_groq_chat(
+                    messages=[{"role": "user", "content": repair_prompt}],
+                    max_tokens=max_tokens,
+                    temperature=0.1,
+                    budget_key=budget_key,
+                    response_format=_chat_response_format(mode, question_schema(expected)),
+                )
             )
 
-        raise RuntimeError("Unsupported LLM provider for repair step.")
+        raise ProviderRequestError("Unsupported LLM provider for repair step.")
 
     def _call_groq_chat(
         self,
@@ -642,6 +1239,8 @@ Input:
         messages: List[Dict[str, str]],
         max_tokens: int,
         temperature: float,
+        budget_key: BudgetKey | None = None,
+        response_format: Dict[str, Any] | None = None,
     ) -> str:
         url = f"{GROQ_API_URL.rstrip('/')}/chat/completions"
         headers = {
@@ -653,23 +1252,28 @@ Input:
             "messages": messages,
             "temperature": temperature,
             "max_tokens": max_tokens,
+            **(response_format or {}),
         }
 
         last_error = "Unknown Groq error."
         for attempt in range(4):
             try:
-                resp = requests.post(url, headers=headers, json=payload, timeout=180)
-            except Exception as exc:
-                raise RuntimeError("Failed to reach Groq API endpoint.") from exc
+                resp = bounded_post(url, headers=headers, json=payload, timeout=180)
+            except requests.RequestException as exc:
+                raise ProviderUnavailable("Failed to reach Groq API endpoint.") from exc
 
+            if resp.status_code == 429:
+                metrics.PROVIDER_ERRORS.labels("groq", "rate_limited").inc()
             if resp.status_code == 429 and attempt < 3:
                 wait_s = self._extract_retry_after_seconds(resp) or 1.5
-                time.sleep(min(max(wait_s, 0.5), 8.0))
+                backoff(min(max(wait_s, 0.5), 8.0))
                 last_error = f"Groq rate limit exceeded (attempt {attempt + 1})."
                 continue
 
+            if response_format and is_format_rejection(resp.status_code, resp.text):
+                raise UnsupportedOutputMode(resp.text[:200])
             if resp.status_code >= 400:
-                raise RuntimeError(f"Groq API error: {resp.status_code} {resp.text[:500]}")
+                raise _http_error("Groq API error", resp.status_code, resp.text[:500])
 
             data = resp.json()
             choices = data.get("choices")
@@ -678,11 +1282,55 @@ Input:
                 if isinstance(first, dict):
                     message = first.get("message")
                     if isinstance(message, dict) and "content" in message:
+                        if budget_key is not None:
+                            self._record_chat_usage(budget_key, data)
                         return str(message["content"])
 
             raise RuntimeError("Unexpected response format from Groq API.")
 
-        raise RuntimeError(last_error)
+        raise ProviderUnavailable(last_error)
+
+    def _model_name(self) -> str:
+        return {"ollama": OLLAMA_MODEL, "huggingface": HUGGINGFACE_MODEL, "groq": GROQ_MODEL}.get(
+            self.provider, ""
+        )
+
+    def _budget_key(self, task: str, difficulty: str, num_questions: int) -> BudgetKey:
+        return BudgetKey(self.provider, self._model_name(), task, difficulty, num_questions)
+
+    def _offered_output_modes(self) -> Tuple[str, ...]:
+        if self.provider == "huggingface":
+            caps = hf_capabilities.get(hf_endpoint())
+            if caps is not None and (caps.api == "legacy" or not caps.json_mode):
+                return ("schema", "free")
+        return OUTPUT_MODES
+
+    def _with_output_modes(self, send: Callable[[str], str]) -> str:
+        """Call ``send(mode)`` with the strongest output constraint the model accepts."""
+        model = self._model_name()
+        for mode in structured_support.modes(self.provider, model, self._offered_output_modes()):
+            # Set before sending: a call that falls back to another mode records what it really sent.
+            self._output_mode = mode
+            try:
+                return send(mode)
+            except UnsupportedOutputMode:
+                structured_support.mark_unsupported(self.provider, model, mode)
+                continue
+        raise RuntimeError("No output mode accepted by the model.")
+
+    def _record_chat_usage(self, key: BudgetKey, data: Dict[str, Any]) -> None:
+        usage = data.get("usage") or {}
+        choices = data.get("choices") or [{}]
+        token_budget.record(key, usage.get("completion_tokens"), choices[0].get("finish_reason"))
+        # OpenAI-compatible APIs (Groq included) report prompt-cache hits under prompt_tokens_details.
+        prompt_tokens = int(usage.get("prompt_tokens") or 0)
+        cached = int((usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0)
+        metrics.PROMPT_TOKENS.labels(self.provider, "evaluated").inc(max(0, prompt_tokens - cached))
+        metrics.PROMPT_TOKENS.labels(self.provider, "cached").inc(cached)
+
+    def _record_legacy_usage(self, key: BudgetKey, item: Dict[str, Any]) -> None:
+        details = item.get("details") or {}
+        token_budget.record(key, details.get("generated_tokens"), details.get("finish_reason"))
 
     def _extract_retry_after_seconds(self, resp: requests.Response) -> float | None:
         retry_after = resp.headers.get("retry-after")
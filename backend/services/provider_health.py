@@ -0,0 +1,167 @@
+"""
+Background health checks for the configured LLM providers.
+
+A daemon thread asks each provider in LLM_PROVIDERS, every
+PROVIDER_PROBE_INTERVAL_S, whether it is reachable, using a cheap metadata
+route rather than a generation (Ollama `/api/tags`, the OpenAI-style
+`/models` listing for Groq, `/info` for a Hugging Face endpoint). The last
+answer is cached, so `/health` never waits on a provider; an unreachable
+provider also trips its circuit breaker.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List
+
+import requests
+
+from config import (
+    DEGRADED_FALLBACK,
+    GROQ_API_KEY,
+    GROQ_API_URL,
+    OLLAMA_BASE_URL,
+    OLLAMA_MODEL,
+    PROVIDER_PROBE_INTERVAL_S,
+    PROVIDER_PROBE_TIMEOUT_S,
+)
+from services.circuit_breaker import HALF_OPEN, OPEN, breaker_for
+from services.hf_capabilities import hf_endpoint
+from services.provider_router import provider_router, provider_stats
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProbeResult:
+    reachable: bool
+    detail: str
+    latency_ms: float | None
+    checked_at: float
+
+
+def _probe_ollama() -> str:
+    resp = requests.get(f"{OLLAMA_BASE_URL.rstrip('/')}/api/tags", timeout=PROVIDER_PROBE_TIMEOUT_S)
+    resp.raise_for_status()
+    names = {m.get("name", "") for m in resp.json().get("models", [])}
+    if names and not any(n == OLLAMA_MODEL or n.startswith(f"{OLLAMA_MODEL}:") for n in names):
+        return f"model {OLLAMA_MODEL} is not pulled"
+    return ""
+
+
+def _probe_groq() -> str:
+    if not GROQ_API_KEY:
+        raise RuntimeError("GROQ_API_KEY is not set")
+    resp = requests.get(
+        f"{GROQ_API_URL.rstrip('/')}/models",
+        headers={"Authorization": f"Bearer {GROQ_API_KEY}"},
+        timeout=PROVIDER_PROBE_TIMEOUT_S,
+    )
+    resp.raise_for_status()
+    return ""
+
+
+def _probe_huggingface() -> str:
+    endpoint = hf_endpoint()
+    resp = requests.get(f"{endpoint.legacy_url}/info", headers=endpoint.headers, timeout=PROVIDER_PROBE_TIMEOUT_S)
+    # Any answer below 500 (including 404 from servers without /info) means the endpoint is up.
+    if resp.status_code in (401, 403) or resp.status_code >= 500:
+        resp.raise_for_status()
+    return ""
+
+
+_PROBES: Dict[str, Callable[[], str]] = {
+    "ollama": _probe_ollama,
+    "groq": _probe_groq,
+    "huggingface": _probe_huggingface,
+}
+
+
+class HealthProber:
+    def __init__(self, providers: List[str], interval_s: float = PROVIDER_PROBE_INTERVAL_S) -> None:
+        self.providers = [p for p in providers if p in _PROBES]
+        self.interval_s = interval_s
+        self._results: Dict[str, ProbeResult] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self.interval_s <= 0 or not self.providers or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="provider-health", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread = None
+
+    def probe_all(self) -> None:
+        for provider in self.providers:
+            self.probe(provider)
+
+    def probe(self, provider: str) -> ProbeResult:
+        started = time.perf_counter()
+        try:
+            detail = _PROBES[provider]()
+            result = ProbeResult(True, detail, round((time.perf_counter() - started) * 1000, 1), time.time())
+        except (requests.RequestException, RuntimeError, ValueError) as exc:
+            result = ProbeResult(False, str(exc)[:200], None, time.time())
+            breaker_for(provider).trip("health probe failed")
+        with self._lock:
+            self._results[provider] = result
+        return result
+
+    def result(self, provider: str) -> ProbeResult | None:
+        with self._lock:
+            return self._results.get(provider)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.probe_all()
+            except Exception:  # pragma: no cover - keep the prober alive
+                logger.exception("Provider health probe failed")
+            self._stop.wait(self.interval_s)
+
+
+health_prober = HealthProber(provider_router.names)
+
+
+def health_report() -> Dict[str, Any]:
+    """Cached per-provider health; makes no provider call."""
+    stats = provider_stats.snapshot()
+    providers: Dict[str, Any] = {}
+    for name in provider_router.names:
+        probe = health_prober.result(name)
+        entry: Dict[str, Any] = {"breaker": breaker_for(name).snapshot()}
+        entry["probe"] = asdict(probe) if probe is not None else None
+        entry.update(stats.get(name, {"success_rate": None, "p50_s": None, "p95_s": None}))
+        entry["status"] = _provider_status(name, entry)
+        providers[name] = entry
+
+    statuses = [entry["status"] for entry in providers.values()]
+    if all(s in ("up", "unknown") for s in statuses):
+        status = "ok"
+    elif any(s != "down" for s in statuses) or DEGRADED_FALLBACK:
+        status = "degraded"
+    else:
+        status = "down"
+    return {"status": status, "degraded_fallback": DEGRADED_FALLBACK, "providers": providers}
+
+
+def _provider_status(name: str, entry: Dict[str, Any]) -> str:
+    if name == "template":
+        return "up"
+    probe = entry["probe"]
+    if entry["breaker"]["state"] == OPEN or (probe is not None and not probe["reachable"]):
+        return "down"
+    if entry["breaker"]["state"] == HALF_OPEN:
+        return "recovering"
+    if probe is None:
+        return "unknown"
+    return "up"
@@ -0,0 +1,301 @@
+"""
+Routing quiz generation across several LLM providers.
+
+LLM_PROVIDERS lists the providers to use, either in order of preference
+("groq,ollama") or weighted ("groq:3,ollama:1"). The primary is, in order mode, the first
+provider whose circuit breaker lets calls through; in weighted mode a draw
+among those, scaled by recent success rate and relative speed. Providers
+with an open breaker go last, so failover reaches them only as a last resort.
+
+If the primary has not answered within its observed p95, a hedged request
+goes to the next provider; the first valid result wins and the other leg is
+cancelled. A primary that fails outright fails over to the next provider.
+At most HEDGE_MAX_RATIO of generations are hedged, so the extra provider
+calls stay bounded even when latency is uniformly bad. Multi-difficulty
+quiz sets only fail over: their latency is not comparable with the single
+quizzes the hedge threshold is learnt from.
+"""
+
+from __future__ import annotations
+
+import math
+import random
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from typing import Any, Callable, Deque, Dict, List, Tuple, TypeVar
+
+import metrics
+from config import (
+    DEADLINE_MIN_CALL_S,
+    HEDGE_ENABLED,
+    HEDGE_MAX_RATIO,
+    HEDGE_MIN_SAMPLES,
+    LLM_HTTP_WORKERS,
+    LLM_PROVIDERS,
+)
+from services.circuit_breaker import CircuitOpen, breaker_for
+from services.deadline import Deadline, DeadlineExceeded, RequestCancelled, current_deadline, deadline_scope
+from services.llm_service import OUTAGE_ERRORS, LLMService, ProviderUnavailable
+
+_executor = ThreadPoolExecutor(max_workers=LLM_HTTP_WORKERS, thread_name_prefix="llm-route")
+
+T = TypeVar("T")
+
+
+def parse_providers(spec: str) -> Tuple[List[Tuple[str, float]], bool]:
+    """``"groq:3,ollama:1"`` -> ``([("groq", 3.0), ("ollama", 1.0)], True)``; weighted if any weight is given."""
+    providers: List[Tuple[str, float]] = []
+    weighted = False
+    for part in spec.split(","):
+        name, sep, weight = part.strip().partition(":")
+        if not name:
+            continue
+        providers.append((name.strip(), float(weight) if sep else 1.0))
+        weighted = weighted or bool(sep)
+    return providers, weighted
+
+
+class ProviderStats:
+    """Recent success rate (EWMA) and latency window of whole generations, per provider."""
+
+    def __init__(self, window: int = 200, alpha: float = 0.1) -> None:
+        self.window = window
+        self.alpha = alpha
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._success: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, provider: str, seconds: float | None, ok: bool) -> None:
+        """One finished generation; ``seconds=None`` counts only towards the success rate."""
+        with self._lock:
+            previous = self._success.get(provider, 1.0)
+            self._success[provider] = previous + self.alpha * ((1.0 if ok else 0.0) - previous)
+            if ok and seconds is not None:
+                self._latency_window(provider).append(seconds)
+
+    def observe_latency(self, provider: str, seconds: float) -> None:
+        """A lower bound on a call's latency (it was cancelled), without counting it as a success."""
+        with self._lock:
+            self._latency_window(provider).append(seconds)
+
+    def success_rate(self, provider: str) -> float:
+        with self._lock:
+            return self._success.get(provider, 1.0)
+
+    def latency(self, provider: str, quantile: float) -> float | None:
+        """Latency quantile, or None until HEDGE_MIN_SAMPLES calls have been seen."""
+        with self._lock:
+            samples = sorted(self._latencies.get(provider, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(quantile * len(samples)))]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            providers = sorted(set(self._success) | set(self._latencies))
+        return {
+            provider: {
+                "success_rate": round(self.success_rate(provider), 3),
+                "p50_s": self.latency(provider, 0.5),
+                "p95_s": self.latency(provider, 0.95),
+            }
+            for provider in providers
+        }
+
+    def _latency_window(self, provider: str) -> Deque[float]:
+        window = self._latencies.get(provider)
+        if window is None:
+            window = self._latencies[provider] = deque(maxlen=self.window)
+        return window
+
+
+provider_stats = ProviderStats()
+
+
+class _HedgeBudget:
+    """Moving share of generations that were hedged; no new hedges while it is above the cap."""
+
+    def __init__(self, max_ratio: float, alpha: float = 0.02) -> None:
+        self.max_ratio = max_ratio
+        self.alpha = alpha
+        self._rate = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            return self._rate < self.max_ratio
+
+    def record(self, hedged: bool) -> None:
+        with self._lock:
+            self._rate += self.alpha * ((1.0 if hedged else 0.0) - self._rate)
+
+
+class ProviderRouter:
+    def __init__(self, spec: str = LLM_PROVIDERS, stats: ProviderStats = provider_stats) -> None:
+        self.providers, self.weighted = parse_providers(spec)
+        if not self.providers:
+            raise ValueError("LLM_PROVIDERS does not name any provider.")
+        self.stats = stats
+        self._budget = _HedgeBudget(HEDGE_MAX_RATIO)
+
+    @property
+    def names(self) -> List[str]:
+        return [name for name, _ in self.providers]
+
+    @property
+    def provider(self) -> str:
+        """Label for the routed set (coalescing and admission key)."""
+        return "+".join(self.names)
+
+    def generate_questions(
+        self,
+        content: str,
+        num_questions: int,
+        difficulty: str,
+        minimum: int | None = None,
+    ) -> List[Dict[str, Any]]:
+        return self._route(
+            lambda llm: llm.generate_questions(content, num_questions, difficulty, minimum=minimum), hedge=True
+        )
+
+    def generate_question_sets(self, content: str, counts: Dict[str, int]) -> Dict[str, List[Dict[str, Any]]]:
+        return self._route(lambda llm: llm.generate_question_sets(content, counts), hedge=False)
+
+    def generate_replacement_question(self, content: str, difficulty: str, existing: List[str]) -> Dict[str, Any]:
+        return self._route(lambda llm: llm.generate_replacement_question(content, difficulty, existing), hedge=False)
+
+    def generate_template_questions(
+        self, content: str, num_questions: int, difficulty: str, minimum: int = 1
+    ) -> List[Dict[str, Any]]:
+        return LLMService(self.names[0]).generate_template_questions(
+            content, num_questions, difficulty, minimum=minimum
+        )
+
+    def generate_template_replacement(self, content: str, difficulty: str, existing: List[str]) -> Dict[str, Any]:
+        return LLMService(self.names[0]).generate_template_replacement(content, difficulty, existing)
+
+    def _route(self, generate: Callable[[LLMService], T], hedge: bool) -> T:
+        order = self._order()
+        if len(order) == 1:
+            return self._call(order[0], None, generate, hedge)
+
+        parent = current_deadline() or Deadline(math.inf)
+        hedge_after = None
+        if hedge and HEDGE_ENABLED and self._budget.allow():
+            hedge_after = self.stats.latency(order[0], 0.95)
+
+        started = time.monotonic()
+        pending: Dict[Future, Tuple[str, Deadline, float]] = {}
+        remaining = list(order)
+        hedged = False
+        last_error: RuntimeError | None = None
+
+        def launch(role: str) -> None:
+            name = remaining.pop(0)
+            leg = parent.branch()
+            ctx = copy_context()
+            future = _executor.submit(ctx.run, self._call, name, leg, generate, hedge)
+            pending[future] = (name, leg, time.monotonic())
+            metrics.PROVIDER_ROUTING.labels(name, role).inc()
+
+        launch("primary")
+        try:
+            while pending:
+                timeout = None
+                if hedge_after is not None and not hedged and remaining:
+                    timeout = max(0.0, started + hedge_after - time.monotonic())
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    # The primary is slower than its p95: race the next provider against it.
+                    hedged = True
+                    launch("hedge")
+                    continue
+
+                for future in done:
+                    name, _leg, _leg_started = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except RequestCancelled:
+                        raise
+                    except RuntimeError as exc:
+                        metrics.PROVIDER_ROUTING.labels(name, "failed").inc()
+                        last_error = exc
+                        continue
+                    metrics.PROVIDER_ROUTING.labels(name, "won").inc()
+                    self._cancel_losers(pending)
+                    return result
+
+                if isinstance(last_error, DeadlineExceeded) or parent.remaining() <= DEADLINE_MIN_CALL_S:
+                    break
+                if not pending and remaining:
+                    launch("failover")
+        finally:
+            if hedge:
+                self._budget.record(hedged)
+            self._cancel_losers(pending)
+
+        if isinstance(last_error, DeadlineExceeded):
+            raise last_error
+        # Only an outage on every provider is one; otherwise the last provider's own error is what to fix.
+        error = ProviderUnavailable if isinstance(last_error, OUTAGE_ERRORS) else RuntimeError
+        raise error(f"All providers failed ({', '.join(order)}). {last_error or ''}".strip()) from last_error
+
+    def _call(self, name: str, leg: Deadline | None, generate: Callable[[LLMService], T], timed: bool) -> T:
+        """``timed`` calls feed the latency window the hedge threshold comes from."""
+        started = time.perf_counter()
+        try:
+            with deadline_scope(leg) if leg is not None else nullcontext():
+                result = generate(LLMService(name))
+        except (RequestCancelled, CircuitOpen):
+            raise
+        except RuntimeError:
+            self.stats.observe(name, time.perf_counter() - started if timed else None, ok=False)
+            raise
+        finally:
+            if leg is not None:
+                leg.release()
+        self.stats.observe(name, time.perf_counter() - started if timed else None, ok=True)
+        return result
+
+    def _cancel_losers(self, pending: Dict[Future, Tuple[str, Deadline, float]]) -> None:
+        for future, (name, leg, leg_started) in list(pending.items()):
+            leg.cancel(event=None)
+            future.cancel()
+            # The loser ran at least this long; keep that in its latency picture.
+            self.stats.observe_latency(name, time.monotonic() - leg_started)
+            metrics.PROVIDER_ROUTING.labels(name, "cancelled").inc()
+        pending.clear()
+
+    def _order(self) -> List[str]:
+        names = self.names
+        if len(names) == 1:
+            return names
+        available = [n for n in names if breaker_for(n).available()]
+        unavailable = [n for n in names if n not in available]
+        if not self.weighted or not available:
+            return available + unavailable
+
+        scores = {
+            name: weight * self.stats.success_rate(name) * self._speed(name)
+            for name, weight in self.providers
+            if name in available
+        }
+        if sum(scores.values()) <= 0:
+            scores = {name: weight for name, weight in self.providers if name in available}
+        primary = random.choices(available, weights=[scores[n] for n in available])[0]
+        return [primary] + sorted((n for n in available if n != primary), key=lambda n: -scores[n]) + unavailable
+
+    def _speed(self, name: str) -> float:
+        """Relative speed (fastest known p50 / this provider's p50); 1.0 while unknown."""
+        p50 = self.stats.latency(name, 0.5)
+        known = [p for p in (self.stats.latency(n, 0.5) for n in self.names) if p]
+        if not p50 or not known:
+            return 1.0
+        return min(known) / p50
+
+
+provider_router = ProviderRouter()
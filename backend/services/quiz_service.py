@@ -1,19 +1,47 @@
 from __future__ import annotations
 
+import hashlib
 import json
-from typing import Dict, Any, List
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List
 
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
-from config import DIFFICULTIES
+import metrics
+from config import (
+    COALESCE_ENABLED,
+    COALESCE_MODE,
+    COALESCE_POOL_MAX_QUESTIONS,
+    DEGRADED_FALLBACK,
+    DIFFICULTIES,
+)
+from database import SessionLocal
 from models import Quiz, QuizResponse
-from services.llm_service import LLMService
+from services.circuit_breaker import CircuitOpen
+from services.deadline import Deadline, DeadlineExceeded, deadline_scope
+from services.llm_service import OUTAGE_ERRORS
+from services.provider_router import provider_router
+from services.quiz_tokens import InvalidQuizToken, quiz_tokens
+from services.response_writer import PendingResponse, response_writer
+from services.single_flight import generation_flights
+from services.stats_service import StatsService, question_revisions
+
+
+class QuizConflict(RuntimeError):
+    """The quiz was changed by someone else while it was being edited."""
+
+
+class QuizNotFound(LookupError):
+    """No stored quiz, or no question at the requested index."""
 
 
 class QuizService:
-    def __init__(self, db: Session) -> None:
+    def __init__(self, db: Session | None = None) -> None:
+        # Without a session, generation opens one only for the final commit,
+        # so no connection is held while the LLM is working.
         self.db = db
-        self.llm = LLMService()
+        self.llm = provider_router
 
     def generate_quiz(
         self,
@@ -23,26 +51,235 @@ class QuizService:
         source_label: str | None,
         difficulty: str,
         num_questions: int,
+        deadline: Deadline | None = None,
     ) -> Dict[str, Any]:
-        difficulty_norm = difficulty.lower()
-        if difficulty_norm not in DIFFICULTIES:
-            difficulty_norm = "medium"
-
-        questions = self.llm.generate_questions(content, num_questions, difficulty_norm)
-
-        quiz = Quiz(
-            source_type=source_type,
-            source_label=source_label,
-            difficulty=difficulty_norm,
-            num_questions=len(questions),
-            content=content[:10000],  # truncate for storage
-            questions_json=json.dumps(questions),
+        difficulty_norm = _normalise_difficulty(difficulty)
+        degraded = False
+        with deadline_scope(deadline):
+            try:
+                questions = self._generate_questions(content, num_questions, difficulty_norm)
+            except OUTAGE_ERRORS as exc:
+                reason = _degraded_reason(exc)
+                questions = self._degraded_questions(content, num_questions, difficulty_norm, reason)
+                if questions is None:
+                    raise
+                degraded = True
+
+        return self._save_quiz(content, source_type, source_label, difficulty_norm, questions, degraded)
+
+    def generate_quiz_set(
+        self,
+        *,
+        content: str,
+        source_type: str,
+        source_label: str | None,
+        counts: Dict[str, int],
+        deadline: Deadline | None = None,
+    ) -> List[Dict[str, Any]]:
+        """One quiz per difficulty in ``counts``, generated together so the source is sent once."""
+        with deadline_scope(deadline):
+            try:
+                sets = self.llm.generate_question_sets(content, counts)
+            except OUTAGE_ERRORS as exc:
+                degraded_sets = self._degraded_sets(content, counts, _degraded_reason(exc))
+                if degraded_sets is None:
+                    raise
+                return self._save_quiz_set(content, source_type, source_label, degraded_sets, degraded=True)
+
+        return self._save_quiz_set(content, source_type, source_label, sets, degraded=False)
+
+    def generate_degraded_quiz_set(
+        self,
+        *,
+        content: str,
+        source_type: str,
+        source_label: str | None,
+        counts: Dict[str, int],
+        reason: str,
+    ) -> List[Dict[str, Any]] | None:
+        sets = self._degraded_sets(content, counts, reason)
+        if sets is None:
+            return None
+        return self._save_quiz_set(content, source_type, source_label, sets, degraded=True)
+
+    def regenerate_question(self, quiz_id: str, index: int, deadline: Deadline | None = None) -> Dict[str, Any]:
+        """
+        Replace question ``index`` of a stored quiz with a new one from its
+        stored content. The other stems are passed to the model so it does not
+        repeat them. The write is optimistic: it only applies if the quiz is
+        unchanged since it was read, otherwise QuizConflict is raised.
+        """
+        with self._session() as db:
+            quiz = db.get(Quiz, quiz_id)
+            if not quiz:
+                raise QuizNotFound("Quiz not found")
+            stored, content, difficulty = quiz.questions_json, quiz.content, quiz.difficulty
+            questions: List[Dict[str, Any]] = json.loads(stored)
+            revisions = question_revisions(quiz, len(questions))
+        if not 0 <= index < len(questions):
+            raise QuizNotFound("Question not found")
+
+        existing = [str(q.get("question", "")) for q in questions]
+        degraded = False
+        with deadline_scope(deadline):
+            try:
+                replacement = self.llm.generate_replacement_question(content, difficulty, existing)
+            except OUTAGE_ERRORS as exc:
+                if not DEGRADED_FALLBACK or self.llm.provider == "template":
+                    raise
+                try:
+                    replacement = self.llm.generate_template_replacement(content, difficulty, existing)
+                except RuntimeError:
+                    raise exc from None
+                metrics.DEGRADED_GENERATIONS.labels(_degraded_reason(exc)).inc()
+                degraded = True
+
+        questions[index] = replacement
+        revision = max(revisions, default=0) + 1
+        revisions[index] = revision
+        with metrics.stage("db_commit"), self._session() as db:
+            updated = db.execute(
+                update(Quiz)
+                .where(Quiz.id == quiz_id, Quiz.questions_json == stored)
+                .values(questions_json=json.dumps(questions), question_revisions_json=json.dumps(revisions))
+            ).rowcount
+            if not updated:
+                db.rollback()
+                raise QuizConflict("Quiz was changed while the question was being regenerated; try again.")
+            # The old question's answer counts say nothing about the new one.
+            StatsService(db).reset_question(quiz_id, index)
+            db.commit()
+
+        result = {"quiz_id": quiz_id, "index": index, "question": replacement, "degraded": degraded}
+        if quiz_tokens.enabled:
+            result["quiz_token"] = quiz_tokens.issue(quiz_id, difficulty, questions, revision=revision)
+        return result
+
+    def generate_degraded_quiz(
+        self,
+        *,
+        content: str,
+        source_type: str,
+        source_label: str | None,
+        difficulty: str,
+        num_questions: int,
+        reason: str,
+    ) -> Dict[str, Any] | None:
+        """A template-built quiz for a request the LLM cannot take; None if degraded mode is off or impossible."""
+        difficulty_norm = _normalise_difficulty(difficulty)
+        questions = self._degraded_questions(content, num_questions, difficulty_norm, reason)
+        if questions is None:
+            return None
+        return self._save_quiz(content, source_type, source_label, difficulty_norm, questions, degraded=True)
+
+    def _save_quiz(
+        self,
+        content: str,
+        source_type: str,
+        source_label: str | None,
+        difficulty: str,
+        questions: List[Dict[str, Any]],
+        degraded: bool,
+    ) -> Dict[str, Any]:
+        [result] = self._save_quiz_set(content, source_type, source_label, {difficulty: questions}, degraded)
+        del result["difficulty"]
+        return result
+
+    def _save_quiz_set(
+        self,
+        content: str,
+        source_type: str,
+        source_label: str | None,
+        sets: Dict[str, List[Dict[str, Any]]],
+        degraded: bool,
+    ) -> List[Dict[str, Any]]:
+        """One Quiz row per difficulty, all in a single commit."""
+        quizzes = [
+            Quiz(
+                source_type=source_type,
+                source_label=source_label,
+                difficulty=difficulty,
+                num_questions=len(questions),
+                content=content[:10000],  # truncate for storage
+                questions_json=json.dumps(questions),
+            )
+            for difficulty, questions in sets.items()
+        ]
+        with metrics.stage("db_commit"), self._session() as db:
+            db.add_all(quizzes)
+            db.commit()
+            for quiz in quizzes:
+                db.refresh(quiz)
+
+        results = [
+            {"difficulty": quiz.difficulty, "quiz_id": quiz.id, "questions": sets[quiz.difficulty], "degraded": degraded}
+            for quiz in quizzes
+        ]
+        if quiz_tokens.enabled:
+            for result in results:
+                result["quiz_token"] = quiz_tokens.issue(result["quiz_id"], result["difficulty"], result["questions"])
+        return results
+
+    @contextmanager
+    def _session(self) -> Iterator[Session]:
+        if self.db is not None:
+            yield self.db
+            return
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def _generate_questions(self, content: str, num_questions: int, difficulty: str) -> List[Dict[str, Any]]:
+        if not COALESCE_ENABLED:
+            return self.llm.generate_questions(content, num_questions, difficulty)
+
+        key = (
+            hashlib.sha256(content.encode("utf-8")).hexdigest(),
+            self.llm.provider,
+            difficulty,
+            num_questions,
         )
-        self.db.add(quiz)
-        self.db.commit()
-        self.db.refresh(quiz)
+        if COALESCE_MODE == "distinct":
+            def generate_pool(group_size: int) -> List[Dict[str, Any]]:
+                pool_size = min(num_questions * group_size, max(num_questions, COALESCE_POOL_MAX_QUESTIONS))
+                return self.llm.generate_questions(content, pool_size, difficulty, minimum=num_questions)
+
+            pool, index = generation_flights.run(key, generate_pool)
+            return draw_questions(pool, num_questions, index)
+
+        questions, _ = generation_flights.run(
+            key, lambda _group_size: self.llm.generate_questions(content, num_questions, difficulty)
+        )
+        return [dict(q) for q in questions]
+
+    def _degraded_questions(
+        self, content: str, num_questions: int, difficulty: str, reason: str
+    ) -> List[Dict[str, Any]] | None:
+        """Template-generated questions in place of the LLM's, or None if that is off or impossible."""
+        if not DEGRADED_FALLBACK or self.llm.provider == "template":
+            return None
+        try:
+            questions = self.llm.generate_template_questions(content, num_questions, difficulty)
+        except RuntimeError:
+            return None
+        metrics.DEGRADED_GENERATIONS.labels(reason).inc()
+        return questions
+
+    def _degraded_sets(
+        self, content: str, counts: Dict[str, int], reason: str
+    ) -> Dict[str, List[Dict[str, Any]]] | None:
+        sets: Dict[str, List[Dict[str, Any]]] = {}
+        for difficulty, count in counts.items():
+            questions = self._degraded_questions(content, count, difficulty, reason)
+            if questions is None:
+                return None
+            sets[difficulty] = questions
+        return sets
 
-        return {"quiz_id": quiz.id, "questions": questions}
+    def get_quiz_stats(self, quiz_id: str) -> Dict[str, Any]:
+        return StatsService(self.db).get_stats(quiz_id)
 
     def get_quiz_public(self, quiz_id: str) -> Dict[str, Any]:
         quiz = self.db.query(Quiz).filter(Quiz.id == quiz_id).first()
@@ -72,52 +309,106 @@ class QuizService:
             raise ValueError("Quiz not found")
 
         questions: List[Dict[str, Any]] = json.loads(quiz.questions_json)
-        score = 0
-        results: List[Dict[str, Any]] = []
-
-        for idx, q in enumerate(questions):
-            user_answer = answers.get(idx)
-            if user_answer is None:
-                user_answer = answers.get(str(idx))  # defensive: JSON keys are often strings
-
-            selected_letter = str(user_answer).upper() if user_answer is not None else None
-            correct_letter = str(q.get("correct_answer", "A")).upper()
-            options = q.get("options", [])
-
-            def option_text(letter: str | None) -> str | None:
-                if letter is None or letter not in ("A", "B", "C", "D"):
-                    return None
-                option_idx = {"A": 0, "B": 1, "C": 2, "D": 3}[letter]
-                if isinstance(options, list) and len(options) > option_idx:
-                    return str(options[option_idx])
-                return None
-
-            is_correct = selected_letter == correct_letter
-            if is_correct:
-                score += 1
-
-            results.append(
-                {
-                    "index": idx,
-                    "question": str(q.get("question", "")),
-                    "selected_answer": selected_letter if selected_letter in ("A", "B", "C", "D") else None,
-                    "selected_option": option_text(selected_letter),
-                    "correct_answer": correct_letter if correct_letter in ("A", "B", "C", "D") else "A",
-                    "correct_option": option_text(correct_letter) or "",
-                    "is_correct": is_correct,
-                }
-            )
-
-        total = len(questions)
-        percentage = (score / total * 100.0) if total else 0.0
+        graded = grade_answers(questions, answers)
 
         response = QuizResponse(
             quiz_id=quiz_id,
             answers_json=json.dumps(answers),
-            score=score,
-            total=total,
+            score=graded["score"],
+            total=graded["total"],
+            quiz_revision=max(question_revisions(quiz, len(questions)), default=0),
         )
-        self.db.add(response)
-        self.db.commit()
+        with metrics.stage("db_commit_submission"):
+            self.db.add(response)
+            StatsService(self.db).record_submission(quiz_id, graded["score"], graded["results"])
+            self.db.commit()
+
+        return graded
+
+    def submit_quiz_token(self, token: str, answers: Dict[int, str], quiz_id: str | None = None) -> Dict[str, Any]:
+        """Grade from a quiz token alone; the response row is written in the background."""
+        claims = quiz_tokens.read(token)
+        if quiz_id is not None and quiz_id != claims["quiz_id"]:
+            raise InvalidQuizToken("Quiz token belongs to a different quiz.")
+        graded = grade_answers(claims["questions"], answers)
+        response_writer.submit(
+            PendingResponse(
+                claims["quiz_id"], answers, graded["score"], graded["total"], graded["results"], claims["revision"]
+            )
+        )
+        return graded
+
+
+def _normalise_difficulty(difficulty: str) -> str:
+    difficulty = difficulty.lower()
+    return difficulty if difficulty in DIFFICULTIES else "medium"
+
+
+def _degraded_reason(exc: RuntimeError) -> str:
+    if isinstance(exc, DeadlineExceeded):
+        return "deadline"
+    if isinstance(exc, CircuitOpen):
+        return "circuit_open"
+    return "provider_error"
+
+
+def draw_questions(pool: List[Dict[str, Any]], num_questions: int, index: int) -> List[Dict[str, Any]]:
+    """The ``index``-th caller's share of a coalesced pool; consecutive slices, wrapping round."""
+    count = min(num_questions, len(pool))
+    start = index * count
+    return [dict(pool[(start + offset) % len(pool)]) for offset in range(count)]
+
+
+ANSWER_LETTERS = ("A", "B", "C", "D")
+
+
+def answer_letter(value: Any) -> str | None:
+    """Option letter for a submitted or stored answer (`" b"` -> `"B"`), or None if it is not A-D."""
+    if value is None:
+        return None
+    letter = str(value).strip().upper()
+    return letter if letter in ANSWER_LETTERS else None
+
+
+def grade_answers(questions: List[Dict[str, Any]], answers: Dict[Any, str]) -> Dict[str, Any]:
+    score = 0
+    results: List[Dict[str, Any]] = []
+
+    for idx, q in enumerate(questions):
+        user_answer = answers.get(idx)
+        if user_answer is None:
+            user_answer = answers.get(str(idx))  # defensive: JSON keys are often strings
+
+        selected_letter = answer_letter(user_answer)
+        correct_letter = answer_letter(q.get("correct_answer", "A"))
+        options = q.get("options", [])
+
+        def option_text(letter: str | None) -> str | None:
+            if letter is None:
+                return None
+            option_idx = ANSWER_LETTERS.index(letter)
+            if isinstance(options, list) and len(options) > option_idx:
+                return str(options[option_idx])
+            return None
+
+        # An unreadable key matches nothing.
+        is_correct = selected_letter is not None and selected_letter == correct_letter
+        if is_correct:
+            score += 1
+
+        results.append(
+            {
+                "index": idx,
+                "question": str(q.get("question", "")),
+                "selected_answer": selected_letter,
+                "selected_option": option_text(selected_letter),
+                "correct_answer": correct_letter or "A",
+                "correct_option": option_text(correct_letter) or "",
+                "is_correct": is_correct,
+            }
+        )
+
+    total = len(questions)
+    percentage = (score / total * 100.0) if total else 0.0
 
-        return {"score": score, "total": total, "percentage": percentage, "results": results}
+    return {"score": score, "total": total, "percentage": percentage, "results": results}
@@ -0,0 +1,91 @@
+"""
+Signed, encrypted quiz tokens for grading without a database read.
+
+With QUIZ_TOKEN_SECRET set, every generated quiz also comes with a token
+that holds its answer key, question and option text and a little
+metadata (zlib-compressed before encryption). A node that knows the
+secret can grade a submission from the token alone and never has to read
+the `Quiz` row. Tokens are Fernet tokens (AES-128-CBC, then HMAC-SHA256),
+so they cannot be read or forged without the secret. QUIZ_TOKEN_SECRET may
+list several comma-separated secrets: the first one signs new tokens and
+all of them are accepted, so a secret can be rotated without breaking
+tokens already handed out.
+
+A token carries the questions as they were when the token was issued,
+and the quiz revision they belong to. Regenerating a question issues a
+new token; older tokens keep grading against the old key until they
+expire (QUIZ_TOKEN_TTL_S), but their answers to the replaced question are
+left out of its stats.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import zlib
+from typing import Any, Dict, List
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+from config import QUIZ_TOKEN_SECRET, QUIZ_TOKEN_TTL_S
+
+
+class InvalidQuizToken(ValueError):
+    pass
+
+
+def _fernet_key(secret: str) -> bytes:
+    return base64.urlsafe_b64encode(hashlib.sha256(secret.encode("utf-8")).digest())
+
+
+class QuizTokenCodec:
+    def __init__(self, secret: str = QUIZ_TOKEN_SECRET, ttl_s: int = QUIZ_TOKEN_TTL_S) -> None:
+        keys = [s.strip() for s in secret.split(",") if s.strip()]
+        self._fernet = MultiFernet([Fernet(_fernet_key(k)) for k in keys]) if keys else None
+        self.ttl_s = ttl_s
+
+    @property
+    def enabled(self) -> bool:
+        return self._fernet is not None
+
+    def issue(self, quiz_id: str, difficulty: str, questions: List[Dict[str, Any]], revision: int = 0) -> str:
+        """Token for a quiz; the key is one letter per question, e.g. ``"BADC"`` (``-`` if unreadable)."""
+        from services.quiz_service import answer_letter
+
+        if self._fernet is None:
+            raise RuntimeError("Quiz tokens are disabled; set QUIZ_TOKEN_SECRET.")
+        payload = {
+            "q": quiz_id,
+            "d": difficulty,
+            "k": "".join(answer_letter(q.get("correct_answer", "A")) or "-" for q in questions),
+            "t": [[str(q.get("question", "")), [str(o) for o in q.get("options") or []]] for q in questions],
+        }
+        if revision:
+            payload["r"] = revision
+        data = zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        return self._fernet.encrypt(data).decode("ascii")
+
+    def read(self, token: str) -> Dict[str, Any]:
+        """Claims plus ``questions`` in the stored quiz format; raises InvalidQuizToken if forged, corrupt or expired."""
+        if self._fernet is None:
+            raise InvalidQuizToken("Quiz tokens are not accepted by this server.")
+        try:
+            data = self._fernet.decrypt(token.encode("ascii"), ttl=self.ttl_s or None)
+            payload = json.loads(zlib.decompress(data))
+        except (InvalidToken, UnicodeEncodeError, ValueError, zlib.error) as exc:
+            raise InvalidQuizToken("Invalid or expired quiz token.") from exc
+        questions = [
+            {"question": text, "options": options, "correct_answer": letter}
+            for letter, (text, options) in zip(payload["k"], payload["t"])
+        ]
+        return {
+            "quiz_id": payload["q"],
+            "difficulty": payload["d"],
+            "answer_key": payload["k"],
+            "revision": payload.get("r", 0),
+            "questions": questions,
+        }
+
+
+quiz_tokens = QuizTokenCodec()
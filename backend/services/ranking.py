@@ -0,0 +1,122 @@
+"""
+Over-generate-and-rank selection of quiz questions.
+
+Instead of rejecting questions that miss the difficulty keyword heuristics
+(and regenerating the whole batch when too few survive), the model is asked
+for a few extra candidates and every structurally valid one is scored
+locally on:
+
+- difficulty fit: a graded version of the keyword/length heuristics,
+- grounding: how much of the answer (and stem) is found in the source text,
+- option balance: similar option lengths, no giveaway longest answer,
+  no "all/none of the above",
+- novelty: dissimilarity to the questions already picked (greedy, so two
+  near-identical candidates are not both kept).
+
+The top N by combined score are returned in selection order.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from typing import Any, Dict, FrozenSet, List, Sequence
+
+# Difficulty cue phrases, shared with the strict filter in LLMService.
+EASY_DISALLOWED = ("most likely", "best explains", "implies", "inference", "synthesize")
+HARD_CUES = ("most likely", "best explains", "implies", "inference", "synthesis", "combined")
+MEDIUM_DISALLOWED = ("synthesis", "combined", "multi-step")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]{4,}")
+_CATCH_ALL_RE = re.compile(r"\b(all|none|both) of the (above|options)\b", re.IGNORECASE)
+
+_WEIGHTS = {"difficulty": 0.3, "grounding": 0.3, "balance": 0.2, "novelty": 0.2}
+
+
+def surplus_count(num_questions: int, ratio: float) -> int:
+    """Extra candidates to request on top of ``num_questions``."""
+    if ratio <= 0:
+        return 0
+    return max(1, math.ceil(num_questions * ratio))
+
+
+def difficulty_fit(question: str, target: str) -> float:
+    q = question.lower()
+    words = len(q.split())
+    target = (target or "medium").lower().strip()
+    if target == "easy":
+        plain = 0.0 if any(term in q for term in EASY_DISALLOWED) else 0.6
+        return plain + 0.4 * min(1.0, 18 / max(words, 1))
+    if target == "hard":
+        cued = 0.6 if any(term in q for term in HARD_CUES) else 0.0
+        return cued + 0.4 * min(1.0, words / 12)
+    plain = 0.0 if any(term in q for term in MEDIUM_DISALLOWED) else 0.4
+    return plain + 0.6 * min(1.0, words / 8)
+
+
+def grounding_strength(question: Dict[str, Any], source_tokens: FrozenSet[str]) -> float:
+    answer = question["options"][_answer_index(question)]
+    answer_tokens = _TOKEN_RE.findall(answer.lower())
+    stem_tokens = _TOKEN_RE.findall(question["question"].lower())
+    return 0.7 * _coverage(answer_tokens, source_tokens) + 0.3 * _coverage(stem_tokens, source_tokens)
+
+
+def option_balance(question: Dict[str, Any]) -> float:
+    options = [str(o).strip() for o in question["options"]]
+    if len({o.lower() for o in options}) < len(options):
+        return 0.0
+    lengths = [max(len(o.split()), 1) for o in options]
+    score = 1.0 - 0.5 * (max(lengths) - min(lengths)) / max(lengths)
+
+    correct = _answer_index(question)
+    others = [n for i, n in enumerate(lengths) if i != correct]
+    # A correct answer much longer than every distractor is a classic giveaway.
+    if lengths[correct] > max(others) and lengths[correct] > 1.5 * (sum(others) / len(others)):
+        score -= 0.3
+    if any(_CATCH_ALL_RE.search(o) for o in options):
+        score -= 0.2
+    return max(0.0, score)
+
+
+def rank_questions(
+    questions: Sequence[Dict[str, Any]], content: str, difficulty: str, keep: int
+) -> List[Dict[str, Any]]:
+    """The ``keep`` best-scoring questions, picked greedily so near-duplicates are skipped."""
+    source_tokens = frozenset(_TOKEN_RE.findall(content.lower()))
+    base = [
+        _WEIGHTS["difficulty"] * difficulty_fit(q["question"], difficulty)
+        + _WEIGHTS["grounding"] * grounding_strength(q, source_tokens)
+        + _WEIGHTS["balance"] * option_balance(q)
+        for q in questions
+    ]
+    token_sets = [
+        frozenset(_TOKEN_RE.findall(f"{q['question']} {q['options'][_answer_index(q)]}".lower()))
+        for q in questions
+    ]
+
+    selected: List[int] = []
+    max_sim = [0.0] * len(questions)
+    available = set(range(len(questions)))
+    while available and len(selected) < keep:
+        best = max(available, key=lambda i: base[i] + _WEIGHTS["novelty"] * (1.0 - max_sim[i]))
+        selected.append(best)
+        available.discard(best)
+        for i in available:
+            max_sim[i] = max(max_sim[i], _jaccard(token_sets[i], token_sets[best]))
+    return [questions[i] for i in selected]
+
+
+def _answer_index(question: Dict[str, Any]) -> int:
+    return "ABCD".index(question["correct_answer"])
+
+
+def _coverage(tokens: List[str], source_tokens: FrozenSet[str]) -> float:
+    if not tokens:
+        return 1.0
+    return sum(t in source_tokens for t in tokens) / len(tokens)
+
+
+def _jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
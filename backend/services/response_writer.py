@@ -0,0 +1,153 @@
+"""
+Batched writes of graded submissions.
+
+Token-graded submissions (see `quiz_tokens`) do not need the database to
+answer the client, so their `QuizResponse` rows and stats counters are
+queued and written by a background thread. One transaction covers up to
+RESPONSE_WRITE_MAX_BATCH submissions, collected for at most
+RESPONSE_WRITE_INTERVAL_MS. When RESPONSE_WRITE_MAX_QUEUE submissions are
+already waiting, the caller writes its own row synchronously instead of
+queueing more.
+
+Queued submissions live in memory until their batch commits, so a crash
+can lose at most the submissions still waiting. Shutdown drains the queue.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+import metrics
+from config import RESPONSE_WRITE_INTERVAL_MS, RESPONSE_WRITE_MAX_BATCH, RESPONSE_WRITE_MAX_QUEUE
+from database import SessionLocal
+from models import Quiz, QuizResponse
+from services.stats_service import StatsService, current_results, question_revisions
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PendingResponse:
+    quiz_id: str
+    answers: Dict[Any, str]
+    score: int
+    total: int
+    results: List[Dict[str, Any]]
+    quiz_revision: int = 0
+
+
+class ResponseWriter:
+    def __init__(
+        self,
+        interval_ms: int = RESPONSE_WRITE_INTERVAL_MS,
+        max_batch: int = RESPONSE_WRITE_MAX_BATCH,
+        max_queue: int = RESPONSE_WRITE_MAX_QUEUE,
+    ) -> None:
+        self.interval_s = max(0, interval_ms) / 1000
+        self.max_batch = max(1, max_batch)
+        self._queue: queue.Queue[PendingResponse] = queue.Queue(maxsize=max(1, max_queue))
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="response-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the thread once everything queued has been written."""
+        thread, self._thread = self._thread, None
+        self._stop.set()
+        if thread is not None:
+            thread.join()
+        self._drain()
+
+    def submit(self, pending: PendingResponse) -> None:
+        if self._thread is not None:
+            try:
+                self._queue.put_nowait(pending)
+                metrics.RESPONSE_WRITES.labels("queued").inc()
+                return
+            except queue.Full:
+                pass
+        self._write([pending])
+        metrics.RESPONSE_WRITES.labels("direct").inc()
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            # Give the batch a moment to fill before paying for a commit.
+            flush_at = time.monotonic() + self.interval_s
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, flush_at - time.monotonic())))
+                except queue.Empty:
+                    break
+            self._write_logged(batch)
+
+    def _drain(self) -> None:
+        while True:
+            batch: List[PendingResponse] = []
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write_logged(batch)
+
+    def _write_logged(self, batch: List[PendingResponse]) -> None:
+        try:
+            self._write(batch)
+        except Exception:
+            metrics.RESPONSE_WRITES.labels("failed").inc(len(batch))
+            logger.exception("Dropped %d graded submissions that could not be written", len(batch))
+
+    @staticmethod
+    def _write(batch: List[PendingResponse]) -> None:
+        with metrics.stage("db_commit_submission", submissions=len(batch)):
+            db = SessionLocal()
+            try:
+                stats = StatsService(db)
+                db.add_all(
+                    QuizResponse(
+                        quiz_id=p.quiz_id,
+                        answers_json=json.dumps(p.answers),
+                        score=p.score,
+                        total=p.total,
+                        quiz_revision=p.quiz_revision,
+                    )
+                    for p in batch
+                )
+                revisions: Dict[str, List[int]] = {}
+                for quiz_id in {p.quiz_id for p in batch}:
+                    quiz = db.get(Quiz, quiz_id)
+                    if quiz is not None:
+                        revisions[quiz_id] = question_revisions(quiz, quiz.num_questions)
+                for p in batch:
+                    # A token issued before a regeneration still grades the old question.
+                    results = current_results(p.results, revisions.get(p.quiz_id, []), p.quiz_revision)
+                    stats.record_submission(p.quiz_id, p.score, results)
+                db.commit()
+            finally:
+                db.close()
+        metrics.RESPONSE_WRITE_BATCH.observe(len(batch))
+
+
+response_writer = ResponseWriter()
@@ -0,0 +1,133 @@
+"""
+Single-flight coalescing of identical concurrent work.
+
+The first caller for a key becomes the leader and runs the work; callers
+arriving while it is in flight join as followers and wait on the leader's
+future instead of starting their own call. The key is released as soon as
+the work finishes, so results are never cached beyond the flight itself.
+
+Cancellation: a follower that gives up (wait timeout) only stops waiting;
+the flight and the other followers are unaffected. If the leader is torn
+down before producing a result (anything that is not an ``Exception``), or
+fails because its own request was cancelled or ran out of time, its
+followers are released and retry, one of them becoming the new leader with
+its own deadline. Ordinary errors are shared so a failing provider is not
+hit once per caller.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+import metrics
+from config import COALESCE_WAIT_TIMEOUT_S, COALESCE_WINDOW_MS
+from services.deadline import DeadlineExceeded, RequestCancelled, current_deadline
+
+
+class _LeaderLost(Exception):
+    pass
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.future: Future = Future()
+        self.members = 1  # leader included
+        self.started = False
+
+
+class SingleFlight:
+    def __init__(self, window_s: float = 0.0, wait_timeout_s: float | None = None) -> None:
+        self.window_s = window_s
+        self.wait_timeout_s = wait_timeout_s
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def run(self, key: Hashable, work: Callable[[int], Any]) -> Tuple[Any, int]:
+        """
+        Run ``work(group_size)`` once for every concurrent caller of ``key``.
+
+        ``group_size`` is the number of callers gathered when the work starts
+        (the leader waits ``window_s`` first). Returns ``(result, member_index)``;
+        index 0 is the leader, later joiners get increasing indexes, including
+        those that joined after the work started.
+        """
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = self._flights[key] = _Flight()
+                    index = 0
+                else:
+                    index = flight.members
+                    flight.members += 1
+
+            if index == 0:
+                metrics.GENERATION_COALESCING.labels("leader").inc()
+                return self._lead(key, flight, work), 0
+
+            metrics.GENERATION_COALESCING.labels("follower").inc()
+            try:
+                return self._follow(flight), index
+            except _LeaderLost:
+                continue
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def _lead(self, key: Hashable, flight: _Flight, work: Callable[[int], Any]) -> Any:
+        try:
+            if self.window_s > 0:
+                time.sleep(self.window_s)
+            with self._lock:
+                flight.started = True
+                group_size = flight.members
+            result = work(group_size)
+        except (RequestCancelled, DeadlineExceeded):
+            # The leader's client went away or its deadline passed; followers may have longer ones.
+            flight.future.set_exception(_LeaderLost())
+            raise
+        except Exception as exc:
+            flight.future.set_exception(exc)
+            raise
+        except BaseException:
+            flight.future.set_exception(_LeaderLost())
+            raise
+        else:
+            flight.future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def _follow(self, flight: _Flight) -> Any:
+        deadline = current_deadline()
+        if deadline is None:
+            try:
+                return flight.future.result(timeout=self.wait_timeout_s)
+            except FutureTimeout as exc:
+                metrics.GENERATION_COALESCING.labels("timeout").inc()
+                raise RuntimeError("Timed out waiting for an identical in-flight quiz generation.") from exc
+
+        # Wait no longer than our own deadline, and stop at once if our client goes away.
+        timeout = deadline.remaining()
+        if self.wait_timeout_s is not None:
+            timeout = min(timeout, self.wait_timeout_s)
+        with deadline.cancel_event() as event:
+            flight.future.add_done_callback(lambda _f: event.set())
+            event.wait(timeout)
+        if flight.future.done():
+            return flight.future.result()
+        deadline.check()
+        metrics.GENERATION_COALESCING.labels("timeout").inc()
+        raise RuntimeError("Timed out waiting for an identical in-flight quiz generation.")
+
+
+generation_flights = SingleFlight(
+    window_s=COALESCE_WINDOW_MS / 1000,
+    wait_timeout_s=COALESCE_WAIT_TIMEOUT_S,
+)
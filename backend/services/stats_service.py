@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from database import chunked, upsert_insert
+from models import Quiz, QuizQuestionStats, QuizResponse, QuizScoreCount, QuizStats
+
+OPTION_COLUMNS = {"A": "count_a", "B": "count_b", "C": "count_c", "D": "count_d"}
+
+
+def question_revisions(quiz: Quiz, count: int) -> List[int]:
+    """Quiz revision at which each of the quiz's `count` questions was last replaced (0: as generated)."""
+    if not quiz.question_revisions_json:
+        return [0] * count
+    return json.loads(quiz.question_revisions_json)
+
+
+def current_results(results: List[Dict[str, Any]], revisions: List[int], revision: int) -> List[Dict[str, Any]]:
+    """Results graded at quiz `revision` whose question has not been replaced since."""
+    return [r for r in results if r["index"] >= len(revisions) or revisions[r["index"]] <= revision]
+
+
+class StatsService:
+    """Incrementally maintained quiz analytics.
+
+    Counters are bumped with `INSERT ... ON CONFLICT DO UPDATE` (SQLite and
+    PostgreSQL; other databases read, add and write the row) inside the
+    caller's transaction, so a submission and its stats commit together and
+    reads never have to touch `quiz_responses`.
+
+    Regenerating a question drops its counters and bumps the quiz revision.
+    Each response stores the revision it was graded at, and answers to a
+    question replaced after that revision are left out of its counters, both
+    when recorded and when rebuilt. A question's correct rate is therefore
+    over the attempts that saw it (`attempts` per question), not the quiz's.
+    """
+
+    def __init__(self, db: Session) -> None:
+        self.db = db
+
+    def record_submission(
+        self,
+        quiz_id: str,
+        score: int,
+        results: List[Dict[str, Any]],
+    ) -> None:
+        """Add one graded submission to the counters (caller commits)."""
+        self._bump(QuizStats, {"quiz_id": quiz_id}, {"attempts": 1, "score_sum": score})
+        self._bump(QuizScoreCount, {"quiz_id": quiz_id, "score": score}, {"count": 1})
+
+        for result in results:
+            increments = {"correct_count": 1 if result["is_correct"] else 0}
+            selected = result.get("selected_answer")
+            increments[OPTION_COLUMNS.get(selected, "count_unanswered")] = 1
+            self._bump(
+                QuizQuestionStats,
+                {"quiz_id": quiz_id, "question_index": result["index"]},
+                increments,
+            )
+
+    def record_submissions(
+        self,
+        quiz_id: str,
+        *,
+        attempts: int,
+        score_sum: int,
+        score_counts: Dict[int, int],
+        question_increments: List[Dict[str, int]],
+    ) -> None:
+        """Add many graded submissions at once, as pre-summed counters (caller commits)."""
+        if not attempts:
+            return
+        self._bump(QuizStats, {"quiz_id": quiz_id}, {"attempts": attempts, "score_sum": score_sum})
+        for score, count in score_counts.items():
+            self._bump(QuizScoreCount, {"quiz_id": quiz_id, "score": score}, {"count": count})
+        for index, increments in enumerate(question_increments):
+            self._bump(QuizQuestionStats, {"quiz_id": quiz_id, "question_index": index}, increments)
+
+    def reset_question(self, quiz_id: str, index: int) -> None:
+        """Drop one question's counters after it was replaced (caller commits)."""
+        self.db.execute(
+            delete(QuizQuestionStats).where(
+                QuizQuestionStats.quiz_id == quiz_id, QuizQuestionStats.question_index == index
+            )
+        )
+
+    def get_stats(self, quiz_id: str) -> Dict[str, Any]:
+        quiz = self.db.query(Quiz).filter(Quiz.id == quiz_id).first()
+        if not quiz:
+            raise ValueError("Quiz not found")
+
+        questions: List[Dict[str, Any]] = json.loads(quiz.questions_json)
+        summary = self.db.get(QuizStats, quiz_id)
+        attempts = summary.attempts if summary else 0
+        score_sum = summary.score_sum if summary else 0
+
+        histogram = {
+            row.score: row.count
+            for row in self.db.query(QuizScoreCount).filter(QuizScoreCount.quiz_id == quiz_id)
+        }
+        per_question = {
+            row.question_index: row
+            for row in self.db.query(QuizQuestionStats).filter(QuizQuestionStats.quiz_id == quiz_id)
+        }
+
+        question_stats: List[Dict[str, Any]] = []
+        for idx, q in enumerate(questions):
+            row = per_question.get(idx)
+            correct = row.correct_count if row else 0
+            # Every recorded answer bumps exactly one option column or the unanswered one.
+            answered = (
+                sum(getattr(row, column) for column in OPTION_COLUMNS.values()) + row.count_unanswered if row else 0
+            )
+            question_stats.append(
+                {
+                    "index": idx,
+                    "question": str(q.get("question", "")),
+                    "correct_answer": str(q.get("correct_answer", "A")).upper(),
+                    "attempts": answered,
+                    "correct_count": correct,
+                    "correct_rate": (correct / answered) if answered else 0.0,
+                    "option_counts": {
+                        letter: (getattr(row, column) if row else 0)
+                        for letter, column in OPTION_COLUMNS.items()
+                    },
+                    "unanswered": row.count_unanswered if row else 0,
+                }
+            )
+
+        score_histogram = {score: 0 for score in range(len(questions) + 1)}
+        score_histogram.update(histogram)
+
+        return {
+            "quiz_id": quiz_id,
+            "attempts": attempts,
+            "average_score": (score_sum / attempts) if attempts else 0.0,
+            "score_histogram": score_histogram,
+            "questions": question_stats,
+        }
+
+    def rebuild(self, quiz_ids: Iterable[str] | None = None, chunk_size: int = 500) -> int:
+        """Recompute counters from stored responses; returns responses replayed.
+
+        With no `quiz_ids` every quiz is rebuilt. Existing counters for the
+        affected quizzes are cleared first so the command is safe to rerun.
+        """
+        if quiz_ids is None:
+            replayed = self._replay(None, chunk_size)
+        else:
+            # Large id sets go in chunks so `IN (...)` stays under the bound-parameter limit.
+            replayed = sum(self._replay(ids, chunk_size) for ids in chunked(dict.fromkeys(quiz_ids)))
+        self.db.commit()
+        return replayed
+
+    def _replay(self, ids: List[str] | None, chunk_size: int) -> int:
+        from services.quiz_service import grade_answers
+
+        for model in (QuizStats, QuizScoreCount, QuizQuestionStats):
+            stmt = delete(model)
+            if ids is not None:
+                stmt = stmt.where(model.quiz_id.in_(ids))
+            self.db.execute(stmt)
+
+        query = self.db.query(QuizResponse).order_by(QuizResponse.quiz_id)
+        if ids is not None:
+            query = query.filter(QuizResponse.quiz_id.in_(ids))
+
+        replayed = 0
+        current_quiz_id: str | None = None
+        questions: List[Dict[str, Any]] | None = None
+        revisions: List[int] = []
+        for response in query.yield_per(chunk_size):
+            if response.quiz_id != current_quiz_id:
+                current_quiz_id = response.quiz_id
+                quiz = self.db.get(Quiz, current_quiz_id)
+                questions = json.loads(quiz.questions_json) if quiz else None
+                revisions = question_revisions(quiz, len(questions)) if quiz else []
+            if questions is None:
+                continue
+
+            # The stored score is what the submitter got; questions replaced since
+            # cannot be regraded, so only the unchanged ones feed the per-question counters.
+            graded = grade_answers(questions, json.loads(response.answers_json))
+            results = current_results(graded["results"], revisions, response.quiz_revision or 0)
+            self.record_submission(response.quiz_id, response.score, results)
+            replayed += 1
+        return replayed
+
+    def _bump(self, model: Any, keys: Dict[str, Any], increments: Dict[str, int]) -> None:
+        stmt = upsert_insert(self.db, model)
+        if stmt is None:
+            self._bump_portable(model, keys, increments)
+            return
+        stmt = stmt.values(**keys, **increments)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: getattr(model, name) + stmt.excluded[name] for name in increments},
+        )
+        self.db.execute(stmt)
+
+    def _bump_portable(self, model: Any, keys: Dict[str, Any], increments: Dict[str, int]) -> None:
+        row = self.db.get(model, keys, with_for_update=True)
+        if row is None:
+            self.db.add(model(**keys, **increments))
+            self.db.flush()
+            return
+        for name, value in increments.items():
+            setattr(row, name, (getattr(row, name) or 0) + value)
@@ -0,0 +1,122 @@
+"""
+Schema-constrained output for quiz generation.
+
+Each provider can constrain decoding to some degree: a full JSON Schema
+(Ollama `format`, OpenAI-style `response_format: json_schema`, TGI
+`grammar`), plain JSON mode, or nothing. Calls try the strongest mode the
+provider offers and step down when a model rejects it; rejected modes are
+remembered per provider and model for the life of the process.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from config import STRUCTURED_OUTPUT
+
+# Strongest first. "free" is the plain prompt and is always available.
+OUTPUT_MODES = ("schema", "json", "free")
+
+# A 400/422 means "mode unsupported" only if it says the format parameter
+# itself is not supported (Groq/OpenAI `unsupported_parameter`, "json_schema is
+# not supported with this model", a TGI server without grammar support, an old
+# Ollama that cannot unmarshal a schema object into `format`). Anything else
+# (prompt too long, bad model name) is a normal error.
+_FORMAT_PARAM_RE = re.compile(r"response_format|json_schema|json_object|grammar|\bformat\b", re.IGNORECASE)
+_UNSUPPORTED_RE = re.compile(
+    r"unsupported|not supported|does not support|not (?:enabled|available)|disabled"
+    r"|cannot unmarshal|unknown (?:field|parameter)|unrecognized|invalid format",
+    re.IGNORECASE,
+)
+# The model failed to produce valid output under a supported constraint (Groq
+# `json_validate_failed`); that says nothing about the mode and must not disable it.
+_OUTPUT_FAILURE_RE = re.compile(
+    r"json_validate_failed|failed_generation|failed to (?:generate|validate) json", re.IGNORECASE
+)
+
+
+class UnsupportedOutputMode(RuntimeError):
+    pass
+
+
+def _question_list(max_questions: int) -> Dict[str, Any]:
+    return {
+        "type": "array",
+        "maxItems": max_questions,
+        "items": {
+            "type": "object",
+            "properties": {
+                "question": {"type": "string"},
+                "options": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "minItems": 4,
+                    "maxItems": 4,
+                },
+                "correct_answer": {"type": "string", "enum": ["A", "B", "C", "D"]},
+            },
+            "required": ["question", "options", "correct_answer"],
+            "additionalProperties": False,
+        },
+    }
+
+
+def question_schema(max_questions: int) -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": {"questions": _question_list(max_questions)},
+        "required": ["questions"],
+        "additionalProperties": False,
+    }
+
+
+def question_set_schema(counts: Dict[str, int]) -> Dict[str, Any]:
+    """One question list per difficulty, e.g. ``{"easy": [...], "hard": [...]}``."""
+    return {
+        "type": "object",
+        "properties": {difficulty: _question_list(count) for difficulty, count in counts.items()},
+        "required": list(counts),
+        "additionalProperties": False,
+    }
+
+
+def is_format_rejection(status_code: int, body: str) -> bool:
+    if status_code not in (400, 422) or _OUTPUT_FAILURE_RE.search(body):
+        return False
+    return bool(_UNSUPPORTED_RE.search(body) and _FORMAT_PARAM_RE.search(body))
+
+
+class StructuredOutputSupport:
+    def __init__(self, setting: str = STRUCTURED_OUTPUT) -> None:
+        self.setting = setting
+        self._unsupported: Set[Tuple[str, str, str]] = set()
+        self._lock = threading.Lock()
+
+    def modes(self, provider: str, model: str, offered: Iterable[str]) -> List[str]:
+        """Modes to try, strongest first, honouring STRUCTURED_OUTPUT and past rejections."""
+        if self.setting == "off":
+            return ["free"]
+        allowed = OUTPUT_MODES[OUTPUT_MODES.index("json"):] if self.setting == "json" else OUTPUT_MODES
+        with self._lock:
+            modes = [
+                mode
+                for mode in allowed
+                if mode in offered and (provider, model, mode) not in self._unsupported
+            ]
+        return [mode for mode in modes if mode != "free"] + ["free"]
+
+    def mark_unsupported(self, provider: str, model: str, mode: str) -> None:
+        with self._lock:
+            self._unsupported.add((provider, model, mode))
+
+    def snapshot(self) -> List[Dict[str, str]]:
+        with self._lock:
+            return [
+                {"provider": provider, "model": model, "mode": mode}
+                for provider, model, mode in sorted(self._unsupported)
+            ]
+
+
+structured_support = StructuredOutputSupport()
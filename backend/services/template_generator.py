@@ -0,0 +1,175 @@
+"""
+Deterministic, CPU-only quiz generation from the source text.
+
+Used as the `template` provider and as the degraded mode when the LLM is
+unavailable. Salient terms (names, numbers and rarer content words) are
+collected from the document; the most term-rich sentences become either
+
+- cloze questions: the sentence with its key term blanked out, or
+- association questions: which term the text mentions together with a name
+  or number from the same sentence (sentences without one stay cloze),
+
+with distractors drawn from other salient terms of the same kind (so a year
+is mixed with years, a name with names) that are close in length to the
+answer. The same content and difficulty always give the same quiz.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import random
+import re
+import zlib
+from collections import Counter
+from typing import Dict, List, Set, Tuple
+
+from services.compression import STOPWORDS, split_sentences
+from services.ranking import EASY_DISALLOWED, MEDIUM_DISALLOWED
+
+_NAME_RE = re.compile(r"\b[A-Z][a-z]+(?:'s|')?(?:[ -](?:of |de |von )?[A-Z][a-z]+(?:'s|')?)*")
+_NUMBER_RE = re.compile(r"\b\d{1,4}(?:[.,]\d+)?\b")
+_WORD_RE = re.compile(r"\b[a-z]{6,}\b")
+
+_CLOZE = {
+    "easy": 'Fill in the blank: "{stem}"',
+    "medium": 'According to the text, which option best completes this statement: "{stem}"',
+    "hard": 'Which option most likely completes this statement from the text: "{stem}"',
+}
+_ASSOCIATION = {
+    "easy": "Which of these does the text mention together with {anchor}?",
+    "medium": "According to the text, which of these is mentioned in connection with {anchor}?",
+    "hard": "Which of these is most likely linked to {anchor} when the passage is read as a whole?",
+}
+_BLANK = "_____"
+_ANCHOR_KINDS = ("name", "number")
+
+Term = Tuple[str, str]  # (text, kind)
+
+
+def template_questions(content: str, num_questions: int, difficulty: str) -> List[Dict[str, object]]:
+    difficulty = difficulty if difficulty in _CLOZE else "medium"
+    disallowed = {"easy": EASY_DISALLOWED, "medium": MEDIUM_DISALLOWED}.get(difficulty, ())
+    sentences = [
+        s
+        for s in split_sentences(content)
+        if 8 <= len(s.split()) <= 45 and not any(term in s.lower() for term in disallowed)
+    ]
+    if not sentences:
+        return []
+
+    sentence_terms = [_terms(s) for s in sentences]
+    doc_freq: Counter[Term] = Counter(term for terms in sentence_terms for term in set(terms))
+    salience = {term: _salience(term, df, len(sentences)) for term, df in doc_freq.items()}
+    by_kind: Dict[str, List[str]] = {}
+    # Ties are broken by a hash rather than alphabetically, so distractors are not all "a..." words.
+    for text, kind in sorted(salience, key=lambda t: (-salience[t], zlib.crc32(t[0].encode("utf-8")))):
+        by_kind.setdefault(kind, []).append(text)
+    # Which sentences each term appears in, so association distractors never co-occur with the anchor.
+    occurs_in: Dict[str, Set[int]] = {}
+    for idx, terms in enumerate(sentence_terms):
+        for text, _ in terms:
+            occurs_in.setdefault(text, set()).add(idx)
+
+    seed = hashlib.sha256(f"{difficulty}\n{content}".encode("utf-8")).digest()
+    rng = random.Random(seed)
+    order = sorted(
+        range(len(sentences)),
+        key=lambda i: (-sum(salience[t] for t in set(sentence_terms[i])), i),
+    )
+
+    questions: List[Dict[str, object]] = []
+    used_answers: Set[str] = set()
+    kind_counts: Counter[str] = Counter()
+    for idx in order:
+        if len(questions) >= num_questions:
+            break
+        ranked = sorted(set(sentence_terms[idx]), key=lambda t: (-salience[t], t))
+        fresh = [t for t in ranked if t[0].lower() not in used_answers]
+        if not fresh:
+            continue
+        # Spread answers over names, numbers and words rather than asking only for dates.
+        answer = min(fresh, key=lambda t: kind_counts[t[1]])
+        # Only names and numbers make a meaningful anchor; "together with `several`" does not.
+        anchor = next(
+            (
+                t
+                for t in ranked
+                if t[1] in _ANCHOR_KINDS and t != answer and not _overlaps(t[0], answer[0])
+            ),
+            None,
+        )
+        # Alternate the two styles; easy questions stay as plain cloze.
+        associate = anchor is not None and difficulty != "easy" and len(questions) % 2 == 1
+
+        if associate:
+            excluded = {
+                text for text, indexes in occurs_in.items() if occurs_in[anchor[0]] & indexes
+            }
+            stem = _ASSOCIATION[difficulty].format(anchor=anchor[0])
+        else:
+            excluded = {text for text, _ in sentence_terms[idx]}
+            blanked = re.sub(rf"\b{re.escape(answer[0])}\b", _BLANK, sentences[idx], count=1)
+            stem = _CLOZE[difficulty].format(stem=blanked)
+        distractors = _distractors(answer, by_kind, excluded, rng)
+        if len(distractors) < 3:
+            continue
+
+        options = [answer[0]] + distractors
+        rng.shuffle(options)
+        questions.append(
+            {
+                "question": stem,
+                "options": options,
+                "correct_answer": "ABCD"[options.index(answer[0])],
+            }
+        )
+        used_answers.add(answer[0].lower())
+        kind_counts[answer[1]] += 1
+    return questions
+
+
+def _terms(sentence: str) -> List[Term]:
+    terms: List[Term] = []
+    for match in _NAME_RE.finditer(sentence):
+        text = re.sub(r"'s?$", "", match.group(0))
+        # A lone capitalised first word is usually just the start of the sentence.
+        if match.start() == 0 and " " not in text:
+            continue
+        if len(text) > 2 and text.lower() not in STOPWORDS:
+            terms.append((text, "name"))
+    terms.extend((m.group(0), "number") for m in _NUMBER_RE.finditer(sentence))
+    terms.extend((m.group(0), "word") for m in _WORD_RE.finditer(sentence) if m.group(0) not in STOPWORDS)
+    return terms
+
+
+def _salience(term: Term, doc_freq: int, num_sentences: int) -> float:
+    idf = math.log((1 + num_sentences) / (1 + doc_freq)) + 1.0
+    # Names and quantities make the most clear-cut answers.
+    return idf * (1.5 if term[1] in ("name", "number") else 1.0)
+
+
+def _overlaps(a: str, b: str) -> bool:
+    a, b = a.lower(), b.lower()
+    return a in b or b in a
+
+
+def _distractors(answer: Term, by_kind: Dict[str, List[str]], excluded: Set[str], rng: random.Random) -> List[str]:
+    text, kind = answer
+    pools = [by_kind.get(kind, [])] + [terms for other, terms in sorted(by_kind.items()) if other != kind]
+    picked: List[str] = []
+    for pool in pools:
+        candidates = [
+            c
+            for c in pool
+            if c not in excluded and not _overlaps(c, text) and not any(_overlaps(c, p) for p in picked)
+        ]
+        # Options of similar length, so the answer does not stand out; the pool
+        # is in salience order, which the stable sort keeps within a length band.
+        candidates.sort(key=lambda c: abs(len(c) - len(text)) // 3)
+        for candidate in rng.sample(candidates[:6], min(len(candidates[:6]), 3 - len(picked))):
+            if not any(_overlaps(candidate, p) for p in picked):
+                picked.append(candidate)
+        if len(picked) >= 3:
+            break
+    return picked[:3]
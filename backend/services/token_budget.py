@@ -0,0 +1,135 @@
+"""
+Adaptive output-token budgets learned from observed completions.
+
+Each provider call records how many output tokens it actually produced and
+why it stopped. Once a key has enough samples, `max_tokens` becomes the p99
+of recent usage times a safety margin, instead of a fixed guess that either
+truncates JSON or reserves rate-limit quota that is never used.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from collections import Counter, deque
+from dataclasses import asdict, dataclass
+from typing import Any, Deque, Dict, List
+
+import metrics
+from config import (
+    TOKEN_BUDGET_ADAPTIVE,
+    TOKEN_BUDGET_CEILING,
+    TOKEN_BUDGET_FLOOR,
+    TOKEN_BUDGET_MARGIN,
+    TOKEN_BUDGET_MIN_SAMPLES,
+    TOKEN_BUDGET_WINDOW,
+)
+
+# A completion cut off at the limit only tells us the real length was
+# larger, so it is recorded inflated to push the budget up.
+TRUNCATED_SAMPLE_FACTOR = 1.25
+
+
+@dataclass(frozen=True)
+class BudgetKey:
+    provider: str
+    model: str
+    task: str  # "generate" | "repair"
+    difficulty: str
+    num_questions: int
+
+
+class _KeyStats:
+    def __init__(self, window: int) -> None:
+        self.samples: Deque[int] = deque(maxlen=window)
+        self.stop_reasons: Counter[str] = Counter()
+
+
+class TokenBudget:
+    def __init__(
+        self,
+        *,
+        window: int = TOKEN_BUDGET_WINDOW,
+        min_samples: int = TOKEN_BUDGET_MIN_SAMPLES,
+        margin: float = TOKEN_BUDGET_MARGIN,
+        floor: int = TOKEN_BUDGET_FLOOR,
+        ceiling: int = TOKEN_BUDGET_CEILING,
+        adaptive: bool = TOKEN_BUDGET_ADAPTIVE,
+    ) -> None:
+        self.window = window
+        self.min_samples = min_samples
+        self.margin = margin
+        self.floor = floor
+        self.ceiling = ceiling
+        self.adaptive = adaptive
+        self._stats: Dict[BudgetKey, _KeyStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: BudgetKey, output_tokens: int | None, stop_reason: str | None) -> None:
+        reason = _normalise_stop_reason(stop_reason)
+        metrics.LLM_STOP_REASONS.labels(key.provider, key.model, key.task, reason).inc()
+        with self._lock:
+            stats = self._stats.setdefault(key, _KeyStats(self.window))
+            stats.stop_reasons[reason] += 1
+            if output_tokens:
+                if reason == "length":
+                    output_tokens = math.ceil(output_tokens * TRUNCATED_SAMPLE_FACTOR)
+                stats.samples.append(int(output_tokens))
+            learned = self._learned(stats.samples)
+
+        if learned is not None:
+            metrics.LLM_LEARNED_MAX_TOKENS.labels(
+                key.provider, key.model, key.task, key.difficulty, str(key.num_questions)
+            ).set(learned)
+
+    def max_tokens(self, key: BudgetKey, default: int) -> int:
+        if not self.adaptive:
+            return default
+        with self._lock:
+            stats = self._stats.get(key)
+            learned = self._learned(stats.samples) if stats is not None else None
+        return default if learned is None else learned
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Learned table, one row per key, for the metrics endpoint."""
+        with self._lock:
+            items = [(key, list(stats.samples), dict(stats.stop_reasons)) for key, stats in self._stats.items()]
+
+        rows: List[Dict[str, Any]] = []
+        for key, samples, stop_reasons in items:
+            learned = self._learned(samples)
+            rows.append(
+                {
+                    **asdict(key),
+                    "samples": len(samples),
+                    "p50_output_tokens": _percentile(samples, 0.5) if samples else None,
+                    "p99_output_tokens": _percentile(samples, 0.99) if samples else None,
+                    "learned_max_tokens": learned,
+                    "stop_reasons": stop_reasons,
+                }
+            )
+        return rows
+
+    def _learned(self, samples: Any) -> int | None:
+        if not self.adaptive or len(samples) < self.min_samples:
+            return None
+        p99 = _percentile(samples, 0.99)
+        return max(self.floor, min(self.ceiling, math.ceil(p99 * self.margin)))
+
+
+def _percentile(samples: Any, q: float) -> int:
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def _normalise_stop_reason(reason: str | None) -> str:
+    reason = (reason or "").lower()
+    if reason in ("length", "max_tokens", "max_new_tokens"):
+        return "length"
+    if reason in ("stop", "eos_token", "stop_sequence", "end_turn"):
+        return "stop"
+    return reason or "unknown"
+
+
+token_budget = TokenBudget()
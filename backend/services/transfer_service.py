@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from database import IN_CLAUSE_CHUNK, SessionLocal, chunked, upsert_insert
+from models import Quiz, QuizResponse
+from services.stats_service import StatsService
+
+QUIZ_FIELDS = (
+    "id",
+    "source_type",
+    "source_label",
+    "difficulty",
+    "num_questions",
+    "content",
+    "questions_json",
+    "question_revisions_json",
+    "created_at",
+)
+RESPONSE_FIELDS = ("id", "quiz_id", "answers_json", "score", "total", "quiz_revision", "created_at")
+CONFLICT_MODES = ("skip", "replace")
+
+
+class TransferService:
+    """Streams quizzes and responses to/from NDJSON.
+
+    Every line is `{"type": "quiz" | "quiz_response", "data": {...}}`. Quizzes
+    are always written before responses so an export can be imported in order.
+    Rows are pulled with `yield_per` and written in fixed-size batches, so
+    memory use does not grow with the table size.
+    """
+
+    def __init__(self, db: Session) -> None:
+        self.db = db
+
+    def export_ndjson(
+        self,
+        *,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        source_type: str | None = None,
+        include_responses: bool = True,
+        chunk_size: int = 1000,
+    ) -> Iterator[str]:
+        quizzes = select(Quiz).order_by(Quiz.created_at)
+        if since is not None:
+            quizzes = quizzes.where(Quiz.created_at >= since)
+        if until is not None:
+            quizzes = quizzes.where(Quiz.created_at < until)
+        if source_type:
+            quizzes = quizzes.where(Quiz.source_type == source_type)
+
+        for quiz in self._stream(quizzes, chunk_size):
+            yield self._line("quiz", quiz, QUIZ_FIELDS)
+
+        if not include_responses:
+            return
+
+        responses = select(QuizResponse).order_by(QuizResponse.created_at)
+        if since is not None:
+            responses = responses.where(QuizResponse.created_at >= since)
+        if until is not None:
+            responses = responses.where(QuizResponse.created_at < until)
+        if source_type:
+            responses = responses.join(Quiz, Quiz.id == QuizResponse.quiz_id).where(
+                Quiz.source_type == source_type
+            )
+
+        for response in self._stream(responses, chunk_size):
+            yield self._line("quiz_response", response, RESPONSE_FIELDS)
+
+    def import_ndjson(
+        self,
+        lines: Iterable[str | bytes],
+        *,
+        on_conflict: str = "skip",
+        batch_size: int = 500,
+    ) -> Dict[str, int]:
+        """Insert rows from NDJSON lines; returns counts of rows written and skipped.
+
+        `on_conflict="skip"` keeps existing rows with the same id,
+        `"replace"` overwrites them. Each batch commits on its own; stats
+        counters are rebuilt for every quiz that received responses, a chunk
+        of quizzes at a time once their responses are committed.
+        """
+        if on_conflict not in CONFLICT_MODES:
+            raise ValueError(f"on_conflict must be one of {', '.join(CONFLICT_MODES)}")
+
+        counts = {"quizzes": 0, "quiz_responses": 0, "skipped": 0}
+        pending: Dict[str, List[Dict[str, Any]]] = {"quiz": [], "quiz_response": []}
+        touched_quiz_ids: set[str] = set()
+
+        for line_no, line in enumerate(lines, start=1):
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                record = json.loads(line)
+                kind = record["type"]
+                data = record["data"]
+            except (json.JSONDecodeError, KeyError, TypeError) as exc:
+                raise ValueError(f"Invalid NDJSON record on line {line_no}.") from exc
+            if kind not in pending:
+                raise ValueError(f"Unknown record type {kind!r} on line {line_no}.")
+            if not isinstance(data, dict):
+                raise ValueError(f"Invalid NDJSON record on line {line_no}.")
+            if kind == "quiz_response" and not data.get("quiz_id"):
+                raise ValueError(f"quiz_response on line {line_no} has no quiz_id.")
+
+            if not data.get("id"):
+                data["id"] = str(uuid.uuid4())
+            created_at = data.get("created_at")
+            data["created_at"] = datetime.fromisoformat(created_at) if created_at else datetime.utcnow()
+            pending[kind].append(data)
+            if kind == "quiz_response":
+                data["quiz_revision"] = data.get("quiz_revision") or 0  # exports from before revisions
+                touched_quiz_ids.add(data["quiz_id"])
+
+            if len(pending[kind]) >= batch_size:
+                self._flush(kind, pending, counts, on_conflict)
+            if len(touched_quiz_ids) >= IN_CLAUSE_CHUNK:
+                self._flush("quiz_response", pending, counts, on_conflict)
+                StatsService(self.db).rebuild(touched_quiz_ids)
+                touched_quiz_ids.clear()
+
+        # Quizzes first so responses never reference a row that is still buffered.
+        self._flush("quiz", pending, counts, on_conflict)
+        self._flush("quiz_response", pending, counts, on_conflict)
+
+        if touched_quiz_ids:
+            StatsService(self.db).rebuild(touched_quiz_ids)
+
+        return counts
+
+    def _flush(
+        self,
+        kind: str,
+        pending: Dict[str, List[Dict[str, Any]]],
+        counts: Dict[str, int],
+        on_conflict: str,
+    ) -> None:
+        rows = pending[kind]
+        if not rows:
+            return
+        if kind == "quiz_response" and pending["quiz"]:
+            self._flush("quiz", pending, counts, on_conflict)
+
+        model, fields = (Quiz, QUIZ_FIELDS) if kind == "quiz" else (QuizResponse, RESPONSE_FIELDS)
+        values = [{name: row.get(name) for name in fields} for row in rows]
+        stmt = upsert_insert(self.db, model)
+        if stmt is None:
+            written = self._write_portable(model, values, on_conflict)
+        else:
+            if on_conflict == "replace":
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["id"],
+                    set_={name: stmt.excluded[name] for name in fields if name != "id"},
+                )
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=["id"])
+            result = self.db.connection().execute(stmt, values)
+            written = max(result.rowcount, 0)
+        counts["quizzes" if kind == "quiz" else "quiz_responses"] += written
+        counts["skipped"] += len(rows) - written
+        pending[kind] = []
+        self.db.commit()
+
+    def _write_portable(self, model: Any, values: List[Dict[str, Any]], on_conflict: str) -> int:
+        # Databases without ON CONFLICT: look the batch's ids up, then insert or update.
+        existing: set[str] = set()
+        for ids in chunked(v["id"] for v in values):
+            existing.update(self.db.scalars(select(model.id).where(model.id.in_(ids))))
+        new = [v for v in values if v["id"] not in existing]
+        if new:
+            self.db.execute(insert(model), new)
+        replaced = [v for v in values if v["id"] in existing] if on_conflict == "replace" else []
+        if replaced:
+            self.db.execute(update(model), replaced)
+        return len(new) + len(replaced)
+
+    def _stream(self, stmt: Any, chunk_size: int) -> Iterator[Any]:
+        result = self.db.execute(stmt.execution_options(yield_per=chunk_size))
+        for row in result.scalars():
+            yield row
+            # Streamed ORM objects are not needed once serialised.
+            self.db.expunge(row)
+
+    @staticmethod
+    def _line(kind: str, row: Any, fields: Iterable[str]) -> str:
+        data = {}
+        for name in fields:
+            value = getattr(row, name)
+            data[name] = value.isoformat() if isinstance(value, datetime) else value
+        return json.dumps({"type": kind, "data": data}) + "\n"
+
+
+def stream_export(**filters: Any) -> Iterator[str]:
+    """Export generator that owns its session, for use in a streaming response."""
+    db = SessionLocal()
+    try:
+        yield from TransferService(db).export_ndjson(**filters)
+    finally:
+        db.close()
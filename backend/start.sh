@@ -11,5 +11,11 @@ cd "$SCRIPT_DIR" || exit 1
 # Run migrations/init (if needed)
 python -c "from database import init_db; init_db()" || true
 
+# Multi-worker Prometheus metrics need an empty shared directory on boot
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
 # Start the server
 exec uvicorn main:app --host 0.0.0.0 --port ${PORT:-8000}
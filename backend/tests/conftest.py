@@ -0,0 +1,96 @@
+"""
+Shared fixtures. Every test runs against a fresh in-memory SQLite database
+and the `template` provider, so no model, network or files under data/ are
+needed.
+"""
+
+import os
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="quiz-tests-")
+os.environ.update(
+    DATABASE_URL="sqlite://",
+    LLM_PROVIDER="template",
+    LLM_PROVIDERS="template",
+    OLLAMA_WARMUP="0",
+    PROVIDER_PROBE_INTERVAL_S="0",
+    COALESCE_WINDOW_MS="0",
+    QUIZ_TOKEN_SECRET="test-secret",
+    PROFILE_DIR=os.path.join(_TMP, "profiles"),
+    EXTRACTION_CACHE_DIR=os.path.join(_TMP, "extractions"),
+    HF_CAPABILITY_CACHE_PATH=os.path.join(_TMP, "hf_capabilities.json"),
+)
+
+import json  # noqa: E402
+from pathlib import Path  # noqa: E402
+from typing import Any, Dict, Iterator, List  # noqa: E402
+
+import pytest  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+import database  # noqa: E402
+import models  # noqa: E402,F401
+
+FIXTURES = Path(__file__).resolve().parent.parent / "benchmarks" / "fixtures"
+SOURCE_DOCUMENT = (FIXTURES / "source_document.txt").read_text(encoding="utf-8")
+QUIZ_CONTENT = "Photosynthesis converts light energy into chemical energy stored in glucose."
+
+
+@pytest.fixture(autouse=True)
+def db_engine() -> Iterator[Any]:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    database.engine = engine
+    database.SessionLocal.configure(bind=engine)
+    database.Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(db_engine: Any) -> Iterator[Session]:
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def client() -> Any:
+    from fastapi.testclient import TestClient
+
+    import main
+
+    # Without the context manager startup hooks (warm-up, probes, background writer) do not run.
+    return TestClient(main.app)
+
+
+def make_questions(answers: str = "ABCD") -> List[Dict[str, Any]]:
+    return [
+        {
+            "question": f"Question {i + 1}?",
+            "options": [f"option {i}{letter}" for letter in "abcd"],
+            "correct_answer": letter,
+        }
+        for i, letter in enumerate(answers)
+    ]
+
+
+@pytest.fixture
+def make_quiz(db: Session) -> Any:
+    def make(answers: str = "ABCD", **fields: Any) -> models.Quiz:
+        quiz = models.Quiz(
+            source_type=fields.pop("source_type", "text"),
+            difficulty=fields.pop("difficulty", "medium"),
+            num_questions=len(answers),
+            content=fields.pop("content", QUIZ_CONTENT),
+            questions_json=json.dumps(make_questions(answers)),
+            **fields,
+        )
+        db.add(quiz)
+        db.commit()
+        return quiz
+
+    return make
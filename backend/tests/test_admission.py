@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from services.admission import AdmissionController, Overloaded, admission_for
+from tests.conftest import SOURCE_DOCUMENT
+
+
+def test_requests_beyond_slots_and_queue_are_shed():
+    async def scenario():
+        controller = AdmissionController("test-shed", max_in_flight=2, max_queue=1)
+        events = []
+
+        async def job(name):
+            try:
+                async with controller.slot():
+                    events.append(("start", name))
+                    await asyncio.sleep(0.05)
+            except Overloaded as exc:
+                events.append(("shed", name, exc.retry_after))
+
+        tasks = [asyncio.create_task(job(i)) for i in range(3)]
+        await asyncio.sleep(0.01)
+        assert (controller.in_flight, controller.queued) == (2, 1)
+        await job("late")
+        await asyncio.gather(*tasks)
+        return controller, events
+
+    controller, events = asyncio.run(scenario())
+
+    assert [e[:2] for e in events if e[0] == "start"] == [("start", 0), ("start", 1), ("start", 2)]
+    [shed] = [e for e in events if e[0] == "shed"]
+    assert shed[1] == "late" and shed[2] >= 1
+    assert (controller.in_flight, controller.queued) == (0, 0)
+
+
+def test_queue_wait_times_out_with_overloaded():
+    async def scenario():
+        controller = AdmissionController("test-timeout", max_in_flight=1, max_queue=5)
+
+        async def hold():
+            async with controller.slot():
+                await asyncio.sleep(0.2)
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded):
+            async with controller.slot(timeout=0.02):
+                pass
+        await holder
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert (controller.in_flight, controller.queued) == (0, 0)
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        controller = AdmissionController("test-cancel", max_in_flight=1, max_queue=5)
+
+        async def hold(seconds):
+            async with controller.slot():
+                await asyncio.sleep(seconds)
+
+        holder = asyncio.create_task(hold(0.1))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(hold(0))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(holder, waiter, return_exceptions=True)
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert (controller.in_flight, controller.queued) == (0, 0)
+
+
+def test_generate_endpoint_returns_429_with_retry_after_when_full(client, monkeypatch):
+    controller = admission_for("template")
+    monkeypatch.setattr(controller, "max_queue", 0)
+    monkeypatch.setattr(controller, "_in_flight", controller.max_in_flight)
+
+    response = client.post("/generate-quiz", json={"content": SOURCE_DOCUMENT, "num_questions": 5})
+
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
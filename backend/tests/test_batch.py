@@ -0,0 +1,31 @@
+import json
+
+from tests.conftest import SOURCE_DOCUMENT
+
+
+def _lines(response):
+    return {line["index"]: line for line in map(json.loads, response.text.splitlines())}
+
+
+def test_invalid_items_become_error_lines(client):
+    items = [
+        {"content": SOURCE_DOCUMENT, "num_questions": 5},
+        {"content": "too short"},
+        {"content": SOURCE_DOCUMENT, "num_questions": 500},
+        {"content": " " * 80},
+    ]
+
+    response = client.post("/generate-quiz/batch", json={"items": items})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = _lines(response)
+    assert lines[0]["status"] == "ok" and len(lines[0]["questions"]) == 5
+    assert lines[1]["status"] == "error" and lines[1]["status_code"] == 422
+    assert "content" in lines[1]["detail"]
+    assert lines[2]["status_code"] == 422 and "num_questions" in lines[2]["detail"]
+    assert lines[3]["status"] == "error"
+
+
+def test_empty_batch_is_rejected(client):
+    assert client.post("/generate-quiz/batch", json={"items": []}).status_code == 422
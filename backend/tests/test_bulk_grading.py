@@ -0,0 +1,76 @@
+import json
+import random
+
+import main
+from services.bulk_grading import BulkGrader, read_csv_sheets
+from services.quiz_service import QuizService, grade_answers
+from services.stats_service import StatsService
+from tests.conftest import make_questions
+
+
+def _random_sheets(count, num_questions, seed=7):
+    rng = random.Random(seed)
+    choices = ["A", "B", "C", "D", " b", "d ", "E", ""]
+    return [
+        (f"s{i}", {q: rng.choice(choices) for q in range(num_questions) if rng.random() < 0.9})
+        for i in range(count)
+    ]
+
+
+def test_bulk_scores_and_stats_match_single_submissions(db, make_quiz):
+    bulk_quiz, single_quiz = make_quiz("ABCDA"), make_quiz("ABCDA")
+    questions = make_questions("ABCDA")
+    sheets = _random_sheets(40, 5)
+
+    result = BulkGrader(db).grade(bulk_quiz.id, sheets)
+    for _, answers in sheets:
+        QuizService(db).submit_quiz(single_quiz.id, answers)
+
+    assert [s["score"] for s in result["sheets"]] == [grade_answers(questions, a)["score"] for _, a in sheets]
+    bulk_stats = StatsService(db).get_stats(bulk_quiz.id)
+    single_stats = StatsService(db).get_stats(single_quiz.id)
+    assert {**bulk_stats, "quiz_id": None} == {**single_stats, "quiz_id": None}
+    assert result["summary"]["sheets"] == 40
+
+
+def test_unreadable_key_matches_nothing_on_both_paths(db, make_quiz):
+    quiz = make_quiz("AB")
+    questions = json.loads(quiz.questions_json)
+    questions[1]["correct_answer"] = "E"
+    quiz.questions_json = json.dumps(questions)
+    db.commit()
+    sheets = [(None, {0: "a", 1: "E"}), (None, {0: " A ", 1: "A"})]
+
+    bulk = BulkGrader(db).grade(quiz.id, sheets)
+
+    assert [s["score"] for s in bulk["sheets"]] == [1, 1]
+    assert [grade_answers(questions, a)["score"] for _, a in sheets] == [1, 1]
+
+
+def test_csv_sheets_accept_index_and_q_columns():
+    lines = ["sheet_id,Q1,Q2,3", "alice,A,b,C", "", "bob,,D,"]
+
+    assert list(read_csv_sheets(lines)) == [("alice", {0: "A", 1: "b", 3: "C"}), ("bob", {1: "D"})]
+
+
+def test_csv_endpoint_grades_and_stops_at_the_sheet_limit(client, make_quiz, monkeypatch):
+    quiz = make_quiz("AB")
+    headers = {"content-type": "text/csv"}
+    monkeypatch.setattr(main, "MAX_BULK_SHEETS", 3)
+
+    ok = client.post(f"/quiz/{quiz.id}/submit-batch", content="sheet_id,Q1,Q2\nx,A,B\ny,A,A\n", headers=headers)
+    too_many = client.post(f"/quiz/{quiz.id}/submit-batch", content="Q1,Q2\n" + "A,B\n" * 4, headers=headers)
+    bad_header = client.post(f"/quiz/{quiz.id}/submit-batch", content="name,Q1\nx,A\n", headers=headers)
+
+    assert ok.status_code == 200
+    assert [(s["sheet_id"], s["score"]) for s in ok.json()["sheets"]] == [("x", 2), ("y", 1)]
+    assert too_many.status_code == 413
+    assert bad_header.status_code == 400
+
+
+def test_json_endpoint_and_unknown_quiz(client, make_quiz):
+    quiz = make_quiz("AB")
+    body = {"sheets": [{"sheet_id": "x", "answers": {"0": "A", "1": "B"}}]}
+
+    assert client.post(f"/quiz/{quiz.id}/submit-batch", json=body).json()["sheets"][0]["score"] == 2
+    assert client.post("/quiz/missing/submit-batch", json=body).status_code == 404
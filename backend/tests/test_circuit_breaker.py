@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen
+
+
+def _breaker(**overrides):
+    settings = dict(window=10, min_calls=4, error_rate=0.5, slow_call_s=1.0, slow_rate=0.5, open_s=0.05)
+    settings.update(overrides)
+    return CircuitBreaker("test-breaker", **settings)
+
+
+def _fail(breaker, times, seconds=0.1):
+    for _ in range(times):
+        trial = breaker.acquire()
+        breaker.record(False, seconds, trial)
+
+
+def test_stays_closed_below_min_calls_and_error_rate():
+    breaker = _breaker()
+    _fail(breaker, 3)
+    assert breaker.state == CLOSED
+
+    breaker = _breaker()
+    _fail(breaker, 1)
+    for _ in range(4):
+        breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["error_rate"] == 0.2
+
+
+def test_opens_on_error_rate_and_rejects_calls():
+    breaker = _breaker(open_s=60)
+    _fail(breaker, 4)
+
+    assert breaker.state == OPEN
+    assert not breaker.available()
+    with pytest.raises(CircuitOpen) as exc_info:
+        breaker.acquire()
+    assert exc_info.value.retry_in > 0
+
+
+def test_opens_on_slow_call_rate():
+    breaker = _breaker()
+    for _ in range(4):
+        breaker.record(True, 2.0)
+
+    assert breaker.state == OPEN
+    assert "slow" in breaker.snapshot()["reason"]
+
+
+def test_half_open_trial_success_closes():
+    breaker = _breaker()
+    _fail(breaker, 4)
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+
+    assert breaker.acquire() is True
+    # Only one trial at a time.
+    with pytest.raises(CircuitOpen):
+        breaker.acquire()
+    breaker.record(True, 0.1, trial=True)
+
+    assert breaker.state == CLOSED
+    assert breaker.acquire() is False
+
+
+def test_half_open_trial_failure_reopens():
+    breaker = _breaker()
+    _fail(breaker, 4)
+    time.sleep(0.06)
+
+    trial = breaker.acquire()
+    breaker.record(False, 0.1, trial=trial)
+
+    assert breaker.state == OPEN
+    assert breaker.snapshot()["reason"] == "trial call failed"
+
+
+def test_released_trial_lets_the_next_call_try():
+    breaker = _breaker()
+    _fail(breaker, 4)
+    time.sleep(0.06)
+
+    breaker.release(breaker.acquire())
+
+    assert breaker.available()
+    assert breaker.acquire() is True
+
+
+def test_trip_opens_from_a_failed_probe():
+    breaker = _breaker(open_s=60)
+    breaker.trip("health probe failed")
+
+    assert breaker.state == OPEN
+    assert breaker.snapshot()["reason"] == "health probe failed"
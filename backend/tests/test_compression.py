@@ -0,0 +1,72 @@
+import time
+
+import services.llm_service as llm_service
+from services.compression import compress_content, estimate_tokens, split_sentences
+from services.llm_service import LLMService
+from tests.conftest import SOURCE_DOCUMENT
+
+
+def test_short_content_is_returned_unchanged():
+    text = "  Photosynthesis converts light into chemical energy.  "
+
+    assert compress_content(text, 100) == text.strip()
+
+
+def test_compressed_content_fits_the_budget_and_keeps_sentence_order():
+    budget = 300
+    compressed = compress_content(SOURCE_DOCUMENT, budget)
+
+    assert estimate_tokens(compressed) <= budget
+    # Whole sentences of the source, in their original order.
+    kept = [sentence for sentence in split_sentences(SOURCE_DOCUMENT) if sentence in compressed]
+    assert len(kept) > 1 and " ".join(kept) == compressed
+
+
+def test_near_duplicate_sentences_are_kept_once():
+    fact = "Marie Curie won the Nobel Prize in Physics in 1903 and in Chemistry in 1911."
+    filler = "The weather was pleasant and nothing else of note happened that day."
+    text = " ".join([fact] * 6 + [filler] * 6)
+
+    compressed = compress_content(text, estimate_tokens(fact) * 3)
+
+    assert compressed.count("Marie Curie") == 1
+
+
+def test_sentences_naming_facts_are_preferred():
+    named = "Yesterday the committee met in Geneva with Alice Moreau."
+    plain = "Yesterday the committee met in the hall with the others."
+    text = " ".join([plain, named] + ["Nothing of note followed the meeting that afternoon."] * 4)
+
+    compressed = compress_content(text, estimate_tokens(named) + 1)
+
+    assert compressed == named
+
+
+def test_large_input_only_ranks_the_window():
+    filler = "The weather was pleasant and nothing else of note happened that day. "
+    late_fact = "Marie Curie won the Nobel Prize in Physics in 1903 and in Chemistry in 1911."
+    text = filler * 80_000 + late_fact  # about 5.6 MB
+
+    started = time.perf_counter()
+    compressed = compress_content(text, 300)
+
+    assert time.perf_counter() - started < 2.0
+    assert estimate_tokens(compressed) <= 300
+    assert "Marie Curie" not in compressed
+
+
+def test_content_is_fitted_once_per_document(monkeypatch):
+    calls = []
+
+    def counting(content, budget, **kwargs):
+        calls.append(budget)
+        return compress_content(content, budget, **kwargs)
+
+    monkeypatch.setattr(llm_service, "compress_content", counting)
+    llm_service.fit_content.cache_clear()
+    service = LLMService()
+
+    prefixes = {service._build_prompt_parts(SOURCE_DOCUMENT, 5, difficulty)[0] for difficulty in ("easy", "hard")}
+    prefixes.add(service._build_prompt_parts(SOURCE_DOCUMENT, 5, "medium", retry_hint="Retry")[0])
+
+    assert len(calls) == 1 and len(prefixes) == 1
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+from config import DEADLINE_MIN_CALL_S
+from services.deadline import (
+    Deadline,
+    DeadlineExceeded,
+    RequestCancelled,
+    call_timeout,
+    current_deadline,
+    deadline_scope,
+)
+
+
+def test_check_raises_once_the_deadline_has_passed():
+    deadline = Deadline(0.05)
+    deadline.check()
+    time.sleep(0.06)
+
+    with pytest.raises(DeadlineExceeded):
+        deadline.check()
+
+
+def test_timeouts_are_shortened_to_the_time_left():
+    with deadline_scope(Deadline(DEADLINE_MIN_CALL_S + 3)):
+        assert current_deadline() is not None
+        assert call_timeout(60) <= DEADLINE_MIN_CALL_S + 3
+    assert current_deadline() is None
+    assert call_timeout(60) == 60
+
+
+def test_no_call_starts_without_the_minimum_time_left():
+    with deadline_scope(Deadline(DEADLINE_MIN_CALL_S / 2)), pytest.raises(DeadlineExceeded):
+        call_timeout(60)
+
+
+def test_child_never_outlives_its_parent_and_shares_cancellation():
+    parent = Deadline(1.0)
+    child = parent.child(10.0)
+
+    assert child.end == parent.end
+    parent.cancel()
+    assert child.cancelled
+    with pytest.raises(RequestCancelled):
+        child.check()
+
+
+def test_cancel_wakes_a_sleeping_caller():
+    deadline = Deadline(5.0)
+    threading.Timer(0.05, deadline.cancel).start()
+    started = time.monotonic()
+
+    with pytest.raises(RequestCancelled):
+        deadline.sleep(2.0)
+    assert time.monotonic() - started < 1.0
+
+
+def test_sleep_refuses_to_outlive_the_deadline():
+    with pytest.raises(DeadlineExceeded):
+        Deadline(0.1).sleep(1.0)
+
+
+def test_cancel_event_is_set_on_cancellation_and_unregistered_after():
+    deadline = Deadline(5.0)
+    with deadline.cancel_event() as event:
+        assert not event.is_set()
+        deadline.cancel()
+        assert event.is_set()
+    assert not deadline._waiters
+
+    with deadline.cancel_event() as late:
+        assert late.is_set()
+
+
+def test_branches_cancel_on_their_own_or_with_the_root():
+    root = Deadline(5.0)
+    first, second = root.branch(), root.branch()
+
+    first.cancel()
+    assert first.cancelled and not second.cancelled and not root.cancelled
+
+    root.cancel()
+    assert second.cancelled
+    assert root.branch().cancelled
+
+
+def test_released_branches_are_no_longer_tracked():
+    root = Deadline(5.0)
+    branch = root.branch()
+    assert branch in root._branches
+
+    branch.release()
+    branch.release()
+
+    assert not root._branches
@@ -0,0 +1,99 @@
+import pytest
+
+import services.llm_service as llm_service
+from services.circuit_breaker import CircuitOpen, breaker_for
+from services.deadline import DeadlineExceeded
+from services.llm_service import GenerationFailed, LLMService, ProviderRequestError, ProviderUnavailable, _http_error
+from services.quiz_service import QuizService
+from tests.conftest import SOURCE_DOCUMENT
+
+
+class FailingLLM:
+    """Stands in for the provider router; every model call raises ``error``."""
+
+    provider = "fake"
+
+    def __init__(self, error):
+        self.error = error
+
+    def generate_questions(self, content, num_questions, difficulty, minimum=None):
+        raise self.error
+
+    def generate_question_sets(self, content, counts):
+        raise self.error
+
+    def generate_template_questions(self, content, num_questions, difficulty, minimum=1):
+        return LLMService("template").generate_template_questions(content, num_questions, difficulty, minimum)
+
+
+def generate(db, error):
+    service = QuizService(db)
+    service.llm = FailingLLM(error)
+    return service.generate_quiz(
+        content=SOURCE_DOCUMENT, source_type="text", source_label=None, difficulty="medium", num_questions=3
+    )
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        CircuitOpen("fake", 30),
+        DeadlineExceeded("deadline"),
+        ProviderUnavailable("connection refused"),
+        GenerationFailed("bad output three times"),
+    ],
+)
+def test_outages_get_a_degraded_quiz(db, error):
+    quiz = generate(db, error)
+
+    assert quiz["degraded"] is True
+    assert len(quiz["questions"]) == 3
+
+
+@pytest.mark.parametrize(
+    "error",
+    [ProviderRequestError("GROQ_API_KEY is not set."), RuntimeError("All providers failed (a, b). bad request")],
+)
+def test_configuration_errors_are_not_hidden_by_a_degraded_quiz(db, error):
+    with pytest.raises(RuntimeError) as excinfo:
+        generate(db, error)
+
+    assert excinfo.value is error
+
+
+def test_quiz_sets_degrade_only_on_outages(db):
+    service = QuizService(db)
+    service.llm = FailingLLM(ProviderRequestError("Unsupported LLM provider."))
+    with pytest.raises(ProviderRequestError):
+        service.generate_quiz_set(content=SOURCE_DOCUMENT, source_type="text", source_label=None, counts={"easy": 2})
+
+    service.llm = FailingLLM(ProviderUnavailable("timeout"))
+    quizzes = service.generate_quiz_set(content=SOURCE_DOCUMENT, source_type="text", source_label=None, counts={"easy": 2})
+    assert [quiz["degraded"] for quiz in quizzes] == [True]
+
+
+@pytest.mark.parametrize(
+    ("status", "kind"),
+    [(500, ProviderUnavailable), (503, ProviderUnavailable), (429, ProviderUnavailable), (401, ProviderRequestError), (404, ProviderRequestError)],
+)
+def test_http_status_decides_outage_or_request_error(status, kind):
+    assert type(_http_error("Groq API error", status, "detail")) is kind
+
+
+def test_missing_api_key_fails_at_once_without_tripping_the_breaker(monkeypatch):
+    monkeypatch.setattr(llm_service, "GROQ_API_KEY", "")
+    recorded = []
+    monkeypatch.setattr(breaker_for("groq"), "record", lambda ok, seconds, trial=False: recorded.append(ok))
+    original = LLMService._call_groq
+    calls = []
+
+    def counting(self, *args):
+        calls.append(args)
+        return original(self, *args)
+
+    monkeypatch.setattr(LLMService, "_call_groq", counting)
+
+    with pytest.raises(ProviderRequestError, match="GROQ_API_KEY"):
+        LLMService("groq").generate_questions(SOURCE_DOCUMENT, 3, "medium")
+
+    assert len(calls) == 1 and recorded == []
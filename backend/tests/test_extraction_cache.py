@@ -0,0 +1,43 @@
+import io
+from pathlib import Path
+
+import metrics
+import services.extraction_cache as extraction_cache_module
+from services.extraction_cache import ExtractionCache, extract_pdf_cached
+from services.langextract import ExtractResult, LangExtract
+
+KEY = ExtractionCache.key("pdf", "0" * 64)
+
+
+def write_errors() -> float:
+    return metrics.EXTRACTION_CACHE.labels("write_error")._value.get()
+
+
+def test_entries_survive_a_restart(tmp_path):
+    ExtractionCache(tmp_path).put(KEY, "extracted text")
+
+    assert ExtractionCache(tmp_path).get(KEY) == "extracted text"
+
+
+def test_failed_disk_write_keeps_the_entry_in_memory_and_cleans_up(tmp_path, monkeypatch):
+    def disk_full(self, target):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(Path, "replace", disk_full)
+    cache = ExtractionCache(tmp_path)
+    before = write_errors()
+
+    cache.put(KEY, "extracted text")
+
+    assert cache.get(KEY) == "extracted text"
+    assert list(tmp_path.iterdir()) == []
+    assert write_errors() == before + 1
+
+
+def test_upload_is_returned_when_the_cache_directory_is_unwritable(tmp_path, monkeypatch):
+    blocker = tmp_path / "not-a-directory"
+    blocker.write_text("")
+    monkeypatch.setattr(extraction_cache_module, "extraction_cache", ExtractionCache(blocker / "extractions"))
+    monkeypatch.setattr(LangExtract, "from_pdf_stream", staticmethod(lambda stream, label=None: ExtractResult("pdf text", "pdf", label)))
+
+    assert extract_pdf_cached(io.BytesIO(b"%PDF-1.4"), "upload.pdf", 1024) == "pdf text"
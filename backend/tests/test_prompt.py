@@ -0,0 +1,53 @@
+import re
+
+import services.llm_service as llm_service
+from services.llm_service import LLMService
+from tests.conftest import SOURCE_DOCUMENT
+
+VARIATION_KEY = re.compile(r"INTERNAL VARIATION KEY \(do not output\): ([0-9a-f]{8})")
+
+
+def test_prefix_is_byte_stable_across_calls_on_a_document():
+    calls = [
+        (3, "easy", "", None),
+        (5, "hard", "Retry: Return strict JSON only.", None),
+        (6, "mixed", "", {"easy": 2, "medium": 2, "hard": 2}),
+    ]
+
+    service = LLMService("groq")
+    prefixes = [service._build_prompt_parts(SOURCE_DOCUMENT, *call)[0].encode("utf-8") for call in calls]
+
+    assert prefixes[0] == prefixes[1] == prefixes[2]
+    assert service._fit_content(SOURCE_DOCUMENT).encode("utf-8") in prefixes[0]
+
+
+def test_variation_key_and_task_stay_in_the_suffix():
+    service = LLMService("groq")
+    first_prefix, first_suffix = service._build_prompt_parts(SOURCE_DOCUMENT, 3, "easy", "Retry: be strict.")
+    second_prefix, second_suffix = service._build_prompt_parts(SOURCE_DOCUMENT, 3, "easy", "Retry: be strict.")
+    _, set_suffix = service._build_prompt_parts(SOURCE_DOCUMENT, 4, "mixed", counts={"easy": 2, "hard": 2})
+
+    assert first_prefix == second_prefix
+    assert not VARIATION_KEY.search(first_prefix)
+    assert "exactly 3" not in first_prefix and "Retry" not in first_prefix
+    keys = [VARIATION_KEY.search(suffix).group(1) for suffix in (first_suffix, second_suffix, set_suffix)]
+    assert len(set(keys)) == 3
+    assert "exactly 3" in first_suffix and first_suffix.endswith("Retry: be strict.")
+
+
+def test_sent_prompt_starts_with_the_shared_prefix(monkeypatch):
+    sent = []
+
+    def capture(self, *, messages, **kwargs):
+        sent.append(messages[0]["content"])
+        return '{"questions": []}'
+
+    monkeypatch.setattr(llm_service, "GROQ_API_KEY", "key")
+    monkeypatch.setattr(LLMService, "_call_groq_chat", capture)
+    service = LLMService("groq")
+    service._call_groq(SOURCE_DOCUMENT, 3, "easy")
+    service._call_groq(SOURCE_DOCUMENT, 4, "hard", "Retry: be strict.")
+
+    prefix = service._prompt_prefix(SOURCE_DOCUMENT)
+    assert all(prompt.startswith(prefix) for prompt in sent)
+    assert sent[0] != sent[1]
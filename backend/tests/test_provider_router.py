@@ -0,0 +1,106 @@
+import time
+
+import pytest
+
+import services.provider_router as provider_router_module
+from services.deadline import Deadline, RequestCancelled, current_deadline, deadline_scope
+from services.llm_service import ProviderUnavailable
+from services.provider_router import ProviderRouter, ProviderStats, parse_providers
+
+QUESTIONS = [{"question": "Q?", "options": ["a", "b", "c", "d"], "correct_answer": "A"}]
+
+
+class FakeLLM:
+    """Stands in for LLMService; ``behaviour[provider]`` decides what a call does."""
+
+    behaviour = {}
+    cancelled = []
+
+    def __init__(self, provider):
+        self.provider = provider
+
+    def generate_questions(self, content, num_questions, difficulty, minimum=None):
+        action, value = self.behaviour[self.provider]
+        if action == "fail":
+            raise RuntimeError(f"{self.provider} down")
+        if action == "outage":
+            raise ProviderUnavailable(f"{self.provider} unreachable")
+        if action == "sleep":
+            try:
+                current_deadline().sleep(value)
+            except RequestCancelled:
+                self.cancelled.append(self.provider)
+                raise
+        return [dict(q, question=f"{self.provider}: {q['question']}") for q in QUESTIONS]
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    FakeLLM.behaviour = {}
+    FakeLLM.cancelled = []
+    monkeypatch.setattr(provider_router_module, "LLMService", FakeLLM)
+    return FakeLLM
+
+
+def test_parse_providers():
+    assert parse_providers("groq, ollama") == ([("groq", 1.0), ("ollama", 1.0)], False)
+    assert parse_providers("groq:3,ollama:1") == ([("groq", 3.0), ("ollama", 1.0)], True)
+
+
+def test_failover_to_the_next_provider(fake_llm):
+    fake_llm.behaviour = {"r-primary": ("fail", None), "r-backup": ("ok", None)}
+    router = ProviderRouter("r-primary,r-backup", stats=ProviderStats())
+
+    questions = router.generate_questions("content", 1, "medium")
+
+    assert questions[0]["question"].startswith("r-backup")
+    assert router.stats.success_rate("r-primary") < 1.0
+
+
+def test_all_providers_failing_raises(fake_llm):
+    fake_llm.behaviour = {"r-one": ("fail", None), "r-two": ("fail", None)}
+    router = ProviderRouter("r-one,r-two", stats=ProviderStats())
+
+    with pytest.raises(RuntimeError, match="All providers failed"):
+        router.generate_questions("content", 1, "medium")
+
+
+def test_outage_on_every_provider_is_reported_as_one(fake_llm):
+    fake_llm.behaviour = {"o-one": ("outage", None), "o-two": ("outage", None)}
+    router = ProviderRouter("o-one,o-two", stats=ProviderStats())
+
+    with pytest.raises(ProviderUnavailable, match="All providers failed"):
+        router.generate_questions("content", 1, "medium")
+
+
+def test_slow_primary_is_hedged_and_cancelled(fake_llm):
+    fake_llm.behaviour = {"h-primary": ("sleep", 2.0), "h-backup": ("ok", None)}
+    stats = ProviderStats()
+    for _ in range(30):
+        stats.observe("h-primary", 0.05, ok=True)
+    router = ProviderRouter("h-primary,h-backup", stats=stats)
+    deadline = Deadline(30)
+
+    started = time.monotonic()
+    with deadline_scope(deadline):
+        questions = router.generate_questions("content", 1, "medium")
+
+    assert questions[0]["question"].startswith("h-backup")
+    assert time.monotonic() - started < 1.0
+    for _ in range(50):
+        if fake_llm.cancelled and not deadline._branches:
+            break
+        time.sleep(0.01)
+    assert fake_llm.cancelled == ["h-primary"]
+    # Both legs released their branch of the request deadline.
+    assert not deadline._branches
+
+
+def test_no_hedge_before_enough_latency_samples(fake_llm):
+    fake_llm.behaviour = {"n-primary": ("sleep", 0.2), "n-backup": ("ok", None)}
+    router = ProviderRouter("n-primary,n-backup", stats=ProviderStats())
+
+    with deadline_scope(Deadline(30)):
+        questions = router.generate_questions("content", 1, "medium")
+
+    assert questions[0]["question"].startswith("n-primary")
@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+import services.llm_service as llm_service
+from services.llm_service import GenerationFailed, LLMService, _chunk_counts
+from services.template_generator import template_questions
+from tests.conftest import SOURCE_DOCUMENT
+
+
+def model_sets(counts, **overrides):
+    """What a well-behaved model would answer for ``counts``, as the set JSON the prompt asks for."""
+    sets = {difficulty: template_questions(SOURCE_DOCUMENT, count, difficulty) for difficulty, count in counts.items()}
+    sets.update(overrides)
+    return json.dumps(sets)
+
+
+class ScriptedProvider:
+    """Replaces LLMService._call_provider; ``answer(counts)`` gives the raw output of each call."""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = []
+
+    def __call__(self, service, content, num_questions, difficulty, retry_hint="", counts=None):
+        self.calls.append(dict(counts or {}))
+        return self.answer(counts)
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    def install(answer):
+        scripted = ScriptedProvider(answer)
+        monkeypatch.setattr(LLMService, "_call_provider", scripted)
+        return scripted
+
+    monkeypatch.setattr(llm_service, "GENERATION_STRATEGY", "retry")
+    return install
+
+
+def test_chunk_counts_packs_difficulties_up_to_the_limit():
+    assert _chunk_counts({"easy": 5, "medium": 5, "hard": 5}, 10) == [{"easy": 5, "medium": 5}, {"hard": 5}]
+    assert _chunk_counts({"easy": 3, "medium": 3}, 30) == [{"easy": 3, "medium": 3}]
+
+
+def test_chunk_counts_gives_an_oversized_set_a_call_to_itself():
+    assert _chunk_counts({"easy": 2, "medium": 40, "hard": 2}, 30) == [{"easy": 2}, {"medium": 40}, {"hard": 2}]
+
+
+def test_all_sets_come_from_one_call(provider):
+    scripted = provider(model_sets)
+
+    sets = LLMService("groq").generate_question_sets(SOURCE_DOCUMENT, {"easy": 3, "hard": 2})
+
+    assert scripted.calls == [{"easy": 3, "hard": 2}]
+    assert {difficulty: len(questions) for difficulty, questions in sets.items()} == {"easy": 3, "hard": 2}
+
+
+def test_sets_over_the_per_call_limit_are_split(provider, monkeypatch):
+    monkeypatch.setattr(llm_service, "QUIZ_SET_MAX_QUESTIONS_PER_CALL", 4)
+    scripted = provider(model_sets)
+
+    sets = LLMService("groq").generate_question_sets(SOURCE_DOCUMENT, {"easy": 3, "medium": 2, "hard": 1})
+
+    assert scripted.calls == [{"easy": 3}, {"medium": 2, "hard": 1}]
+    assert [len(sets[d]) for d in ("easy", "medium", "hard")] == [3, 2, 1]
+
+
+def test_set_parsing_accepts_wrapped_and_upper_case_keys():
+    questions = template_questions(SOURCE_DOCUMENT, 2, "easy")
+    raw = "Here you go:\n" + json.dumps({"EASY": questions, "hard": {"questions": questions[:1]}})
+
+    sets = LLMService("groq")._parse_question_sets(raw, {"easy": 2, "hard": 1, "medium": 1})
+
+    assert [len(sets[d]) for d in ("easy", "hard", "medium")] == [2, 1, 0]
+
+
+def test_set_parsing_rejects_output_without_any_set():
+    with pytest.raises(RuntimeError, match="No valid question sets"):
+        LLMService("groq")._parse_question_sets(json.dumps({"questions": []}), {"easy": 2})
+
+
+def test_a_retry_asks_only_for_the_sets_still_short(provider):
+    scripted = provider(lambda counts: model_sets(counts, hard=[]) if len(counts) > 1 else model_sets(counts))
+
+    sets = LLMService("groq").generate_question_sets(SOURCE_DOCUMENT, {"easy": 3, "hard": 2})
+
+    assert scripted.calls == [{"easy": 3, "hard": 2}, {"hard": 2}]
+    assert len(sets["easy"]) == 3 and len(sets["hard"]) == 2
+
+
+def test_a_set_that_stays_short_fails_the_generation(provider):
+    scripted = provider(lambda counts: model_sets(counts, hard=[]))
+
+    with pytest.raises(GenerationFailed, match="No valid question sets"):
+        LLMService("groq").generate_question_sets(SOURCE_DOCUMENT, {"easy": 3, "hard": 2})
+
+    assert scripted.calls == [{"easy": 3, "hard": 2}, {"hard": 2}, {"hard": 2}]
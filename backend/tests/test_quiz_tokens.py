@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+from services.quiz_tokens import InvalidQuizToken, QuizTokenCodec
+from tests.conftest import make_questions
+
+
+def test_round_trip_carries_key_and_question_text():
+    codec = QuizTokenCodec("secret", ttl_s=60)
+    questions = make_questions("BAD")
+    questions[2]["correct_answer"] = " d"
+
+    claims = codec.read(codec.issue("quiz-1", "hard", questions))
+
+    assert claims["quiz_id"] == "quiz-1" and claims["difficulty"] == "hard"
+    assert claims["answer_key"] == "BAD"
+    assert [q["question"] for q in claims["questions"]] == [q["question"] for q in questions]
+    assert claims["questions"][0]["options"] == questions[0]["options"]
+
+
+def test_tampered_token_is_rejected():
+    codec = QuizTokenCodec("secret", ttl_s=60)
+    token = codec.issue("quiz-1", "easy", make_questions("AB"))
+    tampered = token[:20] + ("A" if token[20] != "A" else "B") + token[21:]
+
+    with pytest.raises(InvalidQuizToken):
+        codec.read(tampered)
+    with pytest.raises(InvalidQuizToken):
+        codec.read("not a token")
+
+
+def test_token_from_another_secret_is_rejected():
+    token = QuizTokenCodec("other-secret").issue("quiz-1", "easy", make_questions("AB"))
+
+    with pytest.raises(InvalidQuizToken):
+        QuizTokenCodec("secret").read(token)
+
+
+def test_rotated_secrets_still_accept_old_tokens():
+    old = QuizTokenCodec("old-secret").issue("quiz-1", "easy", make_questions("AB"))
+
+    assert QuizTokenCodec("new-secret,old-secret").read(old)["answer_key"] == "AB"
+
+
+def test_expired_token_is_rejected(monkeypatch):
+    codec = QuizTokenCodec("secret", ttl_s=60)
+    token = codec.issue("quiz-1", "easy", make_questions("AB"))
+    issued_at = time.time()
+
+    monkeypatch.setattr(time, "time", lambda: issued_at + 120)
+
+    with pytest.raises(InvalidQuizToken):
+        codec.read(token)
+
+
+def test_disabled_codec():
+    codec = QuizTokenCodec("")
+
+    assert not codec.enabled
+    with pytest.raises(InvalidQuizToken):
+        codec.read("anything")
+
+
+def test_token_grading_matches_grading_by_quiz_id(client, make_quiz):
+    from services.quiz_tokens import quiz_tokens
+
+    quiz = make_quiz("ABCD")
+    token = quiz_tokens.issue(quiz.id, "medium", make_questions("ABCD"))
+    answers = {"0": "A", "1": " c", "3": "D"}
+
+    by_id = client.post("/submit-quiz", json={"quiz_id": quiz.id, "answers": answers})
+    by_token = client.post("/submit-quiz", json={"quiz_token": token, "answers": answers})
+
+    assert by_id.status_code == by_token.status_code == 200
+    assert by_token.json() == by_id.json()
+    assert client.post("/submit-quiz", json={"quiz_token": token[:-4] + "abcd", "answers": answers}).status_code == 400
+    mismatched = {"quiz_id": "other", "quiz_token": token, "answers": answers}
+    assert client.post("/submit-quiz", json=mismatched).status_code == 400
@@ -0,0 +1,86 @@
+import pytest
+
+from services.ranking import difficulty_fit, option_balance, rank_questions, surplus_count
+
+CONTENT = (
+    "The Rhine flows through Basel and Cologne before reaching Rotterdam. "
+    "The Danube passes Vienna and Budapest on its way to the Black Sea. "
+    "Copper conducts electricity well and is used in electrical wiring."
+)
+
+
+def question(stem, options=("Rotterdam", "Vienna", "Budapest", "Basel"), answer="A"):
+    return {"question": stem, "options": list(options), "correct_answer": answer}
+
+
+def stems(questions):
+    return [q["question"] for q in questions]
+
+
+def test_surplus_count():
+    assert surplus_count(10, 0.5) == 5
+    assert surplus_count(1, 0.5) == 1
+    assert surplus_count(10, 0) == 0
+
+
+def test_difficulty_fit_prefers_cued_long_stems_for_hard_and_plain_short_ones_for_easy():
+    plain = "Which city does the Rhine reach last?"
+    cued = "Which conclusion is most likely when the routes of the Rhine and the Danube are combined?"
+
+    assert difficulty_fit(cued, "hard") > difficulty_fit(plain, "hard")
+    assert difficulty_fit(plain, "easy") > difficulty_fit(cued, "easy")
+
+
+@pytest.mark.parametrize("difficulty", ["easy", "hard"])
+def test_candidates_matching_the_difficulty_rank_first(difficulty):
+    plain = question("Which city does the Rhine reach last?")
+    cued = question("Which conclusion about the Rhine is most likely when its route is combined with the Danube?")
+
+    ranked = rank_questions([plain, cued], CONTENT, difficulty, keep=2)
+
+    assert ranked[0] is (cued if difficulty == "hard" else plain)
+
+
+def test_grounded_answers_rank_above_invented_ones():
+    invented = question("Which city does the Rhine reach last?", ("Marseille", "Vienna", "Budapest", "Basel"))
+    grounded = question("Which city does the Rhine reach last?")
+
+    assert rank_questions([invented, grounded], CONTENT, "medium", keep=1) == [grounded]
+
+
+def test_option_balance_penalises_giveaways_and_catch_alls():
+    balanced = question("Which metal conducts electricity well?", ("Copper", "Glass", "Rubber", "Wood"))
+    giveaway = question(
+        "Which metal conducts electricity well?", ("Copper used in electrical wiring", "Glass", "Rubber", "Wood")
+    )
+    catch_all = question("Which metal conducts electricity well?", ("Copper", "Glass", "Rubber", "None of the above"))
+    duplicate = question("Which metal conducts electricity well?", ("Copper", "Glass", "glass", "Wood"))
+
+    assert option_balance(balanced) > option_balance(catch_all) > 0
+    assert option_balance(balanced) > option_balance(giveaway)
+    assert option_balance(duplicate) == 0.0
+    assert rank_questions([giveaway, catch_all, balanced], CONTENT, "medium", keep=1) == [balanced]
+
+
+def test_near_duplicates_give_way_to_a_novel_candidate():
+    rhine = question("Which city does the Rhine reach at the end?")
+    rhine_again = question("Which city does the Rhine reach last?")
+    # Weaker on its own (half of its answer is not in the source) but about something else.
+    danube = question("Which sea does the Danube empty into?", ("Black Ocean", "North Sea", "Baltic Sea", "Red Sea"))
+
+    ranked = rank_questions([rhine_again, danube, rhine], CONTENT, "medium", keep=3)
+
+    assert ranked == [rhine, danube, rhine_again]
+    assert rank_questions([rhine_again, danube], CONTENT, "medium", keep=1) == [rhine_again]
+
+
+def test_keep_limits_the_selection_and_preserves_selection_order():
+    candidates = [
+        question("Which city does the Rhine reach last?"),
+        question("Which sea does the Danube flow into?", ("Black Sea", "North Sea", "Baltic Sea", "Red Sea")),
+        question("Which metal conducts electricity well?", ("Copper", "Glass", "Rubber", "Wood")),
+    ]
+
+    assert len(rank_questions(candidates, CONTENT, "medium", keep=2)) == 2
+    assert rank_questions(candidates, CONTENT, "medium", keep=0) == []
+    assert sorted(stems(rank_questions(candidates, CONTENT, "medium", keep=5))) == sorted(stems(candidates))
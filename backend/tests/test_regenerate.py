@@ -0,0 +1,157 @@
+import json
+
+import pytest
+from sqlalchemy import inspect, text, update
+
+import database
+from models import Quiz
+from services.quiz_service import QuizConflict, QuizNotFound, QuizService, grade_answers
+from services.quiz_tokens import QuizTokenCodec
+from services.response_writer import PendingResponse, ResponseWriter
+from services.stats_service import StatsService
+from tests.conftest import SOURCE_DOCUMENT
+
+REPLACEMENT = {"question": "A new question?", "options": ["w", "x", "y", "z"], "correct_answer": "C"}
+
+
+class FakeLLM:
+    provider = "fake"
+
+    def __init__(self, before_return=None):
+        self.before_return = before_return
+        self.existing = None
+
+    def generate_replacement_question(self, content, difficulty, existing):
+        self.existing = existing
+        if self.before_return:
+            self.before_return()
+        return dict(REPLACEMENT)
+
+
+def test_regenerate_replaces_one_question_and_resets_its_stats(db, make_quiz):
+    quiz = make_quiz("ABC")
+    service = QuizService(db)
+    service.submit_quiz(quiz.id, {0: "A", 1: "B", 2: "C"})
+    service.llm = FakeLLM()
+
+    result = service.regenerate_question(quiz.id, 1)
+
+    db.expire_all()
+    questions = json.loads(db.get(Quiz, quiz.id).questions_json)
+    assert result["question"] == REPLACEMENT and questions[1] == REPLACEMENT
+    assert questions[0]["question"] == "Question 1?"
+    assert service.llm.existing == ["Question 1?", "Question 2?", "Question 3?"]
+    stats = StatsService(db).get_stats(quiz.id)["questions"]
+    assert stats[0]["correct_count"] == 1 and stats[1]["correct_count"] == 0
+
+
+def test_replaced_question_is_rated_on_its_own_attempts_live_and_rebuilt(db, make_quiz):
+    quiz = make_quiz("ABC")
+    service = QuizService(db)
+    service.submit_quiz(quiz.id, {0: "A", 1: "B", 2: "A"})
+    service.submit_quiz(quiz.id, {0: "B", 1: "B"})
+    service.llm = FakeLLM()
+    service.regenerate_question(quiz.id, 1)
+
+    service.submit_quiz(quiz.id, {0: "A", 1: "C", 2: "C"})
+
+    live = StatsService(db).get_stats(quiz.id)
+    replaced = live["questions"][1]
+    assert replaced["attempts"] == 1 and replaced["correct_rate"] == 1.0
+    assert live["questions"][0]["attempts"] == 3 and live["attempts"] == 3
+    StatsService(db).rebuild([quiz.id])
+    assert StatsService(db).get_stats(quiz.id) == live
+
+
+def test_answers_from_a_token_issued_before_regeneration_skip_the_new_question(db, make_quiz):
+    quiz = make_quiz("AB")
+    questions = json.loads(quiz.questions_json)
+    codec = QuizTokenCodec("secret")
+    old_claims = codec.read(codec.issue(quiz.id, "medium", questions))
+    service = QuizService(db)
+    service.llm = FakeLLM()
+    service.regenerate_question(quiz.id, 1)
+
+    graded = grade_answers(old_claims["questions"], {0: "A", 1: "B"})
+    ResponseWriter._write(
+        [PendingResponse(quiz.id, {0: "A", 1: "B"}, graded["score"], graded["total"], graded["results"], old_claims["revision"])]
+    )
+
+    db.expire_all()
+    live = StatsService(db).get_stats(quiz.id)
+    assert live["attempts"] == 1 and live["average_score"] == 2.0
+    assert live["questions"][0]["attempts"] == 1 and live["questions"][1]["attempts"] == 0
+    StatsService(db).rebuild([quiz.id])
+    assert StatsService(db).get_stats(quiz.id) == live
+
+
+def test_init_db_adds_revision_columns_to_an_existing_database(db_engine):
+    with db_engine.begin() as conn:
+        conn.execute(text("DROP TABLE quiz_responses"))
+        conn.execute(
+            text(
+                "CREATE TABLE quiz_responses (id VARCHAR(36) PRIMARY KEY, quiz_id VARCHAR(36) NOT NULL, "
+                "answers_json TEXT NOT NULL, score INTEGER NOT NULL, total INTEGER NOT NULL, created_at DATETIME NOT NULL)"
+            )
+        )
+        conn.execute(text("INSERT INTO quiz_responses VALUES ('r1', 'q1', '{}', 0, 1, '2024-01-01 00:00:00')"))
+
+    database.init_db()
+
+    columns = {column["name"] for column in inspect(db_engine).get_columns("quiz_responses")}
+    assert "quiz_revision" in columns
+    with db_engine.connect() as conn:
+        assert conn.execute(text("SELECT quiz_revision FROM quiz_responses")).scalar_one() == 0
+
+
+def test_concurrent_edit_raises_conflict_and_keeps_the_other_write(db, make_quiz):
+    quiz = make_quiz("AB")
+    edited = json.dumps([{"question": "Edited meanwhile?", "options": ["a", "b", "c", "d"], "correct_answer": "D"}] * 2)
+
+    def edit_meanwhile():
+        db.execute(update(Quiz).where(Quiz.id == quiz.id).values(questions_json=edited))
+        db.commit()
+
+    service = QuizService(db)
+    service.llm = FakeLLM(before_return=edit_meanwhile)
+
+    with pytest.raises(QuizConflict):
+        service.regenerate_question(quiz.id, 0)
+
+    db.expire_all()
+    assert db.get(Quiz, quiz.id).questions_json == edited
+
+
+def test_unknown_quiz_or_index(db, make_quiz):
+    quiz = make_quiz("AB")
+    service = QuizService(db)
+    service.llm = FakeLLM()
+
+    with pytest.raises(QuizNotFound, match="Quiz not found"):
+        service.regenerate_question("missing", 0)
+    with pytest.raises(QuizNotFound, match="Question not found"):
+        service.regenerate_question(quiz.id, 2)
+
+
+def test_endpoint_regenerates_with_the_template_provider(client, make_quiz):
+    quiz = make_quiz("ABCDA", content=SOURCE_DOCUMENT)
+
+    response = client.post(f"/quiz/{quiz.id}/questions/2/regenerate", json={})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["index"] == 2 and body["question"]["question"] != "Question 3?"
+    assert client.post(f"/quiz/{quiz.id}/questions/9/regenerate", json={}).status_code == 404
+
+
+def test_endpoint_reports_unexpected_errors_as_500(client, make_quiz, monkeypatch):
+    quiz = make_quiz("AB")
+
+    def broken(self, quiz_id, index, deadline=None):
+        raise ValueError("replacement had no options")
+
+    monkeypatch.setattr(QuizService, "regenerate_question", broken)
+    response = client.post(f"/quiz/{quiz.id}/questions/0/regenerate", json={})
+
+    assert response.status_code == 500
+    assert "replacement had no options" in response.json()["detail"]
@@ -0,0 +1,131 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.deadline import Deadline, DeadlineExceeded, RequestCancelled, current_deadline, deadline_scope
+from services.single_flight import SingleFlight
+
+
+def _slow(result, seconds=0.2, calls=None):
+    def work(group_size):
+        if calls is not None:
+            calls.append(group_size)
+        time.sleep(seconds)
+        return result
+
+    return work
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight(window_s=0.05)
+    calls = []
+
+    with ThreadPoolExecutor(5) as pool:
+        results = list(pool.map(lambda _: flights.run("key", _slow("quiz", calls=calls)), range(5)))
+
+    assert calls == [5]
+    assert sorted(index for _, index in results) == [0, 1, 2, 3, 4]
+    assert {result for result, _ in results} == {"quiz"}
+    assert flights.in_flight() == 0
+
+
+def test_different_keys_do_not_coalesce():
+    flights = SingleFlight()
+    calls = []
+
+    with ThreadPoolExecutor(2) as pool:
+        list(pool.map(lambda key: flights.run(key, _slow(key, 0.05, calls)), ["a", "b"]))
+
+    assert len(calls) == 2
+
+
+def test_errors_are_shared_with_followers():
+    flights = SingleFlight()
+
+    def failing(_group_size):
+        time.sleep(0.1)
+        raise RuntimeError("provider down")
+
+    with ThreadPoolExecutor(3) as pool:
+        futures = [pool.submit(flights.run, "key", failing) for _ in range(3)]
+        errors = [f.exception() for f in futures]
+
+    assert all(isinstance(e, RuntimeError) and "provider down" in str(e) for e in errors)
+
+
+def test_follower_takes_over_when_the_leader_is_cancelled():
+    flights = SingleFlight()
+    leader_deadline = Deadline(5)
+
+    def leader_work(_group_size):
+        time.sleep(0.1)
+        leader_deadline.check()
+        return "never"
+
+    def leader():
+        with deadline_scope(leader_deadline):
+            return flights.run("key", leader_work)
+
+    with ThreadPoolExecutor(1) as pool:
+        leader_future = pool.submit(leader)
+        time.sleep(0.02)
+        leader_deadline.cancel()
+        result, index = flights.run("key", lambda _n: "recovered")
+
+    with pytest.raises(RequestCancelled):
+        leader_future.result()
+    assert (result, index) == ("recovered", 0)
+
+
+def test_follower_with_a_longer_deadline_takes_over_from_an_expired_leader():
+    flights = SingleFlight()
+
+    def leader_work(_group_size):
+        time.sleep(0.2)
+        current_deadline().check()
+        return "never"
+
+    def leader():
+        with deadline_scope(Deadline(0.1)):
+            return flights.run("key", leader_work)
+
+    with ThreadPoolExecutor(1) as pool:
+        leader_future = pool.submit(leader)
+        time.sleep(0.02)
+        with deadline_scope(Deadline(5)):
+            result, index = flights.run("key", lambda _n: "recovered")
+
+    with pytest.raises(DeadlineExceeded):
+        leader_future.result()
+    assert (result, index) == ("recovered", 0)
+
+
+def test_cancelled_follower_stops_waiting_at_once():
+    flights = SingleFlight()
+    started = threading.Event()
+
+    def slow(_group_size):
+        started.set()
+        time.sleep(1.0)
+        return "late"
+
+    follower_deadline = Deadline(5)
+    with ThreadPoolExecutor(1) as pool:
+        pool.submit(flights.run, "key", slow)
+        started.wait()
+        threading.Timer(0.05, follower_deadline.cancel).start()
+        begun = time.monotonic()
+        with deadline_scope(follower_deadline), pytest.raises(RequestCancelled):
+            flights.run("key", slow)
+        assert time.monotonic() - begun < 0.5
+
+
+def test_wait_timeout():
+    flights = SingleFlight(wait_timeout_s=0.05)
+    with ThreadPoolExecutor(1) as pool:
+        pool.submit(flights.run, "key", _slow("late", 0.3))
+        time.sleep(0.02)
+        with pytest.raises(RuntimeError, match="Timed out"):
+            flights.run("key", _slow("other", 0.0))
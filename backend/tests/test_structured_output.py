@@ -0,0 +1,97 @@
+import json
+
+import pytest
+import requests
+
+import services.llm_service as llm_service
+from services.hf_capabilities import CapabilityCache, hf_endpoint
+from services.llm_service import LLMService
+from services.structured_output import StructuredOutputSupport
+
+ANSWER = json.dumps({"questions": []})
+REJECTION = '{"error": {"message": "response_format is not supported by this model", "code": "unsupported_parameter"}}'
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.text = body if isinstance(body, str) else json.dumps(body)
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class ChatServer:
+    """An OpenAI-style chat endpoint; ``accepts`` lists the response_format types it takes (None: no constraint)."""
+
+    def __init__(self, accepts):
+        self.accepts = accepts
+        self.sent = []
+
+    def post(self, url, json=None, **kwargs):
+        kind = (json.get("response_format") or {}).get("type")
+        self.sent.append(kind)
+        if kind not in self.accepts:
+            return FakeResponse(400, REJECTION)
+        return FakeResponse(200, {"choices": [{"message": {"content": ANSWER}}], "usage": {}})
+
+    def get(self, url, **kwargs):
+        return FakeResponse(404, "not found")
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(llm_service, "structured_support", StructuredOutputSupport("auto"))
+
+    def install(accepts):
+        chat = ChatServer(accepts)
+        monkeypatch.setattr(requests, "post", chat.post)
+        monkeypatch.setattr(requests, "get", chat.get)
+        return chat
+
+    return install
+
+
+def test_rejected_response_formats_step_down_to_a_plain_prompt(server, monkeypatch):
+    monkeypatch.setattr(llm_service, "GROQ_API_KEY", "key")
+    chat = server(accepts=[None])
+    service = LLMService("groq")
+
+    assert service._call_groq("Some source text.", 1, "medium") == ANSWER
+    assert chat.sent == ["json_schema", "json_object", None]
+    assert service._output_mode == "free"
+
+    # The rejections are remembered: the next call goes straight to the plain prompt.
+    chat.sent.clear()
+    service._call_groq("Some source text.", 1, "medium")
+    assert chat.sent == [None]
+
+
+def test_json_mode_is_used_when_only_the_schema_is_rejected(server, monkeypatch):
+    monkeypatch.setattr(llm_service, "GROQ_API_KEY", "key")
+    chat = server(accepts=["json_object", None])
+    service = LLMService("groq")
+
+    service._call_groq("Some source text.", 1, "medium")
+
+    assert chat.sent == ["json_schema", "json_object"]
+    assert service._output_mode == "json"
+    assert llm_service.structured_support.snapshot() == [
+        {"provider": "groq", "model": llm_service.GROQ_MODEL, "mode": "schema"}
+    ]
+
+
+def test_hf_probe_records_a_chat_route_without_json_mode(server, monkeypatch, tmp_path):
+    cache = CapabilityCache(path=tmp_path / "hf_capabilities.json")
+    monkeypatch.setattr(llm_service, "hf_capabilities", cache)
+    chat = server(accepts=[None])
+    service = LLMService("huggingface")
+
+    assert service._call_huggingface("Some source text.", 1, "medium") == ANSWER
+
+    caps = cache.get(hf_endpoint())
+    assert (caps.api, caps.json_mode) == ("chat", False)
+    # Probe (json_object, then plain); JSON mode is then never offered, and the schema attempt steps down.
+    assert chat.sent == ["json_object", None, "json_schema", None]
+    saved = json.loads((tmp_path / "hf_capabilities.json").read_text())
+    assert [entry["json_mode"] for entry in saved.values()] == [False]
@@ -0,0 +1,35 @@
+import pytest
+
+from services.llm_service import LLMService
+from services.template_generator import template_questions
+from tests.conftest import SOURCE_DOCUMENT
+
+
+@pytest.mark.parametrize("difficulty", ["easy", "medium", "hard"])
+def test_template_questions_pass_validation(difficulty):
+    questions = template_questions(SOURCE_DOCUMENT, 10, difficulty)
+
+    assert len(questions) == 10
+    valid = LLMService()._validate_questions(questions, SOURCE_DOCUMENT, 10, difficulty)
+    assert len(valid) == len(questions)
+    for q in questions:
+        assert len(set(q["options"])) == 4
+        assert q["correct_answer"] in "ABCD"
+
+
+def test_same_input_gives_the_same_quiz():
+    assert template_questions(SOURCE_DOCUMENT, 5, "medium") == template_questions(SOURCE_DOCUMENT, 5, "medium")
+
+
+def test_association_questions_are_anchored_on_names_or_numbers():
+    questions = template_questions(SOURCE_DOCUMENT, 10, "hard")
+    stems = [q["question"] for q in questions if "linked to" in q["question"]]
+    anchors = [stem.split("linked to ", 1)[1].split(" when ")[0] for stem in stems]
+
+    assert anchors
+    for anchor in anchors:
+        assert anchor[0].isupper() or anchor[0].isdigit(), anchor
+
+
+def test_short_content_gives_no_questions():
+    assert template_questions("Too short to quiz on.", 5, "medium") == []
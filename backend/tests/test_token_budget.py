@@ -0,0 +1,53 @@
+from services.token_budget import BudgetKey, TokenBudget
+
+KEY = BudgetKey("groq", "test-model", "generate", "medium", 5)
+
+
+def _budget(**overrides):
+    settings = {"window": 100, "min_samples": 10, "margin": 1.2, "floor": 256, "ceiling": 4096, "adaptive": True}
+    settings.update(overrides)
+    return TokenBudget(**settings)
+
+
+def test_default_until_enough_samples():
+    budget = _budget()
+    for _ in range(9):
+        budget.record(KEY, 500, "stop")
+
+    assert budget.max_tokens(KEY, 900) == 900
+
+
+def test_learns_p99_times_margin():
+    budget = _budget()
+    for tokens in range(400, 500):
+        budget.record(KEY, tokens, "stop")
+
+    assert budget.max_tokens(KEY, 900) == 598  # ceil(498 * 1.2)
+
+
+def test_learned_budget_is_clamped():
+    budget = _budget(floor=256, ceiling=1000)
+    other = BudgetKey("groq", "test-model", "generate", "hard", 20)
+    for _ in range(10):
+        budget.record(KEY, 10, "stop")
+        budget.record(other, 3000, "stop")
+
+    assert budget.max_tokens(KEY, 900) == 256
+    assert budget.max_tokens(other, 900) == 1000
+
+
+def test_truncated_completions_push_the_budget_up():
+    budget = _budget()
+    for _ in range(10):
+        budget.record(KEY, 500, "length")
+
+    assert budget.max_tokens(KEY, 900) == 750  # 500 * 1.25 recorded, then * 1.2
+    assert budget.snapshot()[0]["stop_reasons"] == {"length": 10}
+
+
+def test_disabled_budget_always_uses_the_default():
+    budget = _budget(adaptive=False)
+    for _ in range(20):
+        budget.record(KEY, 100, "stop")
+
+    assert budget.max_tokens(KEY, 900) == 900
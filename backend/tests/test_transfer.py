@@ -0,0 +1,67 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import database
+from services.quiz_service import QuizService
+from services.stats_service import StatsService
+from services.transfer_service import TransferService
+
+
+@pytest.fixture
+def other_db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    database.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def test_export_import_round_trip(db, make_quiz, other_db):
+    quiz = make_quiz("AB", source_type="pdf")
+    make_quiz("CD", source_type="url")
+    QuizService(db).submit_quiz(quiz.id, {0: "A", 1: "C"})
+    lines = list(TransferService(db).export_ndjson())
+
+    counts = TransferService(other_db).import_ndjson(lines, batch_size=1)
+
+    assert counts == {"quizzes": 2, "quiz_responses": 1, "skipped": 0}
+    assert [json.loads(line)["type"] for line in lines] == ["quiz", "quiz", "quiz_response"]
+    # Stats are rebuilt from the imported responses.
+    assert StatsService(other_db).get_stats(quiz.id) == StatsService(db).get_stats(quiz.id)
+    assert list(TransferService(other_db).export_ndjson()) == lines
+
+
+def test_import_conflict_modes(db, make_quiz, other_db):
+    make_quiz("AB")
+    lines = list(TransferService(db).export_ndjson())
+    TransferService(other_db).import_ndjson(lines)
+
+    assert TransferService(other_db).import_ndjson(lines) == {"quizzes": 0, "quiz_responses": 0, "skipped": 1}
+    assert TransferService(other_db).import_ndjson(lines, on_conflict="replace")["quizzes"] == 1
+
+
+def test_export_filters_by_source_type(db, make_quiz):
+    make_quiz("A", source_type="pdf")
+    make_quiz("B", source_type="url")
+
+    lines = list(TransferService(db).export_ndjson(source_type="pdf"))
+
+    assert [json.loads(line)["data"]["source_type"] for line in lines] == ["pdf"]
+
+
+@pytest.mark.parametrize(
+    "line, message",
+    [
+        ("not json", "line 1"),
+        ('{"type": "teacher", "data": {}}', "Unknown record type"),
+        ('{"type": "quiz_response", "data": {"score": 1, "total": 2}}', "has no quiz_id"),
+    ],
+)
+def test_bad_lines_are_reported_with_their_line_number(db, line, message):
+    with pytest.raises(ValueError, match=message):
+        TransferService(db).import_ndjson([line])
@@ -2,6 +2,7 @@ const API_BASE = "";
 
 let extractedContent = "";
 let currentQuizId = "";
+let currentQuizToken = "";
 let currentQuestions = [];
 let currentQuestionIndex = 0;
 let userAnswers = {};
@@ -191,13 +192,18 @@ async function generateQuiz() {
     if (!res.ok) throw new Error(data.detail || "Quiz generation failed.");
 
     currentQuizId = data.quiz_id;
+    currentQuizToken = data.quiz_token || "";
     currentQuestions = data.questions;
     currentQuestionIndex = 0;
     userAnswers = {};
     
     showQuiz();
     updateShareLink();
-    setGenerateStatus("Quiz generated!", "success");
+    if (data.degraded) {
+      setGenerateStatus("The AI model is busy, so this quiz was built from the text directly.", "info");
+    } else {
+      setGenerateStatus("Quiz generated!", "success");
+    }
   } catch (err) {
     setGenerateStatus(`${String(err)}. Ensure Ollama is running.`, "error");
   } finally {
@@ -292,7 +298,11 @@ async function submitQuiz() {
     const res = await fetch(`${API_BASE}/submit-quiz`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ quiz_id: currentQuizId, answers: userAnswers }),
+      body: JSON.stringify({
+        quiz_id: currentQuizId,
+        quiz_token: currentQuizToken || null,
+        answers: userAnswers,
+      }),
     });
     const data = await res.json();
     if (!res.ok) throw new Error(data.detail || "Submit failed.");
@@ -352,6 +362,7 @@ async function loadSharedQuizIfAny() {
     if (!res.ok) return;
     
     currentQuizId = data.quiz_id;
+    currentQuizToken = "";
     currentQuestions = data.questions.map((q) => ({
       question: q.question,
       options: q.options,
@@ -369,6 +380,7 @@ async function loadSharedQuizIfAny() {
 function resetAll() {
   extractedContent = "";
   currentQuizId = "";
+  currentQuizToken = "";
   currentQuestions = [];
   currentQuestionIndex = 0;
   userAnswers = {};